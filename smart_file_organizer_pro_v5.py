@@ -1,20 +1,51 @@
-import shutil
-import hashlib
+import time
+_IMPORT_STARTED = time.perf_counter()
 from pathlib import Path
 from datetime import datetime, timedelta
-import customtkinter as ctk
-from tkinter import filedialog, messagebox
-from threading import Thread, Event
-import time
+from threading import Thread, Event, Lock, Condition, get_ident, get_native_id, local
+from concurrent.futures import ThreadPoolExecutor
 import queue
+from collections import deque
+import itertools
+import heapq
+import contextlib
+import struct
+import stat
+import select
+import errno
+import ctypes
+import uuid
+import logging
+import logging.handlers
+from dataclasses import dataclass, field, fields
+from typing import NamedTuple, Optional
+import argparse
+import json
+import signal
+import subprocess
 
-# --- Imports for Tray Icon & EXE ---
-import pystray
-from PIL import Image, ImageDraw, ImageFont
+# --- Imports for EXE (GUI/tray modules load lazily, see launch_gui) ---
 import os
 import sys
 # -----------------------------------
 
+from smart_organizer_digests import (
+    DEFAULT_BUFFER_SIZE, DEFAULT_DIGEST_ALGORITHM, DIGEST_ALGORITHMS, SAMPLE_WHOLE_FILE_LIMIT, benchmark_digests,
+    file_digest, file_md5, new_hasher,
+)
+from smart_organizer_storage import (
+    DEFAULT_MULTIPART_MB, DEFAULT_STORAGE_CONNECTIONS, META_DIR_NAME, PARTIAL_SUFFIX, STORAGE_BACKENDS,
+    FilesystemBackend, StorageBackend, glob_match, iter_backup_files, link_view, meta_dir, open_storage,
+    remove_stale_partials, single_chunk,
+)
+from smart_organizer_index import (
+    CHECKPOINT_INTERVAL, INDEX_FILE_NAME, OBJECTS_DIR_NAME, BackupIndex, Candidate, object_store_path,
+)
+from smart_organizer_chunks import (
+    CHUNK_BATCH_BYTES, MANIFEST_FORMAT, MANIFEST_SUFFIX, iter_chunks, manifest_bytes, restore_chunked, store_chunks,
+)
+from smart_organizer_packs import PACK_SEGMENT_PREFIX, PackWriter, extract_packed, iter_packed, read_packed
+
 # ----------------- Helper function for PyInstaller -----------------
 def resource_path(relative_path):
     """ Get absolute path to resource, works for dev and for PyInstaller """
@@ -27,38 +58,25 @@ def resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 # -------------------------------------------------------------------
 
-ctk.set_appearance_mode("Dark")
-ctk.set_default_color_theme("blue")
 
 # ----------------- Helper functions -----------------
-def file_md5(path: Path, stop_event: Event, chunk_size=8192):
+def ensure_backup_subfolder(backup_root: Path, file: Path, ctime=None, storage=None):
 # ... existing code ...
-    h = hashlib.md5()
-    try:
-        with path.open("rb") as f:
-            while True:
-                if stop_event.is_set():
-                    return None  # Interrupted
-                chunk = f.read(chunk_size)
-                if not chunk:
-                    break
-                h.update(chunk)
-    except Exception as e:
-        print(f"Error hashing {path}: {e}")
-        return None
-    return h.hexdigest()
+    target = backup_subfolder(backup_root, file, ctime)
+    if storage is not None:
+        storage.make_folder(target.relative_to(backup_root).as_posix())
+    else:
+        target.mkdir(parents=True, exist_ok=True)
+    return target
 
-def ensure_backup_subfolder(backup_root: Path, file: Path):
-# ... existing code ...
+def backup_subfolder(backup_root: Path, file: Path, ctime=None):
+    """ type/date folder for a file; pass the ctime a scan already has to save the stat """
     file_type = file.suffix[1:].lower() if file.suffix else "other"
     try:
-        creation_date = datetime.fromtimestamp(file.stat().st_ctime)
+        creation_date = datetime.fromtimestamp(file.stat().st_ctime if ctime is None else ctime)
     except Exception:
         creation_date = datetime.now()
-    date_folder = creation_date.strftime("%Y-%m-%d")
-    target = backup_root / file_type / date_folder
-    target.mkdir(parents=True, exist_ok=True)
-    return target
+    return backup_root / file_type / creation_date.strftime("%Y-%m-%d")
 
 def get_next_run_time(schedule_mode, schedule_hour):
 # ... existing code ...
@@ -85,538 +103,2926 @@ def get_next_run_time(schedule_mode, schedule_hour):
 
 def wait_with_stop_check(total_wait_seconds, stop_event: Event):
 # ... existing code ...
-    waited = 0
-    while waited < total_wait_seconds:
-        if stop_event.is_set():
-            return False
-        sleep_duration = min(1.0, total_wait_seconds - waited)
-        time.sleep(sleep_duration)
-        waited += sleep_duration
-    return True
+    # Blocks on the event itself: wakes immediately on stop, no one-second polling
+    return not stop_event.wait(max(0, total_wait_seconds))
 
-# ----------------- Core backup logic (Unchanged) -----------------
-def run_backup_once(source: Path, backup: Path, log_callback, progress_callback, stop_event: Event):
-# ... existing code ...
-    if not source.exists():
-        log_callback(f"Source {source} does not exist.")
-        return
-    try:
-        backup.mkdir(parents=True, exist_ok=True)
-    except Exception as e:
-        log_callback(f"Error creating backup dir {backup}: {e}")
-        return
-    try:
-        files = [p for p in source.iterdir() if p.is_file()]
-    except Exception as e:
-        log_callback(f"Error reading source folder {source}: {e}")
-        return
-    total = len(files)
-    if total == 0:
-        log_callback("No files to backup.")
-        progress_callback(0, "")
-        return
+# ----------------- Throttling -----------------
+IO_CLASSES = {"best-effort": 2, "idle": 3}
+_IOPRIO_CLASS_SHIFT = 13
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_SET_SYSCALLS = {"x86_64": 251, "i386": 289, "i686": 289, "aarch64": 30, "armv7l": 314, "ppc64le": 273}
+THROTTLE_WAIT_SLICE = 0.25
 
-    log_callback("Indexing existing backup files (this may take a while)...")
-    existing_hashes = set()
-    try:
-        for f in backup.rglob("*"):
-            if stop_event.is_set():
-                log_callback("Backup stopped during indexing.")
-                return
-            if f.is_file():
-                h = file_md5(f, stop_event)
-                if h:
-                    existing_hashes.add(h)
+class TokenBucket:
+    """ Rate limiter for bytes or files per second (rate 0 = unlimited).
+
+    The bucket holds at most one second of tokens. A request larger than what is left drives the
+    balance negative and the caller sleeps the debt off, so big chunks are never starved and
+    several workers sharing one bucket are paced in the order they asked. set_rate() takes
+    effect immediately, also for callers already waiting.
+    """
+    def __init__(self, rate=0.0):
+        self.lock = Lock()
+        self.rate = 0.0
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        self.waited = 0.0
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        with self.lock:
+            self._refill()
+            self.rate = max(0.0, float(rate or 0))
+            self.tokens = min(self.tokens, self.rate)
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate:
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self, amount, stop_event: Event = None):
+        """ Blocks until amount fits under the rate. Returns False if stop_event fired while waiting. """
+        with self.lock:
+            if not self.rate:
+                return True
+            self._refill()
+            self.tokens -= amount
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            rate = self.rate
+        started = time.monotonic()
+        while delay > 0:
+            # Short slices so a raised or lifted limit releases waiting workers right away
+            step = min(delay, THROTTLE_WAIT_SLICE)
+            if stop_event is not None and stop_event.wait(step):
+                return False
+            if stop_event is None:
+                time.sleep(step)
+            delay -= step
+            with self.lock:
+                if self.rate != rate:
+                    delay = delay * rate / self.rate if self.rate else 0.0
+                    rate = self.rate
+        with self.lock:
+            self.waited += time.monotonic() - started
+        return True
+
+class Throttle:
+    """ Read and write bandwidth caps plus a files-per-second cap, shared by every worker of a run.
+    A parent Throttle (say one shared by every job of a scheduler) caps the bytes on top of these.
+    """
+    def __init__(self, read_mb=0.0, write_mb=0.0, files_per_second=0.0, parent=None):
+        self.read_bucket = TokenBucket()
+        self.write_bucket = TokenBucket()
+        self.files_bucket = TokenBucket()
+        self.parent = parent
+        self.set_limits(read_mb, write_mb, files_per_second)
+
+    @classmethod
+    def from_options(cls, options):
+        return cls(options.read_limit_mb, options.write_limit_mb, options.files_per_second)
+
+    def set_limits(self, read_mb=None, write_mb=None, files_per_second=None):
+        """ Changes any of the limits (MB/s, files/s; 0 = unlimited), also in the middle of a run """
+        if read_mb is not None:
+            self.read_bucket.set_rate(float(read_mb) * 1024 * 1024)
+        if write_mb is not None:
+            self.write_bucket.set_rate(float(write_mb) * 1024 * 1024)
+        if files_per_second is not None:
+            self.files_bucket.set_rate(files_per_second)
+
+    def read(self, amount, stop_event: Event = None):
+        return (self.read_bucket.consume(amount, stop_event) and
+                (self.parent is None or self.parent.read(amount, stop_event)))
+
+    def write(self, amount, stop_event: Event = None):
+        return (self.write_bucket.consume(amount, stop_event) and
+                (self.parent is None or self.parent.write(amount, stop_event)))
+
+    def file(self, stop_event: Event = None):
+        return self.files_bucket.consume(1, stop_event)
+
+    def chunk_size(self, default: int):
+        """ Kernel copy chunk no bigger than a quarter second of the tightest byte limit """
+        rates = [r for r in (self.read_bucket.rate, self.write_bucket.rate) if r]
+        if self.parent is not None:
+            default = self.parent.chunk_size(default)
+        return max(64 * 1024, min([default] + [int(r / 4) for r in rates]))
+
+    def describe(self):
+        rate = lambda bucket, scale, unit: f"{bucket.rate / scale:g} {unit}" if bucket.rate else "unlimited"
+        return (f"read {rate(self.read_bucket, 1024 * 1024, 'MB/s')}, write {rate(self.write_bucket, 1024 * 1024, 'MB/s')}, "
+                f"files {rate(self.files_bucket, 1, 'per second')}")
+
+    def limited(self):
+        return (bool(self.read_bucket.rate or self.write_bucket.rate or self.files_bucket.rate) or
+                (self.parent is not None and self.parent.limited()))
+
+    def snapshot(self):
+        mb = lambda rate: round(rate / (1024 * 1024), 3)
+        snapshot = {"read_limit_mb_s": mb(self.read_bucket.rate), "write_limit_mb_s": mb(self.write_bucket.rate),
+                    "files_per_second": self.files_bucket.rate,
+                    "waited_seconds": round(self.read_bucket.waited + self.write_bucket.waited +
+                                            self.files_bucket.waited, 3)}
+        if self.parent is not None and self.parent.limited():
+            snapshot["shared"] = self.parent.snapshot()
+        return snapshot
+
+def lower_thread_priority(io_class=None, nice=0):
+    """ Linux: raises the calling thread's nice value to at least nice and switches it to the
+    given I/O scheduling class ("idle" only gets disk time nobody else wants; it needs the BFQ
+    or CFQ scheduler to have an effect). Threads started afterwards inherit both. Returns the
+    list of what was applied.
+    """
+    applied = []
+    if not sys.platform.startswith("linux"):
+        return applied
+    tid = get_native_id()
+    if nice:
+        try:
+            current = os.getpriority(os.PRIO_PROCESS, tid)
+            os.setpriority(os.PRIO_PROCESS, tid, max(current, int(nice)))
+            applied.append(f"nice {max(current, int(nice))}")
+        except OSError:
+            pass
+    number = _IOPRIO_SET_SYSCALLS.get(os.uname().machine)
+    if io_class in IO_CLASSES and number:
+        # Best-effort at the lowest level (7); idle has no levels
+        value = (IO_CLASSES[io_class] << _IOPRIO_CLASS_SHIFT) | (7 if io_class == "best-effort" else 0)
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.syscall(number, _IOPRIO_WHO_PROCESS, tid, value) == 0:
+            applied.append(f"{io_class} I/O class")
+    return applied
+
+# ----------------- Fan-out reads -----------------
+FANOUT_MEMORY_LIMIT = 256 * 1024 * 1024
+FANOUT_WAIT_SLICE = 0.2
+
+class FanOutBudget:
+    """ Bytes that shared reads may hold for lagging destinations, across a whole run """
+    def __init__(self, limit=FANOUT_MEMORY_LIMIT):
+        self.limit = limit
+        self.used = 0
+        self.lock = Lock()
+
+    def reserve(self, amount: int):
+        with self.lock:
+            if self.used + amount > self.limit:
+                return False
+            self.used += amount
+            return True
+
+    def release(self, amount: int):
+        with self.lock:
+            self.used -= amount
+
+class SharedRead:
+    """ One read of a source file feeding several backup destinations.
+
+    The first destination to get to the file reads it and writes its own copy; every chunk is
+    also kept for the others, which write it at their own pace and drop it once all of them
+    are past it. If the lag would need more memory than the run's FanOutBudget, the buffer is
+    given up and whoever is behind reads the source on its own, so a slow destination never
+    holds back a fast one.
+    """
+    def __init__(self, path: Path, consumers: int, budget: FanOutBudget):
+        self.path = path
+        self.budget = budget
+        self.cond = Condition()
+        self.waiting = consumers  # handles that have not started yet; they need the stream from chunk 0
+        self.leader_started = False
+        self.chunks = []          # stream chunks [base, produced)
+        self.base = 0
+        self.produced = 0
+        self.positions = {}       # following handle -> index of its next chunk
+        self.finished = False
+        self.failed = False
+        self.digest = None
+
+    def handles(self):
+        return [SharedReadHandle(self) for _ in range(self.waiting)]
+
+    def _publish(self, chunk: bytes):
+        with self.cond:
+            self.produced += 1
+            needed = (self.waiting and self.base == 0) or any(p >= self.base for p in self.positions.values())
+            if needed and self.budget.reserve(len(chunk)):
+                self.chunks.append(chunk)
+            else:
+                # No one left to use it, or out of buffer memory: everyone behind reads the source
+                self._trim(self.produced)
+            self.cond.notify_all()
+
+    def _finish(self, ok: bool, digest=None):
+        with self.cond:
+            self.finished, self.failed, self.digest = ok, not ok, digest
+            if not ok:
+                self._trim(self.produced)
+            self.cond.notify_all()
+
+    def _trim(self, upto: int):
+        """ Drops chunks before stream index upto; the caller holds cond """
+        drop = upto - self.base
+        if drop <= 0:
+            return
+        self.budget.release(sum(len(c) for c in self.chunks[:drop]))
+        del self.chunks[:drop]
+        self.base = upto
+
+    def _trim_consumed(self):
+        if self.waiting and self.base == 0:
+            return
+        active = [p for p in self.positions.values() if p >= self.base]
+        self._trim(min(active) if active else self.produced)
+
+class SharedReadHandle:
+    """ One destination's share of a SharedRead. copy() works like StorageBackend.put_file(); close()
+    must always be called, also when the destination ends up not needing the file.
+    """
+    def __init__(self, shared: SharedRead):
+        self.shared = shared
+        self.role = None
+        self.read_source = False  # True if this destination read the source itself
+        self._fallback = False
+
+    def copy(self, storage, key: str, stop_event: Event, algorithm=None, buffer_size=DEFAULT_BUFFER_SIZE,
+             throttle=None):
+        shared = self.shared
+        with shared.cond:
+            shared.waiting -= 1
+            if not shared.leader_started:
+                shared.leader_started = True
+                self.role = "leader"
+            elif shared.base == 0 and not shared.failed:
+                self.role = "follower"
+                shared.positions[self] = 0
+            else:
+                self.role = "reader"
+        if self.role == "leader":
+            self.read_source = True
+            h = new_hasher(algorithm) if algorithm else None
+            st = None
+            try:
+                st = storage.put_stream(key, self._read_chunks(stop_event, h, buffer_size, throttle),
+                                        stop_event, throttle, shared.path)
+            finally:
+                shared._finish(st is not None, h.hexdigest() if h and st else None)
+            return (st, shared.digest) if st else (None, None)
+        if self.role == "follower":
+            try:
+                st = storage.put_stream(key, self._follow_chunks(stop_event), stop_event, throttle, shared.path)
+            finally:
+                self._leave()
+            if st:
+                return st, shared.digest
+            if not self._fallback:
+                return None, None
+        # Too far behind (or the leader failed): read the source like a single-destination copy
+        self.read_source = True
+        return storage.put_file(key, shared.path, stop_event, algorithm, buffer_size, throttle)
+
+    def close(self):
+        with self.shared.cond:
+            if self.role is None:
+                self.shared.waiting -= 1
+                self.role = "closed"
+            self._leave_locked()
+
+    def _leave(self):
+        with self.shared.cond:
+            self._leave_locked()
+
+    def _leave_locked(self):
+        self.shared.positions.pop(self, None)
+        self.shared._trim_consumed()
+
+    def _read_chunks(self, stop_event: Event, h, buffer_size: int, throttle):
+        with open(self.shared.path, "rb", buffering=0) as f:
+            while True:
                 if stop_event.is_set():
-                    log_callback("Backup stopped during indexing.")
+                    yield None
                     return
-    except Exception as e:
-        log_callback(f"Error during backup indexing: {e}")
-    log_callback(f"Index complete. Found {len(existing_hashes)} existing files.")
+                chunk = f.read(buffer_size)
+                if not chunk:
+                    return
+                if throttle and not throttle.read(len(chunk), stop_event):
+                    yield None
+                    return
+                if h:
+                    h.update(chunk)
+                self.shared._publish(chunk)
+                yield chunk
 
-    processed = 0
-    copied_count = 0
-    skipped_count = 0
-    for f in files:
-# ... existing code ...
-        if stop_event.is_set():
-            log_callback("Backup stopped by user.")
-            break
-        processed += 1
-        progress_callback(int(processed/total*100), f.name)
+    def _follow_chunks(self, stop_event: Event):
+        shared = self.shared
+        while True:
+            with shared.cond:
+                while True:
+                    position = shared.positions[self]
+                    if position < shared.base or shared.failed:
+                        self._fallback = True
+                        chunk = None
+                        break
+                    if position < shared.produced:
+                        chunk = shared.chunks[position - shared.base]
+                        shared.positions[self] = position + 1
+                        shared._trim_consumed()
+                        break
+                    if shared.finished:
+                        return
+                    if stop_event.is_set():
+                        chunk = None
+                        break
+                    shared.cond.wait(FANOUT_WAIT_SLICE)
+            yield chunk
+            if chunk is None:
+                return
+
+# ----------------- Source scanner -----------------
+class SourceFile(NamedTuple):
+    """ One scanned source file, carrying the stat data its DirEntry already fetched """
+    path: Path
+    rel: str
+    size: int
+    mtime_ns: int
+    inode: int
+    ctime: float
+
+    @property
+    def name(self):
+        return self.path.name
+
+def parse_glob_list(text: str):
+    """ Splits a comma/semicolon separated pattern list as typed into the GUI or a config file """
+    return [p.strip() for p in text.replace(";", ",").split(",") if p.strip()]
+
+def scan_source(source: Path, include=(), exclude=(), max_depth=None, skip_dirs=(), on_error=None):
+    """ Streams SourceFiles under source depth-first with os.scandir, without building a list.
+
+    include/exclude are glob patterns matched against the relative path or the bare name;
+    excluded folders are pruned. max_depth=0 only lists the top folder, None is unlimited.
+    skip_dirs holds relative folder paths to leave out (e.g. a backup root inside the source).
+    """
+    stack = [(str(source), "", 0)]
+    while stack:
+        folder, prefix, depth = stack.pop()
         try:
-            h = file_md5(f, stop_event)
-            if not h:
-                if stop_event.is_set():
-                    log_callback("Backup stopped during hashing.")
-                    break
-                log_callback(f"Could not read/hash {f.name}, skipping.")
-                continue
-            if h in existing_hashes:
-                skipped_count += 1
+            it = os.scandir(folder)
+        except OSError as e:
+            if on_error:
+                on_error(folder, e)
+            continue
+        subdirs = []
+        with it:
+            for entry in it:
+                rel = prefix + entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if ((max_depth is None or depth < max_depth) and rel not in skip_dirs
+                                and not (exclude and glob_match(rel, entry.name, exclude))):
+                            subdirs.append((entry.path, rel + "/", depth + 1))
+                        continue
+                    if not entry.is_file():
+                        continue
+                    if exclude and glob_match(rel, entry.name, exclude):
+                        continue
+                    if include and not glob_match(rel, entry.name, include):
+                        continue
+                    st = entry.stat()
+                except OSError as e:
+                    if on_error:
+                        on_error(entry.path, e)
+                    continue
+                yield SourceFile(Path(entry.path), rel, st.st_size, st.st_mtime_ns,
+                                 st.st_ino or entry.inode(), st.st_ctime)
+        stack.extend(reversed(subdirs))
+
+def scan_changed_paths(source: Path, paths, include=(), exclude=(), max_depth=None, skip_dirs=(), on_error=None):
+    """ Turns change-event paths into SourceFiles with the same filters as scan_source; folders are scanned whole """
+    yielded = set()
+    for f in _scan_changed_paths(source, paths, include, exclude, max_depth, skip_dirs, on_error):
+        if f.rel not in yielded:
+            yielded.add(f.rel)
+            yield f
+
+def _scan_changed_paths(source: Path, paths, include, exclude, max_depth, skip_dirs, on_error):
+    for raw in sorted(set(paths)):
+        path = Path(raw)
+        try:
+            rel = path.relative_to(source).as_posix()
+            st = path.stat()
+        except ValueError:
+            continue
+        except OSError:
+            continue  # Deleted again before we got to it
+        parts = rel.split("/")
+        if any("/".join(parts[:i]) in skip_dirs for i in range(1, len(parts) + 1)):
+            continue
+        depth = len(parts) - 1
+        if stat.S_ISDIR(st.st_mode):
+            if max_depth is not None and depth >= max_depth:
                 continue
-            target_folder = ensure_backup_subfolder(backup, f)
-            target_path = target_folder / f.name
-            if target_path.exists():
-                ts = datetime.now().strftime("%H%M%S")
-                target_path = target_folder / f"{f.stem}_{ts}{f.suffix}"
-            shutil.copy2(f, target_path)
-            existing_hashes.add(h)
-            log_callback(f"Copied {f.name} -> {target_path.relative_to(backup)}")
-            copied_count += 1
-        except Exception as e:
-            log_callback(f"Error copying {f.name}: {e}")
+            for f in scan_source(path, include, exclude, None if max_depth is None else max_depth - depth - 1,
+                                 {d[len(rel) + 1:] for d in skip_dirs if d.startswith(rel + "/")}, on_error):
+                yield f._replace(rel=f"{rel}/{f.rel}")
+            continue
+        if max_depth is not None and depth > max_depth:
+            continue
+        if exclude and glob_match(rel, path.name, exclude):
+            continue
+        if include and not glob_match(rel, path.name, include):
+            continue
+        yield SourceFile(path, rel, st.st_size, st.st_mtime_ns, st.st_ino, st.st_ctime)
+
+# ----------------- Run metrics -----------------
+METRICS_FILE_NAME = "last_run.json"
+PROFILES_DIR_NAME = "profiles"
+PROFILE_MODES = ("cprofile", "sample")
+PROFILE_SAMPLE_INTERVAL = 0.005
+THROUGHPUT_BUCKETS_MB_S = (1, 10, 50, 100, 250, 500, 1000, 2500)
+QUEUE_DEPTH_BUCKETS = (0, 1, 4, 16, 64, 256)
 
-    if skipped_count > 0:
-        log_callback(f"Skipped {skipped_count} duplicate files.")
-    progress_callback(100, "")
-    log_callback(f"Backup run complete. Copied {copied_count} new files.")
+class Histogram:
+    """ Fixed-bucket histogram (Prometheus style: each bucket counts values <= its bound) """
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                break
+        else:
+            i = len(self.bounds)
+        self.counts[i] += 1
+        self.total += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def cumulative(self):
+        """ (upper bound, cumulative count) pairs ending with +Inf """
+        running = list(itertools.accumulate(self.counts))
+        return list(zip([str(b) for b in self.bounds] + ["+Inf"], running))
+
+    def to_dict(self):
+        return {"count": self.count, "mean": round(self.total / self.count, 3) if self.count else 0,
+                "max": round(self.max, 3), "buckets": dict(self.cumulative())}
+
+class RunMetrics:
+    """ Thread-safe phase timers, counters and histograms for one backup run.
+
+    Phase "seconds" are summed over every worker that spent time in the phase; "wall_seconds"
+    is the span from the phase's first start to its last end, so parallel phases overlap.
+    """
+    COUNTERS = ("files_scanned", "files_unchanged", "files_duplicate", "files_copied", "errors",
+                "files_packed", "bytes_hashed", "bytes_read", "bytes_written", "bytes_deduplicated")
 
-# ----------------- GUI Application -----------------
-class SmartOrganizerApp(ctk.CTk):
     def __init__(self):
-# ... existing code ...
-        super().__init__()
-        self.title("Smart File Organizer Pro v5 (EXE-Ready)")
-        self.geometry("900x600")
-        
-        # --- MODIFIED: Bind close button ("X") to hide_to_tray ---
-        self.protocol("WM_DELETE_WINDOW", self.hide_to_tray)
+        self.lock = Lock()
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+        self.status = "running"
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.phases = {}
+        self.histograms = {
+            "hash_mb_per_s": Histogram(THROUGHPUT_BUCKETS_MB_S),
+            "copy_mb_per_s": Histogram(THROUGHPUT_BUCKETS_MB_S),
+            "hash_queue_depth": Histogram(QUEUE_DEPTH_BUCKETS),
+            "copy_queue_depth": Histogram(QUEUE_DEPTH_BUCKETS),
+        }
+        # Limits in force at the end of the run and time spent waiting on them (Throttle.snapshot)
+        self.throttle = None
 
-        # state
-# ... existing code ...
-        self.auto_thread = None
-        self.manual_thread = None
-        self.stop_event = Event()
-        self.is_running_auto = False
-        self.is_running_manual = False
+    def add(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
 
-        # --- NEW: Tray icon state ---
-# ... existing code ...
-        self.tray_icon = None
-        self.tray_thread = None
-        # ----------------------------
+    def observe(self, name, value):
+        with self.lock:
+            self.histograms[name].observe(value)
 
-        self.gui_queue = queue.Queue()
-# ... existing code ...
-        self.after(100, self.process_gui_queue)
+    def record_phase(self, name, started, ended):
+        """ Adds one perf_counter interval to a phase """
+        with self.lock:
+            phase = self.phases.setdefault(name, {"seconds": 0.0, "first": started, "last": ended, "calls": 0})
+            phase["seconds"] += ended - started
+            phase["first"] = min(phase["first"], started)
+            phase["last"] = max(phase["last"], ended)
+            phase["calls"] += 1
 
-        self.grid_columnconfigure(1, weight=1)
-# ... existing code ...
-        self.grid_rowconfigure(0, weight=1)
+    @contextlib.contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_phase(name, started, time.perf_counter())
 
-        self.sidebar = ctk.CTkFrame(self, width=180)
-# ... existing code ...
-        self.sidebar.grid(row=0, column=0, sticky="nswe", padx=(10, 5), pady=10)
-        self.main = ctk.CTkFrame(self)
-        self.main.grid(row=0, column=1, sticky="nswe", padx=(5, 10), pady=10)
+    def finish(self, status):
+        self.status = status
+        self.duration = time.perf_counter() - self._started
 
-        ctk.CTkLabel(self.sidebar, text="Smart Organizer", font=ctk.CTkFont(size=18, weight="bold")).pack(pady=(10,20))
-# ... existing code ...
-        self.btn_organizer = ctk.CTkButton(self.sidebar, text="Manual Backup", command=lambda: self.show_frame("organizer"))
-        self.btn_auto = ctk.CTkButton(self.sidebar, text="Automation", command=lambda: self.show_frame("auto"))
-        self.btn_logs = ctk.CTkButton(self.sidebar, text="Logs", command=lambda: self.show_frame("logs"))
-        for b in (self.btn_organizer, self.btn_auto, self.btn_logs):
-            b.pack(fill="x", padx=12, pady=6)
-        self.status_label = ctk.CTkLabel(self.sidebar, text="Status: Idle", anchor="w", font=ctk.CTkFont(size=12))
-# ... existing code ...
-        self.status_label.pack(side="bottom", fill="x", padx=12, pady=(10,10))
+    def throughput(self):
+        """ Achieved rates over the whole run: MB/s read and written, files/s hashed or copied """
+        seconds = self.duration or (time.perf_counter() - self._started)
+        if seconds <= 0:
+            return {"read_mb_s": 0.0, "write_mb_s": 0.0, "files_per_s": 0.0}
+        with self.lock:
+            handled = self.counters["files_duplicate"] + self.counters["files_copied"]
+            return {"read_mb_s": round(self.counters["bytes_read"] / (1024 * 1024) / seconds, 3),
+                    "write_mb_s": round(self.counters["bytes_written"] / (1024 * 1024) / seconds, 3),
+                    "files_per_s": round(handled / seconds, 3)}
 
-        self.frames = {}
-# ... existing code ...
-        self._create_organizer_frame()
-        self._create_auto_frame()
-        self._create_logs_frame()
+    def to_dict(self):
+        throughput = self.throughput()
+        with self.lock:
+            return {
+                "started_at": datetime.fromtimestamp(self.started_at).isoformat(timespec="seconds"),
+                "status": self.status,
+                "duration_seconds": round(self.duration or 0.0, 4),
+                "phases": {name: {"seconds": round(p["seconds"], 4), "wall_seconds": round(p["last"] - p["first"], 4),
+                                  "calls": p["calls"]} for name, p in self.phases.items()},
+                "counters": dict(self.counters),
+                "histograms": {name: h.to_dict() for name, h in self.histograms.items()},
+                "throughput": throughput,
+                "throttle": self.throttle,
+            }
 
-        self.show_frame("organizer")
+    def summary_line(self):
+        """ One human-readable line for the log views """
+        phases = ", ".join(f"{name} {p['seconds']:.2f}s" for name, p in self.phases.items())
+        mb = lambda n: f"{n / (1024 * 1024):.1f} MB"
+        rates = self.throughput()
+        waited = f", {self.throttle['waited_seconds']:.1f}s throttled" if self.throttle and self.throttle["waited_seconds"] else ""
+        return (f"Run metrics: {self.duration or 0:.2f}s total; busy time {phases or 'none'}; "
+                f"read {mb(self.counters['bytes_read'])} ({rates['read_mb_s']:.1f} MB/s), "
+                f"written {mb(self.counters['bytes_written'])} ({rates['write_mb_s']:.1f} MB/s), "
+                f"{rates['files_per_s']:.1f} files/s{waited}, {self.counters['errors']} errors.")
 
-        # --- NEW: Setup and start the tray icon ---
-# ... existing code ...
-        self.setup_tray_icon()
-        # ------------------------------------------
+    def to_prometheus(self, labels=None, prefix="smart_organizer"):
+        """ Node-exporter textfile format; gauges describe the most recent run """
+        def fmt(extra=None):
+            pairs = dict(labels or {}, **(extra or {}))
+            if not pairs:
+                return ""
+            escape = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in pairs.items()) + "}"
+        data = self.to_dict()
+        lines = []
+        def gauge(name, help_text, samples):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            for extra, value in samples:
+                lines.append(f"{prefix}_{name}{fmt(extra)} {value}")
+        gauge("last_run_start_timestamp_seconds", "Start time of the last backup run.", [(None, round(self.started_at, 3))])
+        gauge("last_run_duration_seconds", "Wall time of the last backup run.", [(None, data["duration_seconds"])])
+        gauge("last_run_success", "1 if the last run completed, 0 if it was stopped.",
+              [(None, int(self.status == "completed"))])
+        gauge("last_run_phase_seconds", "Busy time per phase, summed over workers.",
+              [({"phase": n}, p["seconds"]) for n, p in data["phases"].items()])
+        gauge("last_run_phase_wall_seconds", "Span from first start to last end of each phase.",
+              [({"phase": n}, p["wall_seconds"]) for n, p in data["phases"].items()])
+        gauge("last_run_files", "Files handled in the last run by outcome.",
+              [({"outcome": k[len("files_"):]}, v) for k, v in data["counters"].items() if k.startswith("files_")])
+        gauge("last_run_bytes", "Bytes handled in the last run.",
+              [({"kind": k[len("bytes_"):]}, v) for k, v in data["counters"].items() if k.startswith("bytes_")])
+        gauge("last_run_errors", "Errors logged during the last run.", [(None, data["counters"]["errors"])])
+        gauge("last_run_throughput", "Achieved average rates in the last run (MB/s read and written, files/s).",
+              [({"kind": k}, v) for k, v in data["throughput"].items()])
+        if data["throttle"]:
+            gauge("last_run_throttle_limit", "Throttle limits at the end of the last run (0 = unlimited).",
+                  [({"kind": k}, v) for k, v in data["throttle"].items() if k != "waited_seconds"])
+            gauge("last_run_throttle_wait_seconds", "Time workers spent waiting on the throttle, summed.",
+                  [(None, data["throttle"]["waited_seconds"])])
+        with self.lock:
+            for name, h in self.histograms.items():
+                lines.append(f"# HELP {prefix}_last_run_{name} Per-file {name.replace('_', ' ')} in the last run.")
+                lines.append(f"# TYPE {prefix}_last_run_{name} histogram")
+                for bound, count in h.cumulative():
+                    lines.append(f"{prefix}_last_run_{name}_bucket{fmt({'le': bound})} {count}")
+                lines.append(f"{prefix}_last_run_{name}_sum{fmt()} {round(h.total, 3)}")
+                lines.append(f"{prefix}_last_run_{name}_count{fmt()} {h.count}")
+        return "\n".join(lines) + "\n"
 
-    # ---------- Thread-safe GUI updates (Unchanged) ----------
-    def process_gui_queue(self):
-# ... existing code ...
-        while not self.gui_queue.empty():
-            try:
-                task, args = self.gui_queue.get_nowait()
-                task(*args)
-            except queue.Empty:
-                pass
-            except Exception as e:
-                print(f"Error processing GUI queue: {e}")
-        self.after(100, self.process_gui_queue)
+def write_atomic(path: Path, text: str):
+    """ Writes via a temp file + rename so readers (e.g. node exporter) never see half a file """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
 
-    def safe_log(self, text: str):
-# ... existing code ...
-        self.gui_queue.put((self._log_task, (text,)))
+def write_run_metrics(metrics: RunMetrics, source: Path, backup, options, log_callback):
+    """ JSON summary in each backup root's meta folder (plus options.metrics_path) and the optional Prometheus file """
+    roots = backup_roots(backup)
+    label = str(roots[0]) if len(roots) == 1 else ", ".join(str(root) for root in roots)
+    summary = dict(metrics.to_dict(), source=str(source), backup=str(roots[0]) if len(roots) == 1 else [str(r) for r in roots])
+    text = json.dumps(summary, indent=2)
+    targets = [meta_dir(root) / METRICS_FILE_NAME for root in roots]
+    targets += [Path(options.metrics_path)] if options.metrics_path else []
+    try:
+        for target in targets:
+            write_atomic(target, text)
+        if options.prometheus_path:
+            write_atomic(options.prometheus_path, metrics.to_prometheus({"source": source, "backup": label}))
+    except Exception as e:
+        log_callback(f"Error writing run metrics: {e}")
 
-    def safe_progress_update(self, percent, filename):
-# ... existing code ...
-        self.gui_queue.put((self._progress_update_task, (percent, filename)))
+class RunProfiler:
+    """ Optional hot-path profile of one run.
 
-    def safe_set_running_state(self, manual, auto):
-# ... existing code ...
-        self.gui_queue.put((self._set_running_state_task, (manual, auto)))
+    "cprofile" gives every pipeline thread its own cProfile.Profile (wrap the thread targets) and merges them
+    into one .prof file for pstats/snakeviz. "sample" polls all thread stacks every few milliseconds and
+    writes collapsed stacks (.folded) for flame graph tools; it costs far less on busy runs.
+    """
+    def __init__(self, mode: str, path: Path, log_callback):
+        self.mode = mode
+        self.path = Path(path)
+        self._log = log_callback
+        self._profiles = []
+        self._profiles_lock = Lock()
+        self._stacks = {}
+        self._stop = Event()
+        self._sampler = None
+        self._main = None
 
-    # ---------- GUI Task Implementations (Unchanged) ----------
-    def _log_task(self, text: str):
-# ... existing code ...
-        ts = datetime.now().strftime("%H:%M:%S")
-        line = f"[{ts}] {text}\n"
-        try:
-            self.log_preview.insert("end", line)
-            self.log_preview.see("end")
-            self.full_log.insert("end", line)
-            self.full_log.see("end")
-        except Exception as e:
-            print(f"Error updating log textbox: {e}")
+    def wrap(self, func):
+        if self.mode != "cprofile":
+            return func
+        import cProfile
 
-    def _progress_update_task(self, percent, filename):
-# ... existing code ...
+        def profiled(*args, **kwargs):
+            profile = cProfile.Profile()
+            with self._profiles_lock:
+                self._profiles.append(profile)
+            profile.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+        return profiled
+
+    def _sample(self):
+        own = get_ident()
+        while not self._stop.wait(PROFILE_SAMPLE_INTERVAL):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                key = ";".join(reversed(stack))
+                self._stacks[key] = self._stacks.get(key, 0) + 1
+
+    def __enter__(self):
+        if self.mode == "cprofile":
+            import cProfile
+            self._main = cProfile.Profile()
+            self._profiles.append(self._main)
+            self._main.enable()
+        else:
+            self._sampler = Thread(target=self._sample, daemon=True)
+            self._sampler.start()
+        return self
+
+    def __exit__(self, *exc):
         try:
-            self.progress.set(percent / 100.0)
-            if percent == 100:
-                self.live_label.configure(text="Idle")
-            elif filename:
-                self.live_label.configure(text=f"Processing: {filename} ({percent}%)")
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            if self.mode == "cprofile":
+                import pstats
+                self._main.disable()
+                stats = pstats.Stats(*self._profiles)
+                stats.dump_stats(str(self.path))
             else:
-                self.live_label.configure(text="Idle")
+                self._stop.set()
+                self._sampler.join()
+                lines = [f"{stack} {count}" for stack, count in sorted(self._stacks.items(), key=lambda kv: -kv[1])]
+                self.path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+            self._log(f"Profile written to {self.path}")
         except Exception as e:
-            print(f"Error updating progress: {e}")
-    
-    def _set_running_state_task(self, manual, auto):
-# ... existing code ...
-        self.is_running_manual = manual
-        self.is_running_auto = auto
-        is_running = manual or auto
-        if auto:
-            self.status_label.configure(text="Status: Schedule ON", text_color="green")
-        elif manual:
-            self.status_label.configure(text="Status: Backup Running...", text_color="orange")
+            self._log(f"Error writing profile: {e}")
+        return False
+
+def profile_output_path(backup: Path, mode: str):
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    return meta_dir(backup) / PROFILES_DIR_NAME / f"run-{stamp}.{'prof' if mode == 'cprofile' else 'folded'}"
+
+# ----------------- Progress -----------------
+PROGRESS_INTERVAL = 0.25  # seconds between progress callbacks
+PROGRESS_LOG_INTERVAL = 60.0  # seconds between progress log lines of headless runs without a terminal
+THROUGHPUT_WINDOW = 10.0  # seconds of history behind the moving-average MB/s
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+def format_size(nbytes):
+    for unit in ("B", "KB", "MB", "GB"):
+        if nbytes < 1024:
+            return f"{nbytes:.0f} {unit}" if unit == "B" else f"{nbytes:.1f} {unit}"
+        nbytes /= 1024
+    return f"{nbytes:.1f} TB"
+
+def _takes_progress_stats(callback):
+    """ True if a progress callback accepts a third (ProgressSnapshot) argument; older two-argument
+    callbacks keep getting (percent, label) only
+    """
+    import inspect  # Only needed once per run; kept off the startup path
+    try:
+        params = list(inspect.signature(callback).parameters.values())
+    except (TypeError, ValueError):
+        return False
+    if any(p.kind == p.VAR_POSITIONAL for p in params):
+        return True
+    return len([p for p in params if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD)]) >= 3
+
+@dataclass(frozen=True)
+class ProgressSnapshot:
+    """ Third argument of progress_callback during a backup run, for callbacks that take one """
+    bytes_done: int
+    bytes_total: int
+    files_done: int
+    files_total: int
+    mb_per_s: float
+    eta_seconds: Optional[float]
+    # False while the scan is still running and bytes_total is an estimate
+    total_known: bool
+
+    def describe(self):
+        """ e.g. "1.2 GB / 4.0 GB, 85.3 MB/s, ETA 0m34s" """
+        total = format_size(self.bytes_total) + ("" if self.total_known else "+")
+        eta = f", ETA {format_duration(self.eta_seconds)}" if self.eta_seconds is not None else ""
+        return f"{format_size(self.bytes_done)} / {total}, {self.mb_per_s:.1f} MB/s{eta}"
+
+    def as_dict(self):
+        return {"bytes_done": self.bytes_done, "bytes_total": self.bytes_total, "files_done": self.files_done,
+                "files_total": self.files_total, "mb_per_s": round(self.mb_per_s, 3),
+                "eta_seconds": None if self.eta_seconds is None else round(self.eta_seconds, 1),
+                "total_known": self.total_known}
+
+class _FileProgress:
+    __slots__ = ("size", "credited", "copies")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.credited = 0
+        self.copies = 0
+
+class ProgressMeter:
+    """ Byte-weighted progress for one backup run.
+
+    Every source file weighs its size. Unchanged and duplicate files count as done at once; a
+    file being read advances with the bytes read or written for it, reported from inside the
+    hash and copy loops through a metered throttle. The hash pass may advance a file up to
+    half of its weight, the copies cover whatever is left, and a handled file always ends at
+    exactly its size. MB/s is a moving average over THROUGHPUT_WINDOW seconds of those
+    in-flight bytes, and the ETA divides what is left by it. Callbacks are rate-limited to one
+    per interval.
+    """
+    def __init__(self, callback, callback_lock: Lock, interval=PROGRESS_INTERVAL, window=THROUGHPUT_WINDOW):
+        self.callback = callback
+        self.with_stats = _takes_progress_stats(callback)
+        self.callback_lock = callback_lock
+        self.interval = interval
+        self.window = window
+        self.lock = Lock()
+        self.bytes_total = 0
+        self.bytes_done = 0
+        self.files_total = 0
+        self.files_done = 0
+        # Previous run's total, the estimate while the scan is still going
+        self.expected_bytes = 0
+        self.total_known = False
+        self.label = ""
+        self._streamed = 0
+        self._samples = deque([(time.monotonic(), 0)])
+        self._files = {}
+        self._current = local()
+        self._last_emit = 0.0
+
+    def found(self, f):
+        with self.lock:
+            self.bytes_total += f.size
+            self.files_total += 1
+            self._files[f.path] = _FileProgress(f.size)
+
+    def scan_finished(self):
+        with self.lock:
+            self.total_known = True
+
+    def begin(self, f, share=None):
+        """ Following I/O on this thread advances f. share is the part of its remaining weight this
+        pass covers; by default an even split over the copies still to do.
+        """
+        with self.lock:
+            record = self._files.get(f.path)
+            if share is None:
+                share = 1 / max(1, record.copies) if record else 0.0
+            scale = (record.size - record.credited) * share / record.size if record and record.size else 0.0
+        self._current.job = (record, scale, [0, 0])
+
+    def end(self):
+        self._current.job = None
+
+    def io(self, nbytes, written=False):
+        """ Called for every chunk read or written; only the larger direction of a pass advances it """
+        job = getattr(self._current, "job", None)
+        if not job or not job[0]:
+            return
+        record, scale, moved = job
+        before = max(moved)
+        moved[written] += nbytes
+        gained = (max(moved) - before) * scale
+        if not gained:
+            return
+        with self.lock:
+            gained = min(gained, record.size - record.credited)
+            record.credited += gained
+            self.bytes_done += gained
+            self._streamed += gained
+        self.emit()
+
+    def expect_copies(self, f, copies: int):
+        with self.lock:
+            record = self._files.get(f.path)
+            if record:
+                record.copies = copies
+        if not copies:
+            self.done(f)
+
+    def copy_done(self, f):
+        with self.lock:
+            record = self._files.get(f.path)
+            if record:
+                record.copies -= 1
+            last = record is not None and record.copies <= 0
+        if last:
+            self.done(f)
+
+    def done(self, f):
+        """ The file is fully handled (copied, duplicate, unchanged or failed): it counts in full """
+        with self.lock:
+            record = self._files.pop(f.path, None)
+            if record:
+                self.bytes_done += record.size - record.credited
+                self.files_done += 1
+        self.emit()
+
+    def skipped(self, f):
+        """ A file that needs no work at all (unchanged since the last run) """
+        with self.lock:
+            self.bytes_total += f.size
+            self.bytes_done += f.size
+            self.files_total += 1
+            self.files_done += 1
+        self.emit()
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self.lock:
+            samples = self._samples
+            samples.append((now, self._streamed))
+            while len(samples) > 2 and now - samples[1][0] >= self.window:
+                samples.popleft()
+            (t0, b0), (t1, b1) = samples[0], samples[-1]
+            rate = (b1 - b0) / (t1 - t0) if t1 > t0 else 0.0
+            total = self.bytes_total if self.total_known else max(self.bytes_total, self.expected_bytes)
+            remaining = max(0, total - self.bytes_done)
+            eta = remaining / rate if rate > 0 else None
+            return ProgressSnapshot(int(self.bytes_done), int(total), self.files_done, self.files_total,
+                                    rate / (1024 * 1024), eta, self.total_known)
+
+    def percent(self, snapshot: ProgressSnapshot):
+        if not snapshot.bytes_total:
+            return 0 if not snapshot.files_total else min(99, int(snapshot.files_done / snapshot.files_total * 100))
+        return min(99, int(snapshot.bytes_done / snapshot.bytes_total * 100))
+
+    def emit(self, force=False):
+        now = time.monotonic()
+        with self.lock:
+            if not force and now - self._last_emit < self.interval:
+                return
+            self._last_emit = now
+        snapshot = self.snapshot()
+        with self.callback_lock:
+            self._call(self.percent(snapshot), self.label, snapshot)
+
+    def _call(self, percent, label, snapshot):
+        if self.with_stats:
+            self.callback(percent, label, snapshot)
         else:
-            self.status_label.configure(text="Status: Idle", text_color="gray")
-        self.btn_run_once.configure(text="Run Backup Now" if not manual else "Stop Backup",
-                                    fg_color="#1f6feb" if not manual else "red",
-                                    state="normal" if not auto else "disabled")
-        self.btn_browse_source.configure(state="disabled" if is_running else "normal")
-        self.btn_browse_backup.configure(state="disabled" if is_running else "normal")
-        self.btn_start_auto.configure(state="disabled" if is_running else "normal")
-        self.btn_stop_auto.configure(state="normal" if auto else "disabled")
-        self.schedule_combo.configure(state="disabled" if is_running else "normal")
-        self.hour_combo.configure(state="disabled" if is_running else "normal")
-
-
-    # ---------- Frames (Unchanged) ----------
-    def _create_organizer_frame(self):
-# ... existing code ...
-        frm = ctk.CTkFrame(self.main)
-        frm.grid_columnconfigure(1, weight=1)
-        self.frames["organizer"] = frm
-        ctk.CTkLabel(frm, text="Manual Backup", font=ctk.CTkFont(size=16, weight="bold")).grid(row=0, column=0, columnspan=3, pady=8)
-        ctk.CTkLabel(frm, text="Source Folder:").grid(row=1, column=0, sticky="w", padx=12)
-        self.source_var = ctk.StringVar()
-        self.source_entry = ctk.CTkEntry(frm, textvariable=self.source_var)
-        self.source_entry.grid(row=1, column=1, sticky="ew", padx=6, pady=6)
-        self.btn_browse_source = ctk.CTkButton(frm, text="Browse", width=80, command=self.browse_source)
-        self.btn_browse_source.grid(row=1, column=2, padx=(0, 12), pady=6)
-        ctk.CTkLabel(frm, text="Backup Folder:").grid(row=2, column=0, sticky="w", padx=12)
-        self.backup_var = ctk.StringVar()
-        self.backup_entry = ctk.CTkEntry(frm, textvariable=self.backup_var)
-        self.backup_entry.grid(row=2, column=1, sticky="ew", padx=6, pady=6)
-        self.btn_browse_backup = ctk.CTkButton(frm, text="Browse", width=80, command=self.browse_backup)
-        self.btn_browse_backup.grid(row=2, column=2, padx=(0, 12), pady=6)
-        action_row = ctk.CTkFrame(frm)
-        action_row.grid(row=3, column=0, columnspan=3, sticky="ew", padx=12, pady=10)
-        self.btn_run_once = ctk.CTkButton(action_row, text="Run Backup Now", command=self.toggle_manual_backup, fg_color="#1f6feb")
-        self.btn_run_once.pack(side="left", padx=6)
-        self.btn_clear_log = ctk.CTkButton(action_row, text="Clear Log", command=self.clear_log)
-        self.btn_clear_log.pack(side="left", padx=6)
-        self.progress = ctk.CTkProgressBar(frm)
-        self.progress.set(0)
-        self.progress.grid(row=4, column=0, columnspan=3, sticky="ew", padx=12, pady=(10, 2))
-        self.live_label = ctk.CTkLabel(frm, text="Idle", anchor="w")
-        self.live_label.grid(row=5, column=0, columnspan=3, sticky="ew", padx=12)
-        ctk.CTkLabel(frm, text="Recent Log:").grid(row=6, column=0, columnspan=3, sticky="w", padx=20, pady=(20,0))
-        self.log_preview = ctk.CTkTextbox(frm, height=150)
-        self.log_preview.grid(row=7, column=0, columnspan=3, sticky="nswe", padx=12, pady=6)
-        frm.grid_rowconfigure(7, weight=1)
-
-    def _create_auto_frame(self):
-# ... existing code ...
-        frm = ctk.CTkFrame(self.main)
-        self.frames["auto"] = frm
-        frm.grid_columnconfigure(0, weight=1)
-        ctk.CTkLabel(frm, text="Automation / Scheduled Backup", font=ctk.CTkFont(size=16, weight="bold")).pack(pady=8)
-        ctk.CTkLabel(frm, text="Set a schedule to run the backup automatically.").pack(pady=(0,10), padx=12)
-        info_frame = ctk.CTkFrame(frm, fg_color="transparent")
-        info_frame.pack(fill="x", padx=12, pady=10)
-        info_frame.grid_columnconfigure(1, weight=1)
-        ctk.CTkLabel(info_frame, text="Source:").grid(row=0, column=0, sticky="w")
-        self.auto_src_label = ctk.CTkLabel(info_frame, text="(not set)", anchor="w", fg_color="gray10", corner_radius=5)
-        self.auto_src_label.grid(row=0, column=1, sticky="ew", padx=5)
-        ctk.CTkLabel(info_frame, text="Backup:").grid(row=1, column=0, sticky="w", pady=(8,0))
-        self.auto_bkp_label = ctk.CTkLabel(info_frame, text="(not set)", anchor="w", fg_color="gray10", corner_radius=5)
-        self.auto_bkp_label.grid(row=1, column=1, sticky="ew", padx=5, pady=(8,0))
-        schedule_frame = ctk.CTkFrame(frm)
-        schedule_frame.pack(fill="x", padx=12, pady=10)
-        ctk.CTkLabel(schedule_frame, text="Schedule:").grid(row=0, column=0, padx=5, pady=10)
-        self.schedule_var = ctk.StringVar(value="Disabled")
-        self.schedule_combo = ctk.CTkComboBox(
-            schedule_frame,
-            variable=self.schedule_var,
-            values=["Disabled", "Run every hour", "Run every day at..."],
-            command=self.on_schedule_change
-        )
-        self.schedule_combo.grid(row=0, column=1, padx=5, pady=10)
-        self.hour_label = ctk.CTkLabel(schedule_frame, text="Hour (0-23):")
-        self.hour_label.grid(row=0, column=2, padx=(10, 5), pady=10)
-        self.hour_var = ctk.StringVar(value="8")
-        self.hour_combo = ctk.CTkComboBox(
-            schedule_frame,
-            variable=self.hour_var,
-            width=70,
-            values=[str(h) for h in range(24)]
-        )
-        self.hour_combo.grid(row=0, column=3, padx=5, pady=10)
-        btn_row = ctk.CTkFrame(frm)
-        btn_row.pack(pady=20)
-        self.btn_start_auto = ctk.CTkButton(btn_row, text="Start Schedule", command=self.start_auto_backup, fg_color="green")
-        self.btn_stop_auto = ctk.CTkButton(btn_row, text="Stop Schedule", command=self.stop_auto_backup, fg_color="red", state="disabled")
-        self.btn_start_auto.grid(row=0, column=0, padx=6)
-        self.btn_stop_auto.grid(row=0, column=1, padx=6)
-        self.on_schedule_change(self.schedule_var.get())
-
-    def on_schedule_change(self, choice):
-# ... existing code ...
-        if choice == "Run every day at...":
-            self.hour_label.grid()
-            self.hour_combo.grid()
+            self.callback(percent, label)
+
+    def finish(self):
+        """ The final 100% callback, with the run's totals and average rate """
+        self._call(100, "", self.snapshot())
+
+class _MeteredThrottle:
+    """ A run's view of a (possibly caller-owned) Throttle that also reports every chunk to a ProgressMeter """
+    def __init__(self, throttle: Throttle, meter: ProgressMeter):
+        self._throttle = throttle
+        self._meter = meter
+
+    def __getattr__(self, name):
+        return getattr(self._throttle, name)
+
+    def read(self, amount, stop_event: Event = None):
+        if not self._throttle.read(amount, stop_event):
+            return False
+        self._meter.io(amount)
+        return True
+
+    def write(self, amount, stop_event: Event = None):
+        if not self._throttle.write(amount, stop_event):
+            return False
+        self._meter.io(amount, written=True)
+        return True
+
+# ----------------- Backup pipeline -----------------
+def default_hash_workers():
+    return max(2, min(8, os.cpu_count() or 2))
+
+def default_copy_workers():
+    return max(2, min(4, (os.cpu_count() or 2) // 2))
+
+@dataclass
+class BackupOptions:
+    """ Tunables for run_backup_once, shared by the GUI and headless runs """
+    hash_workers: int = field(default_factory=default_hash_workers)
+    copy_workers: int = field(default_factory=default_copy_workers)
+    algorithm: str = DEFAULT_DIGEST_ALGORITHM
+    buffer_size: int = DEFAULT_BUFFER_SIZE
+    queue_size: int = 256
+    include: list = field(default_factory=list)
+    exclude: list = field(default_factory=list)
+    max_depth: Optional[int] = None
+    use_journal: bool = True
+    digest_on_copy: bool = False
+    content_addressed: bool = False
+    metrics_path: Optional[str] = None
+    prometheus_path: Optional[str] = None
+    profile: Optional[str] = None
+    profile_path: Optional[str] = None
+    read_limit_mb: float = 0.0
+    write_limit_mb: float = 0.0
+    files_per_second: float = 0.0
+    io_class: Optional[str] = None
+    nice: int = 0
+    # Files at least this large are split into content-defined chunks (0 = never)
+    chunk_threshold_mb: float = 0.0
+    # Files smaller than this are appended to tar segments instead of copied one by one (0 = never)
+    pack_threshold_kb: float = 0.0
+    # Where backup roots keep their files: "filesystem" or "objstore" (the object-store emulator)
+    storage: str = "filesystem"
+    storage_connections: int = DEFAULT_STORAGE_CONNECTIONS
+    # Object-store uploads larger than this go up as parallel multipart uploads
+    multipart_mb: float = DEFAULT_MULTIPART_MB
+    # Plan only: report what would be copied where, without writing to the backup
+    dry_run: bool = False
+    plan_path: Optional[str] = None
+
+_DONE = object()
+
+class _LocalityQueue(queue.Queue):
+    """ Bounded copy queue that hands out the queued file with the lowest source inode first, so
+    copies read the source roughly in on-disk order; _DONE sorts after every file.
+    """
+    def _init(self, maxsize):
+        self.queue = []
+        self._order = itertools.count()
+
+    def _qsize(self):
+        return len(self.queue)
+
+    def _put(self, item):
+        key = float("inf") if item is _DONE else item[0].inode
+        heapq.heappush(self.queue, (key, next(self._order), item))
+
+    def _get(self):
+        return heapq.heappop(self.queue)[2]
+
+# Names that differ only in case collide on Windows and macOS filesystems
+_name_key = str.casefold if os.name == "nt" or sys.platform == "darwin" else str
+
+class TargetPlanner:
+    """ Resolves type/date target paths for one backup root with as few syscalls as possible.
+
+    The folder comes from the ctime the scan already has; each target folder is listed once
+    (or created once, when missing) and then tracked in memory with the names reserved by this
+    run, so picking a free name needs no exists() per file. With create=False nothing is
+    written and new_folders lists what a real run would create. Given an index, the names of
+    files packed into segments count as taken too. Folders are listed through the root's
+    storage backend, one list request per folder on an object store.
+    """
+    def __init__(self, backup: Path, create=True, index: BackupIndex = None, storage: StorageBackend = None):
+        self.backup = backup
+        self.create = create
+        self.index = index
+        self.storage = storage or FilesystemBackend(backup)
+        self.lock = Lock()
+        self._names = {}
+        self.new_folders = []
+
+    def _taken(self, folder: Path):
+        names = self._names.get(folder)
+        if names is None:
+            folder_rel = folder.relative_to(self.backup).as_posix()
+            prefix = folder_rel + "/"
+            names = {_name_key(key[len(prefix):].split("/", 1)[0])
+                     for key, _ in self.storage.list(prefix, with_stat=False)}
+            if not names and not folder.is_dir():
+                if self.create:
+                    self.storage.make_folder(folder_rel)
+                self.new_folders.append(folder)
+            if self.index is not None:
+                names.update(_name_key(name) for name in self.index.packed_names(folder_rel))
+            self._names[folder] = names
+        return names
+
+    def reserve(self, f, suffix=""):
+        """ Claims a free target path for a SourceFile: its own name, else name_HHMMSS[_n] """
+        path = f.path
+        with self.lock:
+            folder = backup_subfolder(self.backup, path, f.ctime)
+            taken = self._taken(folder)
+            name = f"{path.name}{suffix}"
+            if _name_key(name) in taken:
+                ts = datetime.now().strftime("%H%M%S")
+                name = f"{path.stem}_{ts}{path.suffix}{suffix}"
+                n = 1
+                while _name_key(name) in taken:
+                    name = f"{path.stem}_{ts}_{n}{path.suffix}{suffix}"
+                    n += 1
+            taken.add(_name_key(name))
+            return folder / name
+
+    def claim_segment(self, folder: Path):
+        """ Claims the next free pack segment name in a folder """
+        with self.lock:
+            taken = self._taken(folder)
+            n = 1
+            while _name_key(f"{PACK_SEGMENT_PREFIX}{n:04d}.tar") in taken:
+                n += 1
+            name = f"{PACK_SEGMENT_PREFIX}{n:04d}.tar"
+            taken.add(_name_key(name))
+            return folder / name
+
+    def release(self, target: Path):
+        """ Frees a reserved name whose copy did not happen """
+        with self.lock:
+            self._names.get(target.parent, set()).discard(_name_key(target.name))
+
+class BackupDestination:
+    """ One backup root of a run. Each has its own index, copy queue, copy workers and target
+    reservations, so a slow destination falls behind on its own instead of stalling the others.
+    """
+    def __init__(self, backup: Path, index: BackupIndex, queue_size: int, dry_run=False):
+        self.backup = backup
+        self.index = index
+        self.storage = index.storage
+        self.copy_queue = _LocalityQueue(maxsize=queue_size)
+        self.planner = TargetPlanner(backup, create=not dry_run, index=index, storage=self.storage)
+        self.packer = None if dry_run else PackWriter(backup, index, self.planner)
+        # Dry runs: (SourceFile, target path, mode) for every copy that would happen
+        self.plan = []
+        self.copied_count = 0
+        self.skipped_count = 0
+        self.unchanged_count = 0
+        # Journal entries from this generation on count as done; None re-checks every file
+        self.skip_since = None
+        self.checkpoint_key = None
+        self.resume_from = None
+
+class BackupPipeline:
+    """ Scanner -> N hashing workers -> M copy workers per destination, linked by bounded queues.
+
+    Each source file is read and hashed once, however many destinations there are; files
+    needed by several destinations go out as a SharedRead. Callbacks are funneled through
+    one lock, so log_callback and progress_callback are still called one at a time, exactly
+    like the old single-threaded loop. Progress is byte-weighted (see ProgressMeter); a
+    progress_callback that takes a third argument gets a ProgressSnapshot with it.
+    """
+    def __init__(self, files, destinations, options: BackupOptions, log_callback, progress_callback,
+                 stop_event: Event, metrics: RunMetrics = None, profiler=None, throttle=None):
+        self.files = files
+        self.destinations = list(destinations)
+        self.options = options
+        self.stop_event = stop_event
+        self._log = log_callback
+        self._progress = progress_callback
+        self.metrics = metrics or RunMetrics()
+        self.profiler = profiler
+        self.callback_lock = Lock()
+        self.meter = ProgressMeter(progress_callback, self.callback_lock)
+        # Every chunk read or written for a file moves its progress, including those read by the index
+        self.throttle = _MeteredThrottle(throttle or Throttle.from_options(options), self.meter)
+        for dest in self.destinations:
+            dest.index.throttle = self.throttle
+        self.fanout_budget = FanOutBudget()
+        self.scanned = 0
+        self.scan_done = False
+        self.unchanged_count = 0
+        self.source_key = None
+        self.started_at = time.time()
+        self.generation = time.time_ns()
+        self.hash_queue = queue.Queue(maxsize=options.queue_size)
+        self.processed = 0
+
+    @property
+    def copied_count(self):
+        return sum(dest.copied_count for dest in self.destinations)
+
+    @property
+    def skipped_count(self):
+        return sum(dest.skipped_count for dest in self.destinations)
+
+    def log(self, text: str):
+        with self.callback_lock:
+            self._log(text)
+
+    def _put(self, q, item):
+        """ Blocking put that gives up once the run is stopped """
+        while not self.stop_event.is_set():
+            try:
+                q.put(item, timeout=0.2)
+                if item is not _DONE:
+                    self.metrics.observe("hash_queue_depth" if q is self.hash_queue else "copy_queue_depth", q.qsize())
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while not self.stop_event.is_set():
+            try:
+                return q.get(timeout=0.2)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def run(self):
+        wrap = self.profiler.wrap if self.profiler else (lambda func: func)
+        hashers = [Thread(target=wrap(self._hash_worker), daemon=True) for _ in range(max(1, self.options.hash_workers))]
+        copiers = [(dest, Thread(target=wrap(self._copy_worker), args=(dest,), daemon=True))
+                   for dest in self.destinations for _ in range(max(1, self.options.copy_workers))]
+        for t in hashers + [t for _, t in copiers]:
+            t.start()
+        finished = Event()
+        checkpointer = None
+        if any(dest.checkpoint_key for dest in self.destinations):
+            # Mark the run as started right away, so even a crash before the first interval is noticed
+            self.write_checkpoint("running")
+            checkpointer = Thread(target=self._checkpoint_loop, args=(finished,), daemon=True)
+            checkpointer.start()
+        with self.metrics.phase("scan"):
+            self._scan()
+        for t in hashers:
+            t.join()
+        for dest, _ in copiers:
+            self._put(dest.copy_queue, _DONE)
+        for _, t in copiers:
+            t.join()
+        for dest in self.destinations:
+            if dest.packer:
+                dest.packer.close()
+        finished.set()
+        if checkpointer:
+            checkpointer.join()
+        if self.stop_event.is_set():
+            self.log("Backup stopped by user.")
+
+    def _checkpoint_loop(self, finished: Event):
+        """ Periodically commits the journal with a run record, so a crash loses at most one interval """
+        while not finished.wait(CHECKPOINT_INTERVAL):
+            try:
+                self.write_checkpoint("running")
+            except Exception as e:
+                self.log(f"Error writing checkpoint: {e}")
+
+    def write_checkpoint(self, status: str):
+        """ One checkpoint per destination, in its own index next to its own journal """
+        for dest in self.destinations:
+            if not dest.checkpoint_key:
+                continue
+            with self.callback_lock:
+                payload = {"status": status, "pid": os.getpid(), "generation": self.generation,
+                           "resume_from": dest.resume_from or self.generation,
+                           "started": self.started_at, "updated": time.time(), "scanned": self.scanned,
+                           "processed": self.processed, "copied": dest.copied_count, "skipped": dest.skipped_count,
+                           "unchanged": dest.unchanged_count, "progress": self.meter.snapshot().as_dict()}
+            dest.index.checkpoint(dest.checkpoint_key, payload)
+
+    def _scan(self):
+        for f in self.files:
+            if self.stop_event.is_set():
+                return
+            # Journal checks run per destination: a file can be done in one backup and missing from another
+            pending = []
+            for dest in self.destinations:
+                if dest.skip_since is not None and dest.index.journal_unchanged(
+                        self.source_key, f, self.generation, self.options.content_addressed, dest.skip_since):
+                    with self.callback_lock:
+                        dest.unchanged_count += 1
+                else:
+                    pending.append(dest)
+            if not pending:
+                with self.callback_lock:
+                    self.scanned += 1
+                    self.processed += 1
+                    self.unchanged_count += 1
+                    self.meter.label = f"{f.name} [{self.processed}/{self.scanned}+]"
+                self.meter.skipped(f)
+                continue
+            self.meter.found(f)
+            if not self._put(self.hash_queue, (f, pending)):
+                return
+            with self.callback_lock:
+                self.scanned += 1
+        with self.callback_lock:
+            self.scan_done = True
+        self.meter.scan_finished()
+        for _ in range(max(1, self.options.hash_workers)):
+            self._put(self.hash_queue, _DONE)
+
+    def _hash_worker(self):
+        while True:
+            item = self._get(self.hash_queue)
+            if item is _DONE:
+                return
+            f, pending = item
+            if not self.throttle.file(self.stop_event):
+                continue
+            with self.callback_lock:
+                self.processed += 1
+                # The file total is only known once the scan finishes
+                self.meter.label = f"{f.name} [{self.processed}/{self.scanned}{'' if self.scan_done else '+'}]"
+            self.meter.emit()
+            started = time.perf_counter()
+            # Hashing may take up to half of the file's progress; the copies cover the rest
+            self.meter.begin(f, 0.5)
+            try:
+                if self._chunked(f):
+                    # Compared chunk by chunk while storing; unchanged chunks are never written again
+                    results = [(False, None, None, None)] * len(pending)
+                elif self._packed(f):
+                    results = self._check_packed(f, pending)
+                elif self.options.content_addressed:
+                    results = self._check_objects(f, pending)
+                else:
+                    results = self._find_duplicates(f, pending)
+            except Exception as e:
+                self.log(f"Error checking {f.name}: {e}")
+                self.metrics.add("errors")
+                self.meter.done(f)
+                continue
+            finally:
+                self.meter.end()
+            if results is None:
+                self.meter.done(f)
+                self._record_hash(f, None, started)
+                if not self.stop_event.is_set():
+                    self.log(f"Could not read/hash {f.name}, skipping.")
+                    self.metrics.add("errors")
+                continue
+            sample, h = results[0][1], results[0][2]
+            self._record_hash(f, (False, sample, h, None), started)
+            missing = []
+            for dest, (is_duplicate, _, _, match_rel) in zip(pending, results):
+                if is_duplicate:
+                    self._journal(dest, f, h, match_rel)
+                    with self.callback_lock:
+                        dest.skipped_count += 1
+                else:
+                    missing.append(dest)
+            self._fan_out(f, sample, h, missing)
+
+    def _find_duplicates(self, f, pending):
+        """ Duplicate cascade against each destination's index, sharing the source's digests so the
+        file is read at most once. Returns one find_duplicate() result per destination, each carrying
+        every digest computed, or None if the source could not be read.
+        """
+        source = Candidate(f.path)
+        results = []
+        try:
+            for dest in pending:
+                with dest.index.size_lock(f.size):
+                    result = dest.index.find_duplicate(f.path, f.size, self.stop_event, claim=True, source=source)
+                if result is None:
+                    break
+                results.append(result)
+        except BaseException:
+            self._release_claims(f, pending, results)
+            raise
+        if len(results) < len(pending):
+            self._release_claims(f, pending, results)
+            return None
+        algo = self.options.algorithm
+        sample, h = source.values.get(("sample", algo)), source.values.get(("digest", algo))
+        return [(is_duplicate, sample, h, match_rel) for is_duplicate, _, _, match_rel in results]
+
+    def _check_packed(self, f, pending):
+        """ The usual cascade against loose backup files, then a digest lookup among packed ones.
+        Small files are hashed whole anyway, so the digest is always computed here.
+        """
+        results = self._find_duplicates(f, pending)
+        if results is None:
+            return None
+        h = results[0][2]
+        if h is None:
+            h = file_digest(f.path, self.stop_event, self.options.algorithm, self.options.buffer_size,
+                            throttle=self.throttle)
+            if h is None:
+                self._release_claims(f, pending, results)
+                return None
+        sample = h if f.size <= SAMPLE_WHOLE_FILE_LIMIT else results[0][1]
+        checked = []
+        for dest, (is_duplicate, _, _, match_rel) in zip(pending, results):
+            if not is_duplicate:
+                match_rel = dest.index.find_packed(h)
+                if match_rel:
+                    is_duplicate = True
+                    dest.index.release_claim(f.path, f.size)
+            checked.append((is_duplicate, sample, h, match_rel))
+        return checked
+
+    @staticmethod
+    def _release_claims(f, pending, results):
+        for dest, result in zip(pending, results):
+            if not result[0]:
+                dest.index.release_claim(f.path, f.size)
+
+    def _fan_out(self, f, sample, h, missing):
+        """ Queues the file for every destination that lacks it. With more than one, they share a
+        single read; the emptiest queues go first, so a full one never delays the others.
+        """
+        self.meter.expect_copies(f, len(missing))
+        if not missing:
+            return
+        if len(missing) > 1 and not self._chunked(f) and not self._packed(f) and not self.options.dry_run:
+            handles = SharedRead(f.path, len(missing), self.fanout_budget).handles()
         else:
-            self.hour_label.grid_remove()
-            self.hour_combo.grid_remove()
+            handles = [None] * len(missing)
+        for dest, handle in sorted(zip(missing, handles), key=lambda pair: pair[0].copy_queue.qsize()):
+            if not self._put(dest.copy_queue, (f, sample, h, handle)):
+                self.meter.copy_done(f)
+                dest.index.release_claim(f.path, f.size)
+                if handle:
+                    handle.close()
 
-    def _create_logs_frame(self):
-# ... existing code ...
-        frm = ctk.CTkFrame(self.main)
-        frm.grid_rowconfigure(1, weight=1)
-        frm.grid_columnconfigure(0, weight=1)
-        self.frames["logs"] = frm
-        ctk.CTkLabel(frm, text="Full Activity Log", font=ctk.CTkFont(size=16, weight="bold")).grid(row=0, column=0, pady=8)
-        self.full_log = ctk.CTkTextbox(frm)
-        self.full_log.grid(row=1, column=0, sticky="nswe", padx=12, pady=6)
-
-    # ---------- Actions (Most are unchanged) ----------
-    def show_frame(self, name):
-# ... existing code ...
-        for f in self.frames.values():
-            f.grid_remove()
-        self.frames[name].grid(row=0, column=0, sticky="nswe")
-        if name == "auto":
-            self.auto_src_label.configure(text=self.source_var.get() or "(not set)")
-            self.auto_bkp_label.configure(text=self.backup_var.get() or "(not set)")
-
-    def validate_paths(self):
-# ... existing code ...
-        src_s = self.source_var.get()
-        bkp_s = self.backup_var.get()
-        if not src_s or not bkp_s:
-            messagebox.showwarning("Missing folder", "Please set both source and backup folders.")
-            return None, None
-        src = Path(src_s)
-        bkp = Path(bkp_s)
-        if not src.exists() or not src.is_dir():
-            messagebox.showwarning("Invalid Source", f"Source folder does not exist or is not a directory:\n{src}")
+    def _record_hash(self, f, result, started):
+        """ Hash-phase timing; bytes read follow the cascade: nothing, the sample, and/or the whole file """
+        ended = time.perf_counter()
+        self.metrics.record_phase("hash", started, ended)
+        if not result:
+            return
+        _, sample, h, _ = result
+        read = 0
+        if sample is not None and f.size > SAMPLE_WHOLE_FILE_LIMIT:
+            read += SAMPLE_WHOLE_FILE_LIMIT
+        if h is not None:
+            read += f.size
+        if read:
+            self.metrics.add("bytes_hashed", read)
+            self.metrics.add("bytes_read", read)
+            if ended > started:
+                self.metrics.observe("hash_mb_per_s", read / (1024 * 1024) / (ended - started))
+
+    def _check_objects(self, f, pending):
+        """ Object-store duplicate check per destination: no object of this size means new; otherwise
+        a digest set lookup, confirmed by one stat of the object path only when the set holds the
+        digest. The source is hashed at most once for all of them.
+        """
+        h = None
+        results = []
+        for dest in pending:
+            if not dest.index.has_object_size(f.size):
+                results.append((False, None, None, None))
+                continue
+            if h is None:
+                h = file_digest(f.path, self.stop_event, self.options.algorithm, self.options.buffer_size,
+                                throttle=self.throttle)
+                if h is None:
+                    return None
+            results.append((dest.index.has_object(h), None, h, None))
+        sample = h if h is not None and f.size <= SAMPLE_WHOLE_FILE_LIMIT else None
+        return [(exists, sample, h, None) for exists, _, _, _ in results]
+
+    def _chunked(self, f):
+        threshold = self.options.chunk_threshold_mb
+        return threshold > 0 and f.size >= threshold * 1024 * 1024
+
+    def _packed(self, f):
+        threshold = self.options.pack_threshold_kb
+        return (threshold > 0 and f.size < threshold * 1024 and not self.options.content_addressed
+                and not self._chunked(f))
+
+    def _pack(self, dest: BackupDestination, f, h, target_path: Path):
+        """ Appends a small file to its folder's pack segment under target_path's name.
+        Returns the file's digest, or None if stopped.
+        """
+        started = time.perf_counter()
+        with open(f.path, "rb") as src:
+            data = src.read()
+        if not self.throttle.read(len(data), self.stop_event) or not self.throttle.write(len(data), self.stop_event):
+            return None
+        if h is None or len(data) != f.size:
+            digest = new_hasher(self.options.algorithm)
+            digest.update(data)
+            h = digest.hexdigest()
+        segment, offset = dest.packer.add(target_path.parent, target_path.name, data, f.mtime_ns)
+        rel = target_path.relative_to(dest.backup).as_posix()
+        dest.index.record_packed(rel, segment, offset, len(data), f.mtime_ns, h)
+        self._record_copy(f, started)
+        self.metrics.add("files_packed")
+        return h
+
+    def _store_chunked(self, dest: BackupDestination, f, manifest_path: Path):
+        """ Splits a large file into content-defined chunks, stores the new ones and writes a manifest.
+        Returns (True, digest, manifest rel) when stored, (False, digest, existing rel) if a manifest
+        of the same content exists already, or (None, None, None) if stopped.
+        """
+        index = dest.index
+        algorithm = self.options.algorithm
+        started = time.perf_counter()
+        whole = new_hasher(algorithm)
+        chunks = []
+        batch, batch_bytes = [], 0
+        written = reused = 0
+
+        def flush():
+            nonlocal written, reused
+            stored = store_chunks(index, batch, self.stop_event, self.throttle)
+            if stored is None:
+                return False
+            for digest, data in batch:
+                if digest in stored:
+                    written += len(data)
+                    stored.discard(digest)  # a chunk repeated within the batch is stored once
+                else:
+                    reused += len(data)
+            batch.clear()
+            return True
+
+        for data in iter_chunks(f.path, self.stop_event, self.options.buffer_size, self.throttle):
+            whole.update(data)
+            digest = new_hasher(algorithm)
+            digest.update(data)
+            digest = digest.hexdigest()
+            chunks.append([digest, len(data)])
+            batch.append((digest, data))
+            batch_bytes += len(data)
+            if batch_bytes >= CHUNK_BATCH_BYTES:
+                if not flush():
+                    break
+                batch_bytes = 0
+        if self.stop_event.is_set() or (batch and not flush()):
+            return None, None, None
+        h = whole.hexdigest()
+        self.metrics.record_phase("copy", started, time.perf_counter())
+        self.metrics.add("bytes_read", f.size)
+        self.metrics.add("bytes_hashed", f.size)
+        self.metrics.add("bytes_written", written)
+        self.metrics.add("bytes_deduplicated", reused)
+        existing = index.find_manifest(h)
+        if existing and dest.storage.exists(existing):
+            return False, h, existing
+        rel = manifest_path.relative_to(dest.backup).as_posix()
+        st = dest.storage.put_stream(rel, single_chunk(manifest_bytes({
+            "format": MANIFEST_FORMAT, "version": 1, "name": f.name, "size": f.size, "mtime_ns": f.mtime_ns,
+            "algorithm": algorithm, "digest": h, "chunks": chunks,
+        })), self.stop_event)
+        if st is None:
+            return None, None, None
+        index.record(manifest_path, st=st)
+        index.record_manifest(h, f.size, rel)
+        return True, h, rel
+
+    def _copy(self, dest: BackupDestination, f, dst: Path, algorithm, handle):
+        """ Puts the file into the destination's storage at dst. Returns (StorageStat, digest or None),
+        or (None, None) if stopped.
+        """
+        key = dst.relative_to(dest.backup).as_posix()
+        if handle:
+            return handle.copy(dest.storage, key, self.stop_event, algorithm, self.options.buffer_size, self.throttle)
+        return dest.storage.put_file(key, f.path, self.stop_event, algorithm, self.options.buffer_size, self.throttle)
+
+    def _store_object(self, dest: BackupDestination, f, h, view_path: Path, handle=None):
+        """ Puts a file into the destination's object store and links its type/date view to it.
+        Returns (True, digest) when stored, (False, digest) if the object already existed,
+        or (None, None) if stopped.
+        """
+        index = dest.index
+        objects_root = index.objects_root()
+        objects_root.mkdir(parents=True, exist_ok=True)
+        if h is not None and index.has_object(h):
+            return False, h
+        # Copy into a staging file (hashing it if the content is still unknown), then claim the object
+        # name with link(): of two identical files stored at the same time, exactly one wins
+        staging = objects_root / f"incoming-{uuid.uuid4().hex}{PARTIAL_SUFFIX}"
+        completed, copied = self._copy(dest, f, staging, self.options.algorithm if h is None else None, handle)
+        if not completed:
             return None, None
-        if not bkp.exists():
+        h = h or copied
+        obj = index.object_path(h)
+        obj.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(staging, obj)
+            stored = True
+        except FileExistsError:
+            stored = False
+        finally:
+            staging.unlink()
+        if not stored:
+            return False, h
+        if os.name == "posix":
+            obj.chmod(0o444)  # Views are hardlinks: keep edits through a view from corrupting the object
+        index.record_object(h, f.size)
+        link_view(obj, view_path)
+        return True, h
+
+    def _journal(self, dest: BackupDestination, f, digest, backup_rel):
+        """ Journals a handled file; dry runs leave the journal as it was """
+        if self.source_key and not self.options.dry_run:
+            dest.index.journal_record(self.source_key, f, digest, backup_rel, self.generation)
+
+    def _record_copy(self, f, started, read_source=True):
+        """ Copy timing and bytes; a destination fed from a shared read wrote the file without reading it """
+        ended = time.perf_counter()
+        self.metrics.record_phase("copy", started, ended)
+        if read_source:
+            self.metrics.add("bytes_read", f.size)
+        self.metrics.add("bytes_written", f.size)
+        if f.size and ended > started:
+            self.metrics.observe("copy_mb_per_s", f.size / (1024 * 1024) / (ended - started))
+
+    def _copy_worker(self, dest: BackupDestination):
+        where = f" in {dest.backup}" if len(self.destinations) > 1 else ""
+        while True:
+            item = self._get(dest.copy_queue)
+            if item is _DONE:
+                return
+            f, sample, h, handle = item
+            target_path = None
+            placed = False
+            self.meter.begin(f)
             try:
-                bkp.mkdir(parents=True, exist_ok=True)
-                self.safe_log(f"Created backup directory: {bkp}")
+                if self.stop_event.is_set():
+                    continue
+                chunked = self._chunked(f)
+                target_path = dest.planner.reserve(f, MANIFEST_SUFFIX if chunked else "")
+                packed = not chunked and self._packed(f)
+                if self.options.dry_run:
+                    mode = ("chunk" if chunked else "pack" if packed else
+                            "object" if self.options.content_addressed else "copy")
+                    with self.callback_lock:
+                        dest.plan.append((f, target_path, mode))
+                        dest.copied_count += 1
+                    placed = True
+                    continue
+                started = time.perf_counter()
+                if chunked:
+                    stored, h, manifest_rel = self._store_chunked(dest, f, target_path)
+                    if stored is None:
+                        continue
+                    self._journal(dest, f, h, manifest_rel)
+                    placed = stored
+                    if stored:
+                        self.log(f"Chunked {f.name} -> {manifest_rel}{where}")
+                    with self.callback_lock:
+                        if stored:
+                            dest.copied_count += 1
+                        else:
+                            dest.skipped_count += 1
+                    continue
+                if packed:
+                    h = self._pack(dest, f, h, target_path)
+                    if h is None:
+                        continue
+                    placed = True
+                    rel = target_path.relative_to(dest.backup).as_posix()
+                    self._journal(dest, f, h, rel)
+                    self.log(f"Packed {f.name} -> {rel}{where}")
+                    with self.callback_lock:
+                        dest.copied_count += 1
+                    continue
+                st = None
+                if self.options.content_addressed:
+                    stored, copied_digest = self._store_object(dest, f, h, target_path, handle)
+                    if stored is None:
+                        continue
+                    if stored or h is None:
+                        self._record_copy(f, started, not handle or handle.read_source)
+                    if not stored:
+                        # An identical file landed first in this run
+                        self._journal(dest, f, copied_digest, None)
+                        with self.callback_lock:
+                            dest.skipped_count += 1
+                        continue
+                else:
+                    # Hash during the copy only if nothing computed the digest yet; otherwise let the kernel copy.
+                    # Files on remote storage always get their digest, as they cannot be read back cheaply.
+                    algorithm = (self.options.algorithm if h is None and (self.options.digest_on_copy or
+                                 not dest.storage.local) else None)
+                    st, copied_digest = self._copy(dest, f, target_path, algorithm, handle)
+                    if not st:
+                        continue
+                    self._record_copy(f, started, not handle or handle.read_source)
+                placed = True
+                if copied_digest:
+                    h = copied_digest
+                    if f.size <= SAMPLE_WHOLE_FILE_LIMIT:
+                        sample = copied_digest
+                dest.index.record(target_path, sample, h, st)
+                rel = target_path.relative_to(dest.backup).as_posix()
+                dest.index.settle_claim(f.path, f.size, rel)
+                self._journal(dest, f, h, rel)
+                self.log(f"Copied {f.name} -> {target_path.relative_to(dest.backup)}{where}")
+                with self.callback_lock:
+                    dest.copied_count += 1
             except Exception as e:
-                messagebox.showerror("Invalid Backup", f"Could not create backup folder:\n{bkp}\nError: {e}")
-                return None, None
-        if not bkp.is_dir():
-             messagebox.showwarning("Invalid Backup", f"Backup path is not a directory:\n{bkp}")
-             return None, None
-        if src.resolve() == bkp.resolve():
-            messagebox.showerror("Dangerous Operation", "Source and Backup folders cannot be the same!")
-            return None, None
-        if bkp.resolve() in src.resolve().parents:
-            messagebox.showerror("Dangerous Operation", "Cannot set backup folder to be inside the source folder!")
-            return None, None
-        return src, bkp
+                self.log(f"Error copying {f.name}{where}: {e}")
+                self.metrics.add("errors")
+            finally:
+                self.meter.end()
+                self.meter.copy_done(f)
+                if handle:
+                    handle.close()
+                # A dry run keeps its claims, so later identical files still count as duplicates
+                if not self.options.dry_run:
+                    dest.index.release_claim(f.path, f.size)
+                if target_path is not None and not placed:
+                    dest.planner.release(target_path)
 
-    def browse_source(self):
-# ... existing code ...
-        p = filedialog.askdirectory()
-        if p:
-            self.source_var.set(p)
+# ----------------- Core backup logic -----------------
+def backup_roots(backup):
+    """ One backup root (Path or str) or several, as a list of Paths """
+    if isinstance(backup, (str, os.PathLike)):
+        return [Path(backup)]
+    return [Path(b) for b in backup]
 
-    def browse_backup(self):
-# ... existing code ...
-        p = filedialog.askdirectory()
-        if p:
-            self.backup_var.set(p)
+def source_skip_dirs(source: Path, backup):
+    """ Relative folders the source scan must leave out: backup roots nested inside the source """
+    skip = set()
+    for root in backup_roots(backup):
+        try:
+            backup_rel = root.resolve().relative_to(source.resolve())
+        except (OSError, ValueError):
+            continue
+        if backup_rel.parts:
+            skip.add(backup_rel.as_posix())
+    return skip
 
-    def clear_log(self):
+def run_backup_once(source: Path, backup, log_callback, progress_callback, stop_event: Event,
+                    options: BackupOptions = None, changed_paths=None, throttle=None):
 # ... existing code ...
-        self.log_preview.delete("1.0", "end")
-        self.full_log.delete("1.0", "end")
+    options = options or BackupOptions()
+    # Several roots: each source file is read once and written to every root that lacks it
+    backups = backup_roots(backup)
+    if not source.exists():
+        log_callback(f"Source {source} does not exist.")
+        return None
+    for root in backups:
+        try:
+            root.mkdir(parents=True, exist_ok=True)
+        except Exception as e:
+            log_callback(f"Error creating backup dir {root}: {e}")
+            return None
+    metrics = RunMetrics()
+    skip_dirs = source_skip_dirs(source, backups)
+    # A caller-owned throttle can be retuned while the run is going (GUI, SIGHUP, job scheduler)
+    throttle = throttle or Throttle.from_options(options)
+    if options.io_class or options.nice:
+        # Worker threads inherit the calling thread's nice value and I/O class
+        applied = lower_thread_priority(options.io_class, options.nice)
+        if applied:
+            log_callback(f"Running at lower priority: {', '.join(applied)}.")
 
-    def toggle_manual_backup(self):
-# ... existing code ...
-        if self.is_running_manual:
-            self.stop_manual_backup()
-        else:
-            self.run_backup_now()
+    def on_error(path, e):
+        log_callback(f"Error reading source folder {path}: {e}")
+        metrics.add("errors")
 
-    def run_backup_now(self):
-# ... existing code ...
-        if self.is_running_auto or self.is_running_manual:
-            messagebox.showinfo("Busy", "A backup job is already running.")
-            return
-        src, bkp = self.validate_paths()
-        if not src or not bkp:
+    if changed_paths is None:
+        files = scan_source(source, options.include, options.exclude, options.max_depth, skip_dirs, on_error)
+    else:
+        files = scan_changed_paths(source, changed_paths, options.include, options.exclude, options.max_depth,
+                                   skip_dirs, on_error)
+    first = next(files, None)
+    if first is None:
+        log_callback("No files to backup.")
+        progress_callback(0, "")
+        return None
+    files = itertools.chain([first], files)
+
+    if options.algorithm not in DIGEST_ALGORITHMS:
+        log_callback(f"Unknown digest algorithm '{options.algorithm}'.")
+        return None
+    if options.storage != "filesystem" and (options.content_addressed or options.pack_threshold_kb > 0):
+        # Hardlinked views and segments appended in place need a real filesystem under the root
+        log_callback(f"The object store and small-file packs need filesystem storage, not '{options.storage}'.")
+        return None
+    storages = []
+    try:
+        for root in backups:
+            storages.append(open_storage(root, options))
+    except ValueError as e:
+        log_callback(str(e))
+        for storage in storages:
+            storage.close()
+        return None
+    if changed_paths is None and not options.content_addressed:
+        log_callback("Reconciling backup index (stat walk, no hashing)...")
+    indexes = []
+    try:
+        for root in backups:
+            indexes.append(BackupIndex(root, options.algorithm, options.buffer_size))
+    except Exception as e:
+        log_callback(f"Error opening backup index in {root}: {e}")
+        for index in indexes:
+            index.close()
+        for storage in storages:
+            storage.close()
+        return None
+    for index, storage in zip(indexes, storages):
+        index.throttle = throttle
+        index.storage = storage
+    profiler = None
+    if options.profile in PROFILE_MODES:
+        profiler = RunProfiler(options.profile, options.profile_path or profile_output_path(backups[0], options.profile),
+                               log_callback)
+    try:
+        with profiler or contextlib.nullcontext():
+            _run_backup_indexed(files, source, indexes, options, log_callback, progress_callback, stop_event,
+                                full_scan=changed_paths is None, metrics=metrics, profiler=profiler,
+                                throttle=throttle)
+    finally:
+        for index in indexes:
+            index.close()
+        for root, storage in zip(backups, storages):
+            storage.close()
+            requests = storage.stats().get("requests")
+            if requests:
+                where = f" for {root}" if len(backups) > 1 else ""
+                log_callback(f"Storage requests{where}: " +
+                             ", ".join(f"{op} {count}" for op, count in sorted(requests.items())) + ".")
+        metrics.finish("stopped" if stop_event.is_set() else "completed")
+        if throttle.limited() or throttle.snapshot()["waited_seconds"]:
+            metrics.throttle = throttle.snapshot()
+        log_callback(metrics.summary_line())
+        if not options.dry_run:
+            write_run_metrics(metrics, source, backups, options, log_callback)
+    return metrics
+
+def _prepare_index(index: BackupIndex, options: BackupOptions, log_callback, stop_event: Event, full_scan,
+                   metrics: RunMetrics, where=""):
+    """ Readies one destination's index for a run. Returns False if stopped meanwhile. """
+    if options.content_addressed or options.chunk_threshold_mb > 0:
+        # The object store is its own index: file names are digests, so no tree walk or hashing is needed.
+        # Chunks of large files are stored there too.
+        if index.object_count() == 0:
+            with metrics.phase("index"):
+                index.rebuild_objects(log_callback)
+        try:
+            staged = [e.path for e in os.scandir(index.objects_root()) if e.name.endswith(PARTIAL_SUFFIX)]
+        except OSError:
+            staged = []
+        stale = remove_stale_partials(staged)
+        if stale:
+            log_callback(f"Removed {stale} half-written object(s) left by an interrupted run{where}.")
+        with metrics.phase("index"):
+            index.load_object_digests(log_callback)
+        log_callback(f"Object store ready{where}. Found {index.object_count()} stored objects.")
+    # Change-event batches trust the index kept up to date by the preceding full run
+    if full_scan and not options.content_addressed:
+        try:
+            with metrics.phase("index"):
+                reconciled = index.reconcile(stop_event, log_callback)
+            if not reconciled:
+                log_callback("Backup stopped during indexing.")
+                return False
+        except Exception as e:
+            log_callback(f"Error during backup indexing: {e}")
+            metrics.add("errors")
+        log_callback(f"Index complete{where}. Found {index.count()} existing files.")
+    return True
+
+def _run_backup_indexed(files, source: Path, indexes, options: BackupOptions, log_callback, progress_callback,
+                        stop_event: Event, full_scan=True, metrics: RunMetrics = None, profiler=None, throttle=None):
+    metrics = metrics or RunMetrics()
+    multi = len(indexes) > 1
+    for index in indexes:
+        if not _prepare_index(index, options, log_callback, stop_event, full_scan, metrics,
+                              f" in {index.root}" if multi else ""):
             return
-        self.safe_log("Starting manual backup...")
-        self.stop_event.clear()
-        self.safe_set_running_state(manual=True, auto=False)
-        self.manual_thread = Thread(target=self.run_backup_job, args=(src, bkp), daemon=True)
-        self.manual_thread.start()
 
-    def stop_manual_backup(self):
-# ... existing code ...
-        if self.manual_thread and self.manual_thread.is_alive():
-            self.safe_log("Stopping manual backup...")
-            self.stop_event.set()
+    destinations = [BackupDestination(index.root, index, options.queue_size, options.dry_run) for index in indexes]
+    pipeline = BackupPipeline(files, destinations, options, log_callback, progress_callback, stop_event,
+                              metrics, profiler, throttle)
+    # The previous run's source size seeds the progress estimate while the scan is still running
+    source_key = str(source.resolve())
+    size_key = f"source_bytes:{source_key}"
+    pipeline.meter.expected_bytes = int(indexes[0].get_state(size_key, 0))
+    # Completed files are always journaled so an interrupted full run can be resumed;
+    # skipping by journal is otherwise up to options.use_journal
+    pipeline.source_key = source_key
+    for dest in destinations:
+        if options.use_journal:
+            dest.skip_since = 0
+        if not full_scan:
+            continue
+        checkpoint_key = f"checkpoint:{source_key}"
+        previous = dest.index.load_checkpoint(checkpoint_key)
+        if previous and previous.get("status") != "completed":
+            started = datetime.fromtimestamp(previous.get("started", 0)).strftime("%Y-%m-%d %H:%M")
+            log_callback(f"Resuming interrupted run from {started}{' in ' + str(dest.backup) if multi else ''}: "
+                         f"{previous.get('processed', 0)} files were already handled "
+                         f"({previous.get('copied', 0)} copied).")
+            # A chain of interrupted runs keeps trusting everything done since the first of them
+            dest.resume_from = int(previous.get("resume_from") or previous.get("generation", 0))
+            if dest.skip_since is None:
+                dest.skip_since = dest.resume_from
+        if not options.dry_run:
+            dest.checkpoint_key = checkpoint_key
+    pipeline.run()
+    metrics.add("files_scanned", pipeline.scanned)
+    metrics.add("files_unchanged", pipeline.unchanged_count)
+    metrics.add("files_duplicate", pipeline.skipped_count)
+    metrics.add("files_copied", pipeline.copied_count)
+    if full_scan:
+        log_callback(f"Scanned {pipeline.scanned} source files.")
+    if pipeline.unchanged_count > 0:
+        log_callback(f"Skipped {pipeline.unchanged_count} unchanged files (journal).")
+    completed = pipeline.scan_done and not stop_event.is_set()
+    if options.dry_run:
+        report_plan(destinations, options.plan_path, log_callback)
+        pipeline.meter.finish()
+        return
+    if full_scan and completed:
+        for index in indexes:
+            index.set_state(size_key, pipeline.meter.bytes_total)
+            index.journal_prune(source_key, pipeline.generation)
+    if full_scan:
+        pipeline.write_checkpoint("completed" if completed else "interrupted")
+        if not completed:
+            log_callback("Progress saved; the next run resumes from this checkpoint.")
+
+    if pipeline.skipped_count > 0:
+        log_callback(f"Skipped {pipeline.skipped_count} duplicate files.")
+    pipeline.meter.finish()
+    if multi:
+        per_destination = ", ".join(f"{dest.copied_count} to {dest.backup}" for dest in destinations)
+        log_callback(f"Backup run complete. Copied {per_destination}.")
+    else:
+        log_callback(f"Backup run complete. Copied {pipeline.copied_count} new files.")
+
+def report_plan(destinations, plan_path, log_callback):
+    """ Logs what a dry run would do and optionally writes it as JSON, copies in execution (inode) order """
+    report = {"created": time.time(), "destinations": []}
+    for dest in destinations:
+        plan = sorted(dest.plan, key=lambda entry: entry[0].inode)
+        size = sum(f.size for f, _, _ in plan)
+        where = f" to {dest.backup}" if len(destinations) > 1 else ""
+        log_callback(f"Dry run: would copy {len(plan)} files ({size / (1024 * 1024):.1f} MB){where} "
+                     f"into {len(dest.planner.new_folders)} new folders; "
+                     f"{dest.skipped_count} duplicates and {dest.unchanged_count} unchanged files skipped.")
+        report["destinations"].append({
+            "backup": str(dest.backup),
+            "files": len(plan),
+            "bytes": size,
+            "duplicates": dest.skipped_count,
+            "unchanged": dest.unchanged_count,
+            "new_folders": [p.relative_to(dest.backup).as_posix() for p in dest.planner.new_folders],
+            "copies": [{"source": f.rel, "target": target.relative_to(dest.backup).as_posix(), "size": f.size,
+                        "mode": mode} for f, target, mode in plan],
+        })
+    if plan_path:
+        try:
+            write_atomic(plan_path, json.dumps(report, indent=2))
+            log_callback(f"Plan written to {plan_path}.")
+        except Exception as e:
+            log_callback(f"Error writing plan: {e}")
+    return report
+
+# ----------------- Watch mode -----------------
+WATCH_SCHEDULE_MODE = "Watch for changes (real-time)"
+WATCH_DEBOUNCE_SECONDS = 2.0
+WATCH_MAX_LATENCY_SECONDS = 30.0
+WATCH_MAX_EVENTS = 10000
+WATCH_POLL_INTERVAL = 10.0
+
+# inotify(7) constants
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_DONT_FOLLOW = 0x02000000
+_IN_EXCL_UNLINK = 0x04000000
+_IN_ISDIR = 0x40000000
+_IN_WATCH_MASK = (_IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE_SELF | _IN_MOVE_SELF
+                  | _IN_ONLYDIR | _IN_DONT_FOLLOW | _IN_EXCL_UNLINK)
+_INOTIFY_EVENT = struct.Struct("iIII")
+
+class SourceWatcher:
+    """ Collects changed source paths from inotify on Linux, or from a stat-polling fallback.
+
+    Events land in a bounded queue; when it (or the kernel queue) overflows, the watcher
+    flags an overflow so the caller falls back to an incremental rescan instead.
+    """
+    def __init__(self, source: Path, stop_event: Event, exclude=(), skip_dirs=(), log_callback=print,
+                 max_events=WATCH_MAX_EVENTS, poll_interval=WATCH_POLL_INTERVAL):
+        self.source = source
+        self.stop_event = stop_event
+        self.exclude = exclude
+        self.skip_dirs = skip_dirs
+        self.log = log_callback
+        self.poll_interval = poll_interval
+        self.events = queue.Queue(maxsize=max_events)
+        self.overflow = Event()
+        self.backend = None
+        self._fd = None
+        self._watches = {}
+        self._thread = None
+
+    def start(self):
+        if sys.platform.startswith("linux") and self._init_inotify():
+            self.backend = "inotify"
+            self._thread = Thread(target=self._inotify_loop, daemon=True)
         else:
-            self.safe_log("Manual backup not running.")
+            self.backend = "polling"
+            self._snapshot = self._poll_snapshot()
+            self._thread = Thread(target=self._poll_loop, daemon=True)
+        self._thread.start()
+        return self.backend
 
-    # ---------- MODIFIED Schedule/Auto control (Unchanged logic) ----------
-    def schedule_worker(self, src: Path, bkp: Path, schedule_mode: str, schedule_hour: str):
-# ... existing code ...
-        self.safe_log(f"Schedule started: {schedule_mode} " + (f"at {schedule_hour}:00" if schedule_mode == "Run every day at..." else ""))
+    def close(self):
+        if self._thread:
+            self._thread.join(timeout=2)
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _emit(self, path: str):
+        try:
+            self.events.put_nowait(path)
+        except queue.Full:
+            self.overflow.set()
+
+    def _skipped(self, path: str):
+        try:
+            rel = Path(path).relative_to(self.source).as_posix()
+        except ValueError:
+            return True
+        return rel in self.skip_dirs or bool(self.exclude and glob_match(rel, Path(path).name, self.exclude))
+
+    # --- inotify backend ---
+    def _init_inotify(self):
+        try:
+            self._libc = ctypes.CDLL(None, use_errno=True)
+            fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return False
+        if fd < 0:
+            return False
+        self._fd = fd
+        if not self._add_tree(str(self.source)):
+            os.close(fd)
+            self._fd = None
+            self._watches.clear()
+            return False
+        return True
+
+    def _add_tree(self, top: str):
+        """ inotify is not recursive: watch every folder below top. False if the watch limit is hit. """
+        stack = [top]
+        while stack:
+            folder = stack.pop()
+            if folder != str(self.source) and self._skipped(folder):
+                continue
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(folder), _IN_WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err == errno.ENOSPC:
+                    self.log("inotify watch limit reached (fs.inotify.max_user_watches); using polling instead.")
+                    return False
+                continue
+            self._watches[wd] = folder
+            try:
+                with os.scandir(folder) as it:
+                    stack.extend(e.path for e in it if e.is_dir(follow_symlinks=False))
+            except OSError:
+                continue
+        return True
+
+    def _inotify_loop(self):
         while not self.stop_event.is_set():
-            next_run = get_next_run_time(schedule_mode, schedule_hour)
-            wait_seconds = (next_run - datetime.now()).total_seconds()
-            if wait_seconds < 0:
-                wait_seconds = 60 
-            self.safe_log(f"Next run scheduled for {next_run.strftime('%Y-%m-%d %H:%M')}. Waiting {wait_seconds/60:.0f} minutes...")
-            wait_completed = wait_with_stop_check(wait_seconds, self.stop_event)
-            if not wait_completed:
-                break
-            self.safe_log("Scheduled run starting...")
-            run_backup_once(src, bkp, self.safe_log, self.safe_progress_update, self.stop_event)
-            self.safe_log("Scheduled run complete.")
-        self.safe_log("Schedule stopped.")
-        self.safe_set_running_state(manual=False, auto=False)
+            ready, _, _ = select.select([self._fd], [], [], 0.5)
+            if not ready:
+                continue
+            try:
+                data = os.read(self._fd, 256 * 1024)
+            except BlockingIOError:
+                continue
+            except OSError as e:
+                self.log(f"Error reading inotify events: {e}")
+                self.overflow.set()
+                return
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, length = _INOTIFY_EVENT.unpack_from(data, offset)
+                name = data[offset + _INOTIFY_EVENT.size:offset + _INOTIFY_EVENT.size + length].rstrip(b"\0")
+                offset += _INOTIFY_EVENT.size + length
+                self._handle_inotify(wd, mask, os.fsdecode(name))
 
-    def start_auto_backup(self):
-# ... existing code ...
-        if self.is_running_auto or self.is_running_manual:
-            messagebox.showinfo("Busy", "A backup job is already running.")
+    def _handle_inotify(self, wd: int, mask: int, name: str):
+        if mask & _IN_Q_OVERFLOW:
+            self.overflow.set()
             return
-        src, bkp = self.validate_paths()
-        if not src or not bkp:
+        if mask & _IN_IGNORED:
+            self._watches.pop(wd, None)
             return
-        schedule_mode = self.schedule_var.get()
-        schedule_hour = self.hour_var.get()
-        if schedule_mode == "Disabled":
-            messagebox.showinfo("Schedule Disabled", "Please select a valid schedule (e.g., 'Run every hour').")
+        folder = self._watches.get(wd)
+        if folder is None or not name:
             return
-        self.stop_event.clear()
-        self.safe_set_running_state(manual=False, auto=True)
-        self.auto_thread = Thread(target=self.schedule_worker, args=(src, bkp, schedule_mode, schedule_hour), daemon=True)
-        self.auto_thread.start()
+        path = os.path.join(folder, name)
+        if mask & _IN_ISDIR:
+            # A new or moved-in folder: watch it and treat everything inside as changed
+            if mask & (_IN_CREATE | _IN_MOVED_TO) and not self._skipped(path):
+                if not self._add_tree(path):
+                    self.overflow.set()
+                self._emit(path)
+        elif mask & (_IN_CLOSE_WRITE | _IN_MOVED_TO):
+            self._emit(path)
 
-    def stop_auto_backup(self):
-# ... existing code ...
-        if self.auto_thread and self.auto_thread.is_alive():
-            self.safe_log("Stopping schedule...")
-            self.stop_event.set()
-        else:
-            self.safe_log("Schedule not running.")
+    # --- polling fallback ---
+    def _poll_snapshot(self):
+        return {f.rel: (f.size, f.mtime_ns) for f in scan_source(self.source, exclude=self.exclude, skip_dirs=self.skip_dirs)}
 
-    def run_backup_job(self, src, bkp):
-# ... existing code ...
+    def _poll_loop(self):
+        while not self.stop_event.wait(self.poll_interval):
+            snapshot = self._poll_snapshot()
+            for rel, signature in snapshot.items():
+                if self._snapshot.get(rel) != signature:
+                    self._emit(str(self.source / rel))
+            self._snapshot = snapshot
+
+    def wait_batch(self, debounce=WATCH_DEBOUNCE_SECONDS, max_latency=WATCH_MAX_LATENCY_SECONDS):
+        """ Blocks for the next burst of changes and coalesces it once things settle for `debounce` seconds.
+
+        Returns (set of changed paths, overflowed) or None when stopped.
+        """
+        changed = set()
+        while not changed and not self.overflow.is_set():
+            if self.stop_event.is_set():
+                return None
+            try:
+                changed.add(self.events.get(timeout=0.5))
+            except queue.Empty:
+                continue
+        first_seen = time.monotonic()
+        while time.monotonic() - first_seen < max_latency and not self.stop_event.is_set():
+            try:
+                changed.add(self.events.get(timeout=debounce))
+            except queue.Empty:
+                break
+        overflowed = self.overflow.is_set()
+        if overflowed:
+            self.overflow.clear()
+            while True:
+                try:
+                    self.events.get_nowait()
+                except queue.Empty:
+                    break
+            changed.clear()
+        return changed, overflowed
+
+def watch_and_backup(source: Path, backup, log_callback, progress_callback, stop_event: Event,
+                     options: BackupOptions = None, throttle=None):
+    """ Real-time schedule: one incremental full run, then only the files named by change events """
+    options = options or BackupOptions()
+    throttle = throttle or Throttle.from_options(options)
+    watcher = SourceWatcher(source, stop_event, options.exclude, source_skip_dirs(source, backup), log_callback)
+    backend = watcher.start()
+    log_callback(f"Watching {source} for changes ({backend}).")
+    try:
+        run_backup_once(source, backup, log_callback, progress_callback, stop_event, options, throttle=throttle)
+        while not stop_event.is_set():
+            batch = watcher.wait_batch()
+            if batch is None:
+                break
+            changed, overflowed = batch
+            if overflowed:
+                log_callback("Change queue overflowed, running an incremental rescan...")
+                run_backup_once(source, backup, log_callback, progress_callback, stop_event, options, throttle=throttle)
+            elif changed:
+                log_callback(f"Detected {len(changed)} changed path(s).")
+                run_backup_once(source, backup, log_callback, progress_callback, stop_event, options,
+                                changed_paths=changed, throttle=throttle)
+    finally:
+        watcher.close()
+
+# ----------------- Schedule loop -----------------
+SCHEDULE_MODES = ("Disabled", "Run every hour", "Run every day at...", WATCH_SCHEDULE_MODE)
+SCHEDULE_ALIASES = {"hourly": "Run every hour", "daily": "Run every day at...", "watch": WATCH_SCHEDULE_MODE}
+
+def run_schedule(source: Path, backup, schedule_mode: str, schedule_hour, log_callback, progress_callback,
+                 stop_event: Event, options: BackupOptions = None, throttle=None):
+    """ Runs backups on the given schedule until stop_event is set (shared by the GUI and the daemon).
+    A caller-owned throttle keeps limit changes across runs.
+    """
+    log_callback(f"Schedule started: {schedule_mode} " + (f"at {schedule_hour}:00" if schedule_mode == "Run every day at..." else ""))
+    if schedule_mode == WATCH_SCHEDULE_MODE:
         try:
-            run_backup_once(src, bkp, self.safe_log, self.safe_progress_update, self.stop_event)
+            watch_and_backup(source, backup, log_callback, progress_callback, stop_event, options, throttle)
         except Exception as e:
-            self.safe_log(f"CRITICAL ERROR in backup thread: {e}")
-        finally:
-            self.safe_set_running_state(manual=False, auto=False)
+            log_callback(f"CRITICAL ERROR in watch mode: {e}")
+        return
+    while not stop_event.is_set():
+        next_run = get_next_run_time(schedule_mode, schedule_hour)
+        wait_seconds = (next_run - datetime.now()).total_seconds()
+        if wait_seconds < 0:
+            wait_seconds = 60 
+        log_callback(f"Next run scheduled for {next_run.strftime('%Y-%m-%d %H:%M')}. Waiting {wait_seconds/60:.0f} minutes...")
+        wait_completed = wait_with_stop_check(wait_seconds, stop_event)
+        if not wait_completed:
+            break
+        log_callback("Scheduled run starting...")
+        run_backup_once(source, backup, log_callback, progress_callback, stop_event, options, throttle=throttle)
+        log_callback("Scheduled run complete.")
+
+# ----------------- Integrity scrub -----------------
+SCRUB_STATE_KEY = "scrub"
+SCRUB_LAST_KEY = "scrub_last"
+SCRUB_REPORT_FILE_NAME = "scrub_report.json"
+SCRUB_BATCH = 256
+SCRUB_PROBLEM_KINDS = ("corrupt", "missing", "unindexed")
+SCRUB_REPORT_LIMIT = 1000  # paths kept per problem kind; the counts stay exact
+
+def _new_scrub_state():
+    return {"phase": "files", "after": "", "after_algo": "", "started": time.time(), "checked": 0,
+            "bytes": 0, "baselined": 0, "counts": dict.fromkeys(SCRUB_PROBLEM_KINDS, 0),
+            "problems": {kind: [] for kind in SCRUB_PROBLEM_KINDS}}
+
+def _scrub_check(path: Path, algorithm: str, expected, stop_event: Event, buffer_size, throttle):
+    """ ("ok" | "corrupt" | "missing" | "stopped", digest, bytes read) for one stored file """
+    try:
+        size = path.stat().st_size
+    except FileNotFoundError:
+        return "missing", None, 0
+    except OSError:
+        return "corrupt", None, 0
+    digest = file_digest(path, stop_event, algorithm, buffer_size, throttle=throttle)
+    if digest is None:
+        return ("stopped" if stop_event.is_set() else "corrupt"), None, size
+    return ("ok" if expected is None or digest == expected else "corrupt"), digest, size
+
+def _scrub_packed_check(root: Path, segment: str, offset: int, size: int, mtime_ns, algorithm: str, expected: str,
+                        throttle, stop_event: Event):
+    """ ("ok" | "corrupt" | "missing" | "stopped", bytes read) for one file inside a pack segment """
+    if not throttle.read(size, stop_event):
+        return "stopped", 0
+    try:
+        data = read_packed(root, segment, offset, size)
+    except FileNotFoundError:
+        return "missing", 0
+    except (OSError, ValueError):
+        return "corrupt", 0
+    h = new_hasher(algorithm)
+    h.update(data)
+    return ("ok" if h.hexdigest() == expected else "corrupt"), size
+
+def scrub_backup(backup_root: Path, log_callback, progress_callback, stop_event: Event, options=None,
+                 throttle=None, time_budget=None, restart=False):
+    """ Re-reads stored files and checks them against the digests they were indexed or stored with.
+
+    Works in four phases: indexed files (rows without a digest get one as their baseline), object
+    store entries (whose names are their digests), files packed into segments, then a stat-only
+    walk for unindexed files.
+    Files are hashed in parallel by options.hash_workers threads under the read limit. Progress is
+    committed to the index after every batch, so a stopped scrub, or one that used up time_budget
+    seconds, resumes where it left off next time. Returns the report dict, or None if paused.
+    """
+    options = options or BackupOptions()
+    throttle = throttle or Throttle.from_options(options)
+    root = Path(backup_root)
+    if not (meta_dir(root) / INDEX_FILE_NAME).exists():
+        log_callback(f"{root} has no backup index to scrub.")
+        return None
+    if options.io_class or options.nice:
+        applied = lower_thread_priority(options.io_class, options.nice)
+        if applied:
+            log_callback(f"Running at lower priority: {', '.join(applied)}.")
+    index = BackupIndex(root, options.algorithm, options.buffer_size)
+    state = None
+    try:
+        state = None if restart else index.load_checkpoint(SCRUB_STATE_KEY)
+        if state:
+            log_callback(f"Resuming scrub started {datetime.fromtimestamp(state['started']):%Y-%m-%d %H:%M} "
+                         f"({state['checked']} files checked so far).")
+        else:
+            state = _new_scrub_state()
+        total = max(1, index.count() + index.object_count() + index.packed_count())
+        deadline = time.monotonic() + time_budget if time_budget else None
+
+        def problem(kind, rel, detail=""):
+            state["counts"][kind] += 1
+            if len(state["problems"][kind]) < SCRUB_REPORT_LIMIT:
+                state["problems"][kind].append(rel)
+            log_callback(f"{kind.upper()}: {rel}{detail}")
+
+        def out_of_time():
+            return deadline is not None and time.monotonic() >= deadline
+
+        with ThreadPoolExecutor(max(1, options.hash_workers)) as pool:
+            def check(jobs):
+                return pool.map(lambda job: _scrub_check(*job, stop_event, options.buffer_size, throttle), jobs)
+
+            while state["phase"] == "files" and not stop_event.is_set() and not out_of_time():
+                rows = index.files_after(state["after"], SCRUB_BATCH)
+                if not rows:
+                    state.update(phase="objects", after="", after_algo="")
+                    break
+                results = list(check([(root / rel, algo, digest) for rel, algo, digest in rows]))
+                if stop_event.is_set():
+                    break
+                for (rel, algo, expected), (status, digest, size) in zip(rows, results):
+                    state["checked"] += 1
+                    state["bytes"] += size
+                    if status == "ok" and expected is None:
+                        index.set_digest(rel, algo, digest)
+                        state["baselined"] += 1
+                    elif status != "ok":
+                        problem(status, rel, f" (expected {algo} {expected[:12]}..., read {digest[:12]}...)"
+                                if status == "corrupt" and expected and digest else "")
+                state["after"] = rows[-1][0]
+                index.checkpoint(SCRUB_STATE_KEY, state)
+                progress_callback(min(99, int(state["checked"] / total * 100)), rows[-1][0])
+
+            while state["phase"] == "objects" and not stop_event.is_set() and not out_of_time():
+                rows = index.objects_after(state["after_algo"], state["after"], SCRUB_BATCH)
+                if not rows:
+                    state.update(phase="packed", after="", after_algo="")
+                    break
+                results = list(check([(object_store_path(root, algo, digest), algo, digest) for algo, digest in rows]))
+                if stop_event.is_set():
+                    break
+                for (algo, digest), (status, _, size) in zip(rows, results):
+                    state["checked"] += 1
+                    state["bytes"] += size
+                    if status != "ok":
+                        problem(status, f"{META_DIR_NAME}/{OBJECTS_DIR_NAME}/{algo}/{digest[:2]}/{digest}")
+                state["after_algo"], state["after"] = rows[-1]
+                index.checkpoint(SCRUB_STATE_KEY, state)
+                progress_callback(min(99, int(state["checked"] / total * 100)), f"object {rows[-1][1][:12]}")
+
+            while state["phase"] == "packed" and not stop_event.is_set() and not out_of_time():
+                rows = index.packed_after(state["after"], SCRUB_BATCH)
+                if not rows:
+                    state.update(phase="unindexed", after="", after_algo="")
+                    break
+                results = list(pool.map(lambda row: _scrub_packed_check(root, *row[1:], throttle, stop_event), rows))
+                if stop_event.is_set():
+                    break
+                for row, (status, size) in zip(rows, results):
+                    state["checked"] += 1
+                    state["bytes"] += size
+                    if status != "ok":
+                        problem(status, row[0], f" (in {row[1]})")
+                state["after"] = rows[-1][0]
+                index.checkpoint(SCRUB_STATE_KEY, state)
+                progress_callback(min(99, int(state["checked"] / total * 100)), rows[-1][0])
+
+            if state["phase"] == "unindexed" and not stop_event.is_set() and not out_of_time():
+                # Stat-only and cheap, so it is not resumable: it runs in one go
+                _scrub_unindexed(index, root, stop_event, problem)
+                if not stop_event.is_set():
+                    state["phase"] = "done"
+    finally:
+        if state and state["phase"] != "done":
+            with contextlib.suppress(Exception):
+                index.checkpoint(SCRUB_STATE_KEY, state)
+        index.close()
+
+    if state["phase"] != "done":
+        log_callback(f"Scrub paused after {state['checked']} files; the next scrub resumes from there.")
+        return None
+    report = {"backup": str(root), "started": state["started"], "finished": time.time(),
+              "checked": state["checked"], "bytes": state["bytes"], "baselined": state["baselined"],
+              "counts": state["counts"], "problems": state["problems"]}
+    index = BackupIndex(root, options.algorithm, options.buffer_size)
+    try:
+        index.checkpoint(SCRUB_LAST_KEY, {k: v for k, v in report.items() if k != "problems"})
+        index.checkpoint(SCRUB_STATE_KEY, None)
+    finally:
+        index.close()
+    try:
+        path = meta_dir(root) / SCRUB_REPORT_FILE_NAME
+        path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    except OSError as e:
+        log_callback(f"Error writing scrub report: {e}")
+    counts = state["counts"]
+    progress_callback(100, "Scrub complete")
+    log_callback(f"Scrub complete: {state['checked']} files ({state['bytes'] / (1024 * 1024):.1f} MB) checked, "
+                 f"{counts['corrupt']} corrupt, {counts['missing']} missing, {counts['unindexed']} unindexed"
+                 + (f", {state['baselined']} digests recorded for the first time." if state["baselined"] else "."))
+    return report
+
+def _scrub_unindexed(index: BackupIndex, root: Path, stop_event: Event, problem):
+    """ Reports backup files and stored objects that have no index row """
+    batch = []
+
+    def flush():
+        known = index.indexed(rel for rel, _ in batch)
+        for rel, _ in batch:
+            if rel not in known:
+                problem("unindexed", rel)
+        batch.clear()
+
+    for rel, entry in iter_backup_files(root):
+        if stop_event.is_set():
+            return
+        batch.append((rel, entry))
+        if len(batch) >= SCRUB_BATCH:
+            flush()
+    if batch:
+        flush()
+    objects = meta_dir(root) / OBJECTS_DIR_NAME
+    try:
+        algorithms = [e.name for e in os.scandir(objects) if e.is_dir()]
+    except OSError:
+        return
+    for algo in algorithms:
+        stored = [(rel, entry.name) for rel, entry in iter_backup_files(objects / algo) if "/" in rel]
+        for start in range(0, len(stored), SCRUB_BATCH):
+            if stop_event.is_set():
+                return
+            part = stored[start:start + SCRUB_BATCH]
+            known = index.indexed_objects(algo, (name for _, name in part))
+            for rel, name in part:
+                if name not in known:
+                    problem("unindexed", f"{META_DIR_NAME}/{OBJECTS_DIR_NAME}/{algo}/{rel}")
+
+def run_scrub_schedule(backups, schedule: str, log_callback, progress_callback, stop_event: Event, options=None,
+                       time_budget=None):
+    """ Scrubs every backup root at each time the cron schedule matches, until stopped """
+    _share_engine_module()
+    from smart_organizer_jobs import CronSchedule
+    cron = CronSchedule(schedule)
+    while not stop_event.is_set():
+        when = cron.next_after(datetime.now())
+        log_callback(f"Next scrub at {when:%Y-%m-%d %H:%M}.")
+        if stop_event.wait(max(0.0, (when - datetime.now()).total_seconds())):
+            return
+        for root in backups:
+            if stop_event.is_set():
+                return
+            scrub_backup(root, log_callback, progress_callback, stop_event, options, time_budget=time_budget)
+
+# ----------------- Log file -----------------
+LOG_VIEW_MAX_LINES = 5000
+LOG_PREVIEW_MAX_LINES = 200
+LOG_FILE_MAX_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUPS = 5
+
+def app_data_dir():
+    """ Per-user folder for the organizer's own files (logs, settings) """
+    base = os.environ.get("APPDATA") if os.name == "nt" else None
+    folder = Path(base) / "SmartOrganizer" if base else Path.home() / ".smart_organizer"
+    folder.mkdir(parents=True, exist_ok=True)
+    return folder
 
-    # ----------------- MODIFIED Tray Icon Functions -----------------
-    def create_icon_image_fallback(self):
-        """ Creates a simple 64x64 icon for the tray as a fallback """
+def setup_file_logging(log_path: Path = None, max_bytes=LOG_FILE_MAX_BYTES, backup_count=LOG_FILE_BACKUPS):
+    """ Rotating on-disk activity log holding the full history the capped log views drop """
+    logger = logging.getLogger("smart_organizer")
+    if not logger.handlers:
+        log_path = log_path or app_data_dir() / "logs" / "smart_organizer.log"
         try:
-            font = ImageFont.truetype("tahoma.ttf", 32)
-        except IOError:
-            font = ImageFont.load_default()
-        image = Image.new('RGB', (64, 64), (20, 20, 20))
-        d = ImageDraw.Draw(image)
-        d.ellipse([(4, 4), (60, 60)], fill=(30, 100, 200), outline='white')
-        d.text((15, 14), "SO", font=font, fill='white')
-        return image
-
-    def setup_tray_icon(self):
-        """ Creates and runs the system tray icon in a separate thread """
-        
-        # --- MODIFIED: Try to load icon.ico first, use fallback on error ---
+            log_path.parent.mkdir(parents=True, exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(log_path, maxBytes=max_bytes,
+                                                           backupCount=backup_count, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            logger.addHandler(handler)
+        except OSError as e:
+            print(f"Error opening log file {log_path}: {e}")
+            logger.addHandler(logging.NullHandler())
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.log_path = log_path
+    return logger
+
+# ----------------- Headless mode -----------------
+CONFIG_FILE_NAME = "config.json"
+STARTUP_SAMPLES = 5
+_CONFIG_KEYS = {"source", "backup", "schedule", "hour", "log_file"}
+_GUI_MODULES = ("customtkinter", "tkinter", "pystray", "PIL")
+
+def default_config_path():
+    return app_data_dir() / CONFIG_FILE_NAME
+
+def load_config(path: Path):
+    """ Reads a JSON config: source, backup, schedule, hour, log_file and any BackupOptions field """
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    if not isinstance(config, dict):
+        raise ValueError(f"{path}: expected a JSON object")
+    unknown = sorted(set(config) - _CONFIG_KEYS - {f.name for f in fields(BackupOptions)})
+    if unknown:
+        raise ValueError(f"{path}: unknown setting(s): {', '.join(unknown)}")
+    return config
+
+def options_from_config(config: dict):
+    """ BackupOptions with every field the config sets; glob lists may be lists or comma-separated strings """
+    options = BackupOptions()
+    for f in fields(BackupOptions):
+        value = config.get(f.name)
+        if value is None:
+            continue
+        if f.name in ("include", "exclude") and isinstance(value, str):
+            value = parse_glob_list(value)
+        setattr(options, f.name, value)
+    if options.algorithm not in DIGEST_ALGORITHMS:
+        raise ValueError(f"Unknown digest algorithm '{options.algorithm}'.")
+    options.hash_workers = max(1, int(options.hash_workers))
+    options.copy_workers = max(1, int(options.copy_workers))
+    if options.io_class is not None and options.io_class not in IO_CLASSES:
+        raise ValueError(f"Unknown I/O class '{options.io_class}' (use {' or '.join(IO_CLASSES)}).")
+    for name in ("read_limit_mb", "write_limit_mb", "files_per_second", "chunk_threshold_mb", "pack_threshold_kb",
+                 "multipart_mb"):
+        setattr(options, name, max(0.0, float(getattr(options, name))))
+    options.nice = max(0, int(options.nice))
+    if options.storage not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown storage backend '{options.storage}' (use {' or '.join(STORAGE_BACKENDS)}).")
+    options.storage_connections = max(1, int(options.storage_connections))
+    return options
+
+def validate_backup_paths(source: Path, backup):
+    """ Same safety checks as the GUI, for one backup root or a list of them; raises ValueError
+    with a readable message. Returns (source, backup) with backup as a Path or list of Paths.
+    """
+    if not source or not backup:
+        raise ValueError("Please set both source and backup folders.")
+    source, roots = Path(source), backup_roots(backup)
+    if not source.is_dir():
+        raise ValueError(f"Source folder does not exist or is not a directory: {source}")
+    if len({root.resolve() for root in roots}) != len(roots):
+        raise ValueError("Backup folders must all be different.")
+    for root in roots:
+        root.mkdir(parents=True, exist_ok=True)
+        if not root.is_dir():
+            raise ValueError(f"Backup path is not a directory: {root}")
+        if source.resolve() == root.resolve():
+            raise ValueError("Source and Backup folders cannot be the same!")
+        if root.resolve() in source.resolve().parents:
+            raise ValueError("Cannot set backup folder to be inside the source folder!")
+    return source, roots[0] if len(roots) == 1 else roots
+
+class ConsoleReporter:
+    """ log/progress callbacks for headless runs: timestamped lines on stdout plus the rotating log file """
+    def __init__(self, file_logger, quiet=False, progress_interval=0.5):
+        self.file_logger = file_logger
+        self.quiet = quiet
+        self.progress_interval = progress_interval
+        self.show_progress = not quiet and sys.stderr is not None and sys.stderr.isatty()
+        self._last_progress = 0.0 if self.show_progress else time.monotonic()
+        # Latest ProgressSnapshot of a backup run, also when the progress line is not shown
+        self.last_stats = None
+
+    def log(self, text: str):
+        self.file_logger.info(text)
+        if not self.quiet:
+            ts = datetime.now().strftime("%H:%M:%S")
+            print(f"[{ts}] {text}", flush=True)
+
+    def progress(self, percent, filename, stats: ProgressSnapshot = None):
+        self.last_stats = stats or self.last_stats
+        now = time.monotonic()
+        if not self.show_progress:
+            # No terminal (service, cron, redirected output): an occasional log line instead
+            if stats and not self.quiet and percent < 100 and now - self._last_progress >= PROGRESS_LOG_INTERVAL:
+                self._last_progress = now
+                self.log(f"Progress: {percent}%, {stats.describe()}.")
+            return
+        if percent < 100 and now - self._last_progress < self.progress_interval:
+            return
+        self._last_progress = now
+        line = f"{percent:3d}% " + (f"{stats.describe()}  " if stats else "") + filename
+        sys.stderr.write(f"\r{line[:110]:<110}" + ("\n" if percent >= 100 else ""))
+        sys.stderr.flush()
+
+def startup_seconds():
+    """ Time since this module started importing """
+    return time.perf_counter() - _IMPORT_STARTED
+
+def measure_startup(samples=STARTUP_SAMPLES, log=print):
+    """ Cold-starts the headless entry point in fresh interpreters and reports the median timings """
+    command = [sys.executable] if getattr(sys, "frozen", False) else [sys.executable, os.path.abspath(__file__)]
+    wall, imported, gui_loaded = [], [], False
+    for _ in range(samples):
+        started = time.perf_counter()
+        out = subprocess.run(command + ["startup-time", "--child"], capture_output=True, text=True, check=True)
+        wall.append(time.perf_counter() - started)
+        child = json.loads(out.stdout)
+        imported.append(child["import_seconds"])
+        gui_loaded = gui_loaded or bool(child["gui_modules"])
+    result = {"process_ms": round(sorted(wall)[len(wall) // 2] * 1000, 1),
+              "import_ms": round(sorted(imported)[len(imported) // 2] * 1000, 1),
+              "gui_modules_loaded": gui_loaded}
+    log(f"Headless startup (median of {samples}): {result['process_ms']} ms process, "
+        f"{result['import_ms']} ms module import, GUI modules loaded: {'yes' if gui_loaded else 'no'}")
+    return result
+
+def _stop_on_signals(stop_event: Event):
+    for sig in (signal.SIGINT, signal.SIGTERM):
         try:
-            icon_path = resource_path("icon.ico")
-            image = Image.open(icon_path)
-        except Exception as e:
-            self.safe_log(f"Icon file 'icon.ico' not found. Using generated icon. Error: {e}")
-            image = self.create_icon_image_fallback()
-        # --- END MODIFICATION ---
-
-        menu = (
-            pystray.MenuItem('Show', self.show_window, default=True),
-            pystray.MenuItem('Quit', self.quit_application)
-        )
-        self.tray_icon = pystray.Icon("SmartOrganizer", image, "Smart Organizer", menu)
-        
-        self.tray_thread = Thread(target=self.tray_icon.run, daemon=True)
-        self.tray_thread.start()
+            signal.signal(sig, lambda signum, frame: stop_event.set())
+        except (ValueError, OSError):
+            pass
 
-    def hide_to_tray(self):
-# ... existing code ...
-        """ Hides the main window """
-        self.withdraw()
-        # You can add a notification here if you want
-        # self.tray_icon.notify("Running in background", "Smart Organizer is still active.")
+def _reload_on_hangup(callback):
+    """ SIGHUP (POSIX only) calls callback, e.g. to re-read throttle limits without restarting """
+    if not hasattr(signal, "SIGHUP"):
+        return
+    try:
+        signal.signal(signal.SIGHUP, lambda signum, frame: callback())
+    except (ValueError, OSError):
+        pass
 
-    def show_window(self):
-# ... existing code ...
-        """ Shows the main window from the tray """
-        self.deiconify() # Un-hide
-        self.lift() # Bring to front
-        self.attributes("-topmost", 1)
-        # Unset topmost after a moment so it doesn't stay above all windows
-        self.after(100, lambda: self.attributes("-topmost", 0))
-
-    def quit_application(self):
-# ... existing code ...
-        """ This is the new 'on_close' logic, called by the tray menu """
-        self.safe_log("Quit requested, stopping all tasks...")
-        
-        # Stop all threads
-        self.stop_event.set()
-        if self.tray_icon:
-            self.tray_icon.stop()
-        
-        # Wait for threads to hopefully stop
-        if self.manual_thread and self.manual_thread.is_alive():
-            self.manual_thread.join(timeout=1)
-        if self.auto_thread and self.auto_thread.is_alive():
-            self.auto_thread.join(timeout=1)
-        
-        self.destroy() # Destroy the main window, which exits the app
+def _add_backup_arguments(parser):
+    parser.add_argument("--config", type=Path,
+                        help=f"JSON config file (default: {CONFIG_FILE_NAME} in the app data folder, if present)")
+    parser.add_argument("--source", help="folder to back up")
+    parser.add_argument("--backup", action="append",
+                        help="backup root folder; repeat to write every file to several roots from one read")
+    _add_option_arguments(parser)
+    parser.add_argument("--dry-run", action="store_true", default=None,
+                        help="only report what would be copied where, without copying anything")
+    parser.add_argument("--plan-file", dest="plan_path", type=Path, help="write the dry-run plan here as JSON")
+    parser.add_argument("--log-file", type=Path)
+    parser.add_argument("-q", "--quiet", action="store_true", help="only write the log file")
+
+def _add_option_arguments(parser):
+    """ Flags that map one-to-one onto BackupOptions fields """
+    parser.add_argument("--algorithm", choices=sorted(DIGEST_ALGORITHMS))
+    parser.add_argument("--hash-workers", type=int)
+    parser.add_argument("--copy-workers", type=int)
+    parser.add_argument("--include", type=parse_glob_list, help="comma-separated globs, e.g. *.jpg,*.png")
+    parser.add_argument("--exclude", type=parse_glob_list, help="comma-separated globs")
+    parser.add_argument("--max-depth", type=int)
+    parser.add_argument("--no-journal", dest="use_journal", action="store_false", default=None,
+                        help="re-check every source file instead of skipping unchanged ones")
+    parser.add_argument("--object-store", dest="content_addressed", action="store_true", default=None)
+    parser.add_argument("--digest-on-copy", action="store_true", default=None)
+    parser.add_argument("--metrics-file", dest="metrics_path", type=Path,
+                        help=f"also write the JSON run summary here (always kept as {META_DIR_NAME}/{METRICS_FILE_NAME})")
+    parser.add_argument("--prometheus-file", dest="prometheus_path", type=Path,
+                        help="write Prometheus text-format metrics, e.g. into node exporter's textfile directory")
+    parser.add_argument("--profile", choices=PROFILE_MODES, help="capture a cProfile or sampling profile of the run")
+    parser.add_argument("--profile-output", dest="profile_path", type=Path)
+    parser.add_argument("--read-limit", dest="read_limit_mb", type=float, metavar="MB_S",
+                        help="cap read bandwidth in MB/s (0 = unlimited)")
+    parser.add_argument("--write-limit", dest="write_limit_mb", type=float, metavar="MB_S",
+                        help="cap write bandwidth in MB/s (0 = unlimited)")
+    parser.add_argument("--files-per-second", type=float, help="cap files hashed or copied per second")
+    parser.add_argument("--io-class", choices=list(IO_CLASSES), help="Linux I/O scheduling class for the run")
+    parser.add_argument("--nice", type=int, help="raise the run's CPU niceness to at least this value")
+    parser.add_argument("--chunk-threshold", dest="chunk_threshold_mb", type=float, metavar="MB",
+                        help="store files of at least this size as deduplicated chunks plus a manifest")
+    parser.add_argument("--pack-threshold", dest="pack_threshold_kb", type=float, metavar="KB",
+                        help="append files smaller than this to per-folder tar segments instead of copying them")
+    parser.add_argument("--storage", choices=list(STORAGE_BACKENDS),
+                        help="backend the backup roots are written through (objstore = local object-store emulator)")
+    parser.add_argument("--storage-connections", type=int, help="pooled connections per object-store root")
+    parser.add_argument("--multipart-size", dest="multipart_mb", type=float, metavar="MB",
+                        help="object-store uploads larger than this are sent as parallel parts")
+
+def build_arg_parser():
+    _share_engine_module()
+    from smart_organizer_jobs import JOBS_FILE_NAME
+    parser = argparse.ArgumentParser(prog="smart_file_organizer_pro_v5",
+                                     description="Smart File Organizer Pro v5. Starts the GUI when no command is given.")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("gui", help="start the desktop app (default)")
+    _add_backup_arguments(commands.add_parser("run", help="back up once and exit"))
+    daemon = commands.add_parser("daemon", help="keep backing up on a schedule until stopped")
+    _add_backup_arguments(daemon)
+    daemon.add_argument("--schedule", help="hourly, daily or watch")
+    daemon.add_argument("--hour", type=int, help="hour of day for the daily schedule")
+    bench = commands.add_parser("benchmark-digests", help="compare digest throughput")
+    bench.add_argument("size_mb", nargs="?", type=int, default=256)
+    startup = commands.add_parser("startup-time", help="measure headless cold-start time")
+    startup.add_argument("--samples", type=int, default=STARTUP_SAMPLES)
+    startup.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    scrub = commands.add_parser("scrub", help="re-read backup files and check them against their stored digests")
+    scrub.add_argument("--backup", action="append", required=True, help="backup root folder; repeat for several")
+    scrub.add_argument("--read-limit", dest="read_limit_mb", type=float, metavar="MB_S",
+                       help="cap read bandwidth in MB/s (0 = unlimited)")
+    scrub.add_argument("--hash-workers", type=int, help="files checked in parallel")
+    scrub.add_argument("--io-class", choices=list(IO_CLASSES), help="Linux I/O scheduling class for the scrub")
+    scrub.add_argument("--nice", type=int, help="raise the scrub's CPU niceness to at least this value")
+    scrub.add_argument("--max-minutes", type=float,
+                       help="pause after this long; the next scrub resumes where this one stopped")
+    scrub.add_argument("--schedule", help="keep scrubbing on this cron schedule until stopped")
+    scrub.add_argument("--restart", action="store_true", help="start over instead of resuming a paused scrub")
+    scrub.add_argument("--log-file", type=Path)
+    scrub.add_argument("-q", "--quiet", action="store_true", help="only write the log file")
+    restore = commands.add_parser("restore", help="reassemble chunked files from their manifests")
+    restore.add_argument("path", type=Path,
+                         help=f"a {MANIFEST_SUFFIX} file, or a backup folder to restore every manifest below it")
+    restore.add_argument("--to", type=Path, required=True, help="folder to write the restored files into")
+    packed = commands.add_parser("packed", help="list or extract files stored in pack segments")
+    packed.add_argument("--backup", type=Path, required=True, help="backup root folder")
+    packed_commands = packed.add_subparsers(dest="packed_command", required=True)
+    packed_list = packed_commands.add_parser("list", help="show packed files with their segments")
+    packed_list.add_argument("patterns", nargs="*", help="glob patterns (path inside the backup, or file name)")
+    packed_extract = packed_commands.add_parser("extract", help="copy packed files out into a folder")
+    packed_extract.add_argument("patterns", nargs="+", help="glob patterns (path inside the backup, or file name)")
+    packed_extract.add_argument("--to", type=Path, required=True, help="folder to write the files into")
+    jobs = commands.add_parser("jobs", help="manage and run named backup jobs")
+    jobs.add_argument("--jobs", type=Path, help=f"jobs file (default: {JOBS_FILE_NAME} in the app data folder)")
+    job_commands = jobs.add_subparsers(dest="jobs_command", required=True)
+    job_commands.add_parser("list", help="show jobs with their next and last runs")
+    add = job_commands.add_parser("add", help="define a job")
+    add.add_argument("name")
+    add.add_argument("--source", required=True)
+    add.add_argument("--backup", action="append", required=True, help="repeat for several backup roots")
+    add.add_argument("--schedule", default="@hourly",
+                     help="cron expression (minute hour day month weekday), @hourly/@daily/@weekly, or watch")
+    add.add_argument("--disabled", action="store_true")
+    _add_option_arguments(add)
+    remove = job_commands.add_parser("remove", help="delete a job")
+    remove.add_argument("name")
+    run_jobs = job_commands.add_parser("run", help="run every enabled job on its schedule until stopped")
+    run_jobs.add_argument("--max-concurrent", type=int, help="jobs allowed to run at once")
+    run_jobs.add_argument("--worker-budget", type=int, help="hash+copy workers shared by all running jobs")
+    run_jobs.add_argument("--read-limit", dest="read_limit_mb", type=float, metavar="MB_S",
+                          help="cap the combined read bandwidth of all running jobs in MB/s (0 = unlimited)")
+    run_jobs.add_argument("--write-limit", dest="write_limit_mb", type=float, metavar="MB_S",
+                          help="cap the combined write bandwidth of all running jobs in MB/s (0 = unlimited)")
+    run_jobs.add_argument("--run-now", action="store_true", help="start every job once right away")
+    run_jobs.add_argument("--log-file", type=Path)
+    run_jobs.add_argument("-q", "--quiet", action="store_true")
+    return parser
+
+def _resolve_config(args):
+    """ Config file values overridden by any command-line flags """
+    config_path = args.config or default_config_path()
+    config = load_config(config_path) if args.config or config_path.exists() else {}
+    for key, value in vars(args).items():
+        if value is not None and key not in ("command", "config", "quiet"):
+            config[key] = str(value) if isinstance(value, Path) else value
+    return config
+
+def headless_main(args):
+    """ run / daemon commands: the backup engine without any GUI imports """
+    try:
+        config = _resolve_config(args)
+        options = options_from_config(config)
+        source, backup = validate_backup_paths(config.get("source"), config.get("backup"))
+        schedule_mode = SCHEDULE_ALIASES.get(config.get("schedule"), config.get("schedule"))
+        if args.command == "daemon" and schedule_mode not in SCHEDULE_MODES[1:]:
+            raise ValueError(f"Unknown schedule '{config.get('schedule')}' (use hourly, daily or watch).")
+    except (OSError, ValueError, TypeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    log_file = config.get("log_file")
+    reporter = ConsoleReporter(setup_file_logging(Path(log_file) if log_file else None), quiet=args.quiet)
+    reporter.log(f"Headless startup took {startup_seconds() * 1000:.0f} ms.")
+    stop_event = Event()
+    _stop_on_signals(stop_event)
+    throttle = Throttle.from_options(options)
+
+    def reload_limits():
+        try:
+            reloaded = options_from_config(_resolve_config(args))
+        except (OSError, ValueError, TypeError) as e:
+            reporter.log(f"Error reloading limits: {e}")
+            return
+        throttle.set_limits(reloaded.read_limit_mb, reloaded.write_limit_mb, reloaded.files_per_second)
+        reporter.log(f"Limits reloaded: {throttle.describe()}.")
+
+    _reload_on_hangup(reload_limits)
+    try:
+        if args.command == "daemon":
+            run_schedule(source, backup, schedule_mode, config.get("hour", 8), reporter.log, reporter.progress,
+                         stop_event, options, throttle)
+            reporter.log("Schedule stopped.")
+        else:
+            run_backup_once(source, backup, reporter.log, reporter.progress, stop_event, options, throttle=throttle)
+    except Exception as e:
+        reporter.log(f"CRITICAL ERROR in headless run: {e}")
+        return 1
+    # A stopped daemon is a normal shutdown; a stopped one-off run did not finish
+    return 130 if stop_event.is_set() and args.command == "run" else 0
+
+def scrub_main(args):
+    """ scrub: exits with 1 if a finished scrub found problems, 130 if it was stopped or paused """
+    try:
+        options = options_from_config({name: getattr(args, name) for name in
+                                       ("read_limit_mb", "hash_workers", "io_class", "nice")})
+        if args.schedule:
+            _share_engine_module()
+            from smart_organizer_jobs import CronSchedule
+            CronSchedule(args.schedule)
+    except (TypeError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    backups = [Path(b) for b in args.backup]
+    for root in backups:
+        if not (meta_dir(root) / INDEX_FILE_NAME).exists():
+            print(f"Error: {root} has no backup index to scrub.", file=sys.stderr)
+            return 2
+    reporter = ConsoleReporter(setup_file_logging(args.log_file), quiet=args.quiet)
+    stop_event = Event()
+    _stop_on_signals(stop_event)
+    budget = args.max_minutes * 60 if args.max_minutes else None
+    if args.schedule:
+        run_scrub_schedule(backups, args.schedule, reporter.log, reporter.progress, stop_event, options, budget)
+        reporter.log("Scrub schedule stopped.")
+        return 0
+    reports = [scrub_backup(root, reporter.log, reporter.progress, stop_event, options, time_budget=budget,
+                            restart=args.restart) for root in backups]
+    if any(report is None for report in reports):
+        return 130
+    return 1 if any(sum(report["counts"].values()) for report in reports) else 0
+
+def restore_main(args):
+    """ restore: rebuilds chunked files; exits with 1 if any of them could not be restored """
+    if not args.path.exists():
+        print(f"Error: {args.path} does not exist.", file=sys.stderr)
+        return 2
+    stop_event = Event()
+    _stop_on_signals(stop_event)
+    restored, failed = restore_chunked(args.path, args.to, print, stop_event)
+    if stop_event.is_set():
+        return 130
+    return 1 if failed or not restored else 0
+
+def packed_main(args):
+    """ packed list / extract; extract exits with 1 if any file failed or nothing matched """
+    if not (meta_dir(args.backup) / INDEX_FILE_NAME).exists():
+        print(f"Error: {args.backup} has no backup index.", file=sys.stderr)
+        return 2
+    if args.packed_command == "list":
+        try:
+            for rel, segment, offset, size, _, _, _ in iter_packed(args.backup, args.patterns):
+                print(f"{rel}\t{size}\t{segment}@{offset}")
+            sys.stdout.flush()
+        except BrokenPipeError:
+            # The reader (head, less) quit early; point stdout at devnull so the exit flush stays quiet
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            return 1
+        return 0
+    extracted, failed = extract_packed(args.backup, args.patterns, args.to, print)
+    return 1 if failed or not extracted else 0
+
+def jobs_main(args):
+    """ jobs list / add / remove / run, all backed by the jobs file """
+    _share_engine_module()
+    from smart_organizer_jobs import (
+        DEFAULT_MAX_CONCURRENT_JOBS, BackupJob, JobScheduler, default_jobs_path, job_state_path, load_job_state,
+        load_jobs, parse_job_schedule, save_jobs,
+    )
+    path = args.jobs or default_jobs_path()
+    try:
+        jobs, settings = load_jobs(path)
+        if args.jobs_command == "add":
+            option_names = {f.name for f in fields(BackupOptions)}
+            options = {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()
+                       if k in option_names and v is not None}
+            backup = args.backup[0] if len(args.backup) == 1 else args.backup
+            job = BackupJob.from_dict({"name": args.name, "source": args.source, "backup": backup,
+                                       "schedule": args.schedule, "enabled": not args.disabled, "options": options})
+            if any(existing.name == job.name for existing in jobs):
+                raise ValueError(f"A job named '{job.name}' already exists.")
+            validate_backup_paths(job.source, job.backup)
+            save_jobs(path, jobs + [job], settings)
+            print(f"Added job '{job.name}' to {path}.")
+            return 0
+        if args.jobs_command == "remove":
+            if not any(job.name == args.name for job in jobs):
+                raise ValueError(f"No job named '{args.name}'.")
+            save_jobs(path, [job for job in jobs if job.name != args.name], settings)
+            print(f"Removed job '{args.name}'.")
+            return 0
+    except (OSError, ValueError, TypeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    if args.jobs_command == "list":
+        state = load_job_state(job_state_path(path))
+        if not jobs:
+            print(f"No jobs in {path}.")
+        for job in jobs:
+            schedule = parse_job_schedule(job.schedule)
+            next_run = "continuous" if schedule is None else schedule.next_after(datetime.now()).strftime("%Y-%m-%d %H:%M")
+            last = state.get(job.name, {})
+            print(f"{job.name:<16} {'on ' if job.enabled else 'off'} {job.schedule:<16} next {next_run:<16} "
+                  f"last {last.get('last_run', '-')} {last.get('last_status', '')}  {job.source} -> {', '.join(map(str, backup_roots(job.backup)))}")
+        return 0
+
+    reporter = ConsoleReporter(setup_file_logging(args.log_file), quiet=args.quiet)
+    if not jobs:
+        reporter.log(f"No jobs in {path}. Add one with: jobs add NAME --source ... --backup ...")
+        return 2
+
+    def shared_limits(settings):
+        """ Scheduler-wide (read, write) MB/s: flags win over the jobs file """
+        return tuple(max(0.0, float(flag if flag is not None else settings.get(name) or 0))
+                     for flag, name in ((args.read_limit_mb, "read_limit_mb"), (args.write_limit_mb, "write_limit_mb")))
+
+    try:
+        read_limit, write_limit = shared_limits(settings)
+    except (ValueError, TypeError) as e:
+        reporter.log(f"Error: invalid shared limit in {path}: {e}")
+        return 2
+    scheduler = JobScheduler(jobs, job_state_path(path), reporter.log,
+                             args.max_concurrent or settings.get("max_concurrent_jobs", DEFAULT_MAX_CONCURRENT_JOBS),
+                             args.worker_budget or settings.get("worker_budget"), read_limit, write_limit)
+    reporter.log(f"Scheduling {len(jobs)} job(s): up to {scheduler.max_concurrent} at once, "
+                 f"{scheduler.worker_budget} workers shared; shared limits {scheduler.throttle.describe()}.")
+    stop_event = Event()
+    _stop_on_signals(stop_event)
+
+    def reload_limits():
+        try:
+            reloaded, reloaded_settings = load_jobs(path)
+            read_limit, write_limit = shared_limits(reloaded_settings)
+        except (OSError, ValueError, TypeError) as e:
+            reporter.log(f"Error reloading limits: {e}")
+            return
+        scheduler.set_shared_limits(read_limit, write_limit)
+        known = {job.name for job in scheduler.jobs()}
+        for job in reloaded:
+            if job.name in known:
+                scheduler.set_limits(job.name, job.options.read_limit_mb, job.options.write_limit_mb,
+                                     job.options.files_per_second)
+        reporter.log(f"Job limits reloaded; shared limits {scheduler.throttle.describe()}.")
+
+    _reload_on_hangup(reload_limits)
+    scheduler.start()
+    if args.run_now:
+        for job in jobs:
+            scheduler.run_now(job.name)
+    stop_event.wait()
+    reporter.log("Stopping jobs...")
+    scheduler.stop()
+    reporter.log("All jobs stopped.")
+    return 0
+
+def _share_engine_module():
+    """ When run as a script, lets the modules that import this one (GUI, jobs) reuse it instead of
+    importing the file a second time
+    """
+    sys.modules.setdefault("smart_file_organizer_pro_v5", sys.modules[__name__])
+
+def launch_gui():
+    """ Imports the customtkinter/pystray front end only now, so headless commands never pay for it """
+    _share_engine_module()
+    from smart_organizer_gui import SmartOrganizerApp
+    app = SmartOrganizerApp()
+    app.mainloop()
+    return 0
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if argv[:1] == ["--benchmark-digests"]:
+        argv[0] = "benchmark-digests"
+    args = build_arg_parser().parse_args(argv)
+    if args.command == "benchmark-digests":
+        benchmark_digests(args.size_mb)
+        return 0
+    if args.command == "startup-time":
+        if args.child:
+            gui_modules = [name for name in _GUI_MODULES if name in sys.modules]
+            print(json.dumps({"import_seconds": startup_seconds(), "gui_modules": gui_modules}))
+        else:
+            # Goes to the rotating log too, so startup regressions show up across releases
+            measure_startup(args.samples, ConsoleReporter(setup_file_logging()).log)
+        return 0
+    if args.command in ("run", "daemon"):
+        return headless_main(args)
+    if args.command == "jobs":
+        return jobs_main(args)
+    if args.command == "restore":
+        return restore_main(args)
+    if args.command == "packed":
+        return packed_main(args)
+    if args.command == "scrub":
+        return scrub_main(args)
+    return launch_gui()
 
 # ----------------- Run -----------------
 if __name__ == "__main__":
-# ... existing code ...
-    app = SmartOrganizerApp()
-    app.mainloop()
\ No newline at end of file
+    sys.exit(main())
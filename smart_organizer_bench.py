@@ -0,0 +1,406 @@
+""" Reproducible benchmark suite for the Smart Organizer backup engine.
+
+Generates a synthetic source tree (and optionally a partly filled backup tree), then times scanning,
+hashing, index reconciliation and full/incremental backup runs headlessly. Results are printed as JSON;
+pass --baseline with an earlier result to flag phases that got slower.
+
+    python smart_organizer_bench.py --files 20000 --profile mixed --dup-ratio 0.2 --depth 4 --output run.json
+
+--digest-set N instead measures the memory and lookup speed of N digests held as a set of hex strings
+against the packed DigestSet, in memory and memory-mapped from disk.
+
+--storage-latency MS instead times the object-store emulator with that much latency per request:
+existence checks one key at a time vs batched, and small and large uploads over one connection vs
+the connection pool and multipart uploads.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from threading import Event
+
+from smart_file_organizer_pro_v5 import BackupOptions, run_backup_once, scan_source
+from smart_organizer_digests import DIGEST_ALGORITHMS, file_digest
+from smart_organizer_digestset import DigestSet, digest_width
+from smart_organizer_index import BackupIndex
+from smart_organizer_storage import ObjectStoreEmulator, iter_backup_files
+
+KIB = 1024
+MIB = 1024 * 1024
+BLOCK_POOL_SIZE = 64
+
+# (weight, min bytes, max bytes) buckets, sampled log-uniformly inside each bucket
+SIZE_PROFILES = {
+    "tiny": [(1.0, 64, 8 * KIB)],
+    "huge": [(1.0, 64 * MIB, 256 * MIB)],
+    "mixed": [(0.80, 256, 64 * KIB), (0.18, 64 * KIB, 4 * MIB), (0.02, 16 * MIB, 64 * MIB)],
+}
+
+def sample_size(rng: random.Random, profile: str, max_size=None):
+    """ One file size drawn from a SIZE_PROFILES distribution """
+    buckets = SIZE_PROFILES[profile]
+    pick = rng.random() * sum(weight for weight, _, _ in buckets)
+    for weight, low, high in buckets:
+        pick -= weight
+        if pick <= 0:
+            break
+    if max_size:
+        low, high = min(low, max_size), min(high, max_size)
+    return int(round(low * (high / low) ** rng.random()))
+
+def _write_content(path: Path, size: int, rng: random.Random, blocks):
+    """ Seeded file content; big files are stitched from a shared block pool so generation stays fast """
+    with open(path, "wb") as f:
+        if size <= 4 * MIB:
+            f.write(rng.randbytes(size))
+            return
+        # A per-file header and random block order keep head/middle/tail samples distinct between files
+        f.write(rng.randbytes(4 * KIB))
+        written = 4 * KIB
+        while written < size:
+            chunk = blocks[rng.randrange(len(blocks))][:size - written]
+            f.write(chunk)
+            written += len(chunk)
+
+def generate_tree(root: Path, files: int, profile="mixed", dup_ratio=0.0, depth=3, fanout=8, seed=1,
+                  max_size=None):
+    """ Builds a reproducible source tree. Returns (file count, total bytes, duplicate count). """
+    rng = random.Random(seed)
+    blocks = [rng.randbytes(MIB) for _ in range(BLOCK_POOL_SIZE)] if profile != "tiny" else []
+    extensions = [".jpg", ".png", ".txt", ".pdf", ".docx", ".mp4", ".zip", ".csv"]
+    written = []
+    total_bytes = duplicates = 0
+    root.mkdir(parents=True, exist_ok=True)
+    for i in range(files):
+        folder = root
+        for level in range(rng.randint(0, depth)):
+            folder = folder / f"d{level}_{rng.randrange(fanout)}"
+        folder.mkdir(parents=True, exist_ok=True)
+        path = folder / f"file_{i:07d}{rng.choice(extensions)}"
+        if written and rng.random() < dup_ratio:
+            shutil.copyfile(rng.choice(written), path)
+            duplicates += 1
+        else:
+            _write_content(path, sample_size(rng, profile, max_size), rng, blocks)
+            written.append(path)
+        total_bytes += path.stat().st_size
+    return files, total_bytes, duplicates
+
+def seed_backup_tree(source: Path, backup: Path, ratio: float, seed=1):
+    """ Copies a share of the source into the backup root so the index and duplicate checks have work """
+    rng = random.Random(seed + 1)
+    count = 0
+    for f in scan_source(source):
+        if rng.random() < ratio:
+            target = backup / "seeded" / f.rel
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(f.path, target)
+            count += 1
+    return count
+
+def peak_rss_mb():
+    """ Peak resident set size of this process so far, or None where resource is unavailable """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and KiB elsewhere
+    return round(peak / MIB if sys.platform == "darwin" else peak / KIB, 1)
+
+def tree_size(root: Path):
+    """ (files, bytes) currently stored under a backup root, excluding the meta folder """
+    files = size = 0
+    for _, entry in iter_backup_files(root):
+        files += 1
+        size += entry.stat(follow_symlinks=False).st_size
+    return files, size
+
+class PhaseTimer:
+    """ Collects wall time, throughput and peak RSS per named phase """
+    def __init__(self):
+        self.phases = {}
+
+    def record(self, name, seconds, files=0, size=0):
+        self.phases[name] = {
+            "seconds": round(seconds, 4),
+            "files": files,
+            "bytes": size,
+            "files_per_s": round(files / seconds, 1) if seconds > 0 and files else None,
+            "mb_per_s": round(size / MIB / seconds, 1) if seconds > 0 and size else None,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+    def run(self, name, func, files=0, size=0):
+        started = time.perf_counter()
+        result = func()
+        self.record(name, time.perf_counter() - started, files, size)
+        return result
+
+def run_benchmark(workdir: Path, files=5000, profile="mixed", dup_ratio=0.1, depth=3, backup_ratio=0.0,
+                  seed=1, max_size=None, options: BackupOptions = None, log=print):
+    """ Generates the trees under workdir and times each engine phase. Returns the JSON-ready result. """
+    options = options or BackupOptions()
+    source, backup = workdir / "source", workdir / "backup"
+    never = Event()
+    quiet = lambda *_: None
+    timer = PhaseTimer()
+
+    log(f"Generating {files} files ({profile}, {dup_ratio:.0%} duplicates, depth {depth})...")
+    # A child process builds the trees so their buffers do not count towards the engine's peak RSS
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        count, total_bytes, duplicates = pool.submit(generate_tree, source, files, profile, dup_ratio, depth,
+                                                     seed=seed, max_size=max_size).result()
+        backup.mkdir(parents=True, exist_ok=True)
+        seeded = pool.submit(seed_backup_tree, source, backup, backup_ratio, seed).result() if backup_ratio > 0 else 0
+    timer.record("generate", time.perf_counter() - started, count, total_bytes)
+    seeded_files, seeded_bytes = tree_size(backup)
+    baseline_rss = peak_rss_mb()
+
+    log("Timing scan...")
+    # Stat-only phases report files/s; MB/s is left out since no file content is read
+    scanned = timer.run("scan", lambda: list(scan_source(source, options.include, options.exclude,
+                                                         options.max_depth)), count)
+    log("Timing hashing...")
+    timer.run("hash", lambda: [file_digest(f.path, never, options.algorithm, options.buffer_size)
+                               for f in scanned], count, total_bytes)
+
+    def reconcile():
+        index = BackupIndex(backup, options.algorithm, options.buffer_size)
+        try:
+            index.reconcile(never, quiet)
+        finally:
+            index.close()
+    log("Timing index reconcile...")
+    timer.run("index", reconcile, seeded_files)
+
+    log("Timing full backup run...")
+    backup_metrics = timer.run("backup", lambda: run_backup_once(source, backup, quiet, quiet, never, options),
+                               count, total_bytes)
+    log("Timing unchanged re-run...")
+    rerun_metrics = timer.run("rerun", lambda: run_backup_once(source, backup, quiet, quiet, never, options),
+                              count, total_bytes)
+    stored_files, stored_bytes = tree_size(backup)
+
+    return {
+        "params": {"files": files, "profile": profile, "dup_ratio": dup_ratio, "depth": depth,
+                   "backup_ratio": backup_ratio, "seed": seed, "max_size": max_size,
+                   "algorithm": options.algorithm, "hash_workers": options.hash_workers,
+                   "copy_workers": options.copy_workers, "use_journal": options.use_journal,
+                   "content_addressed": options.content_addressed},
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpu_count": os.cpu_count(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "tree": {"files": count, "bytes": total_bytes, "duplicates": duplicates, "seeded_backup_files": seeded,
+                 "seeded_backup_bytes": seeded_bytes, "backup_files_after": stored_files,
+                 "backup_bytes_after": stored_bytes},
+        "phases": timer.phases,
+        # The engine's own per-phase breakdown (busy time per pipeline stage, bytes, queue depths)
+        "run_metrics": {"backup": backup_metrics.to_dict() if backup_metrics else None,
+                        "rerun": rerun_metrics.to_dict() if rerun_metrics else None},
+        "baseline_rss_mb": baseline_rss,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def compare_to_baseline(result: dict, baseline: dict, tolerance=0.2, log=print):
+    """ Lists phases whose wall time grew by more than tolerance against a previous result """
+    regressions = []
+    for name, phase in result["phases"].items():
+        before = baseline.get("phases", {}).get(name)
+        if name == "generate" or not before or not before.get("seconds"):
+            continue
+        change = phase["seconds"] / before["seconds"] - 1
+        log(f"{name:<8} {before['seconds']:>9.3f}s -> {phase['seconds']:>9.3f}s ({change:+.0%})")
+        if change > tolerance:
+            regressions.append(name)
+    return regressions
+
+def _lookup_rate(container, probes):
+    started = time.perf_counter()
+    hits = sum(1 for d in probes if d in container)
+    seconds = time.perf_counter() - started
+    return hits, round(len(probes) / seconds) if seconds > 0 else None
+
+def digest_set_benchmark(workdir: Path, count=1_000_000, algorithm="sha256", probes=100_000, seed=1, log=print):
+    """ Heap bytes per digest and lookups per second: set of hex strings vs DigestSet in memory and mapped """
+    rng = random.Random(seed)
+    width = digest_width(algorithm)
+    log(f"Generating {count} {algorithm} digests...")
+    digests = [rng.randbytes(width).hex() for _ in range(count)]
+    present = rng.sample(digests, min(probes, count))
+    absent = [rng.randbytes(width).hex() for _ in range(probes)]
+
+    def measure(name, build):
+        started = time.perf_counter()
+        container = build()
+        built = time.perf_counter() - started
+        # Build again under tracemalloc: tracing slows allocation-heavy builds down too much to time them
+        del container
+        tracemalloc.start()
+        container = build()
+        heap = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        hits, hit_rate = _lookup_rate(container, present)
+        false_hits, miss_rate = _lookup_rate(container, absent)
+        assert hits == len(present) and not false_hits, f"{name} gave wrong answers"
+        return container, {
+            "build_seconds": round(built, 3),
+            "heap_bytes": heap,
+            "heap_bytes_per_digest": round(heap / count, 1) if count else None,
+            "hit_lookups_per_s": hit_rate,
+            "miss_lookups_per_s": miss_rate,
+        }
+
+    results = {}
+    # Fresh strings per build, as when the digests are read back from the index
+    _, results["hex_set"] = measure("hex_set", lambda: {bytes.fromhex(d).hex() for d in digests})
+    _, results["digest_set"] = measure("digest_set", lambda: DigestSet.from_digests(digests, width))
+    path = workdir / "bench.digests"
+    DigestSet.write(path, sorted(digests), width, count)
+    mapped, results["digest_set_mapped"] = measure("digest_set_mapped", lambda: DigestSet.load(path))
+    # The mapped pages live in the page cache, shared and evictable, rather than on the heap
+    results["digest_set_mapped"]["file_bytes"] = path.stat().st_size
+    mapped.close()
+    return {
+        "digest_set": {"count": count, "algorithm": algorithm, "probes": probes, "seed": seed},
+        "python": platform.python_version(),
+        "results": results,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def storage_benchmark(workdir: Path, latency=0.005, objects=500, object_size=16 * KIB, large_mb=64,
+                      connections=8, part_mb=8.0, seed=1, log=print):
+    """ Seconds and requests per storage operation: one connection and one request per key vs
+    batched checks, the connection pool and parallel multipart uploads
+    """
+    rng = random.Random(seed)
+    blocks = [rng.randbytes(object_size) for _ in range(8)]
+    items = [(f"small/{i:06d}.bin", blocks[i % len(blocks)]) for i in range(objects)]
+    large = workdir / "large.bin"
+    _write_content(large, large_mb * MIB, rng, [rng.randbytes(MIB) for _ in range(4)])
+    never = Event()
+    results = {}
+
+    def measure(name, pool_size, run, part_size=part_mb * MIB, prepare=None):
+        root = workdir / name
+        store = ObjectStoreEmulator(root, pool_size, part_size, latency)
+        try:
+            if prepare:
+                prepare(store)
+                store.requests.clear()
+            started = time.perf_counter()
+            run(store)
+            seconds = time.perf_counter() - started
+        finally:
+            store.close()
+        stats = store.stats()
+        results[name] = {"seconds": round(seconds, 3), "requests": sum(stats["requests"].values())}
+        log(f"{name:<22} {seconds:>8.3f}s {results[name]['requests']:>7} requests")
+        shutil.rmtree(root, ignore_errors=True)
+
+    keys = [key for key, _ in items]
+    # Half of the keys exist
+    fill_half = lambda store: store.put_many(items[::2], never)
+    measure("exists_per_key", connections, lambda store: [store.exists(key) for key in keys], prepare=fill_half)
+    measure("exists_batched", connections, lambda store: store.exists_many(keys), prepare=fill_half)
+    measure("put_one_connection", 1, lambda store: store.put_many(items, never))
+    measure("put_pooled", connections, lambda store: store.put_many(items, never))
+    # A part size above the file sends it in one request, as a client without multipart would
+    measure("large_single_put", 1, lambda store: store.put_file("large.bin", large, never),
+            part_size=(large_mb + 1) * MIB)
+    measure("large_multipart", connections, lambda store: store.put_file("large.bin", large, never))
+    return {
+        "storage": {"latency_ms": latency * 1000, "objects": objects, "object_size": object_size,
+                    "large_mb": large_mb, "connections": connections, "part_mb": part_mb, "seed": seed},
+        "python": platform.python_version(),
+        "results": results,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark scanning, hashing, indexing and copying "
+                                                 "on a synthetic file tree.")
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--profile", choices=sorted(SIZE_PROFILES), default="mixed",
+                        help="size distribution: many tiny files, a few huge ones, or mixed")
+    parser.add_argument("--max-size-mb", type=float, help="cap individual file sizes")
+    parser.add_argument("--dup-ratio", type=float, default=0.1, help="share of files that duplicate another")
+    parser.add_argument("--depth", type=int, default=3, help="maximum folder depth of the source tree")
+    parser.add_argument("--backup-ratio", type=float, default=0.0,
+                        help="share of the source copied into the backup root beforehand")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--algorithm", choices=sorted(DIGEST_ALGORITHMS))
+    parser.add_argument("--hash-workers", type=int)
+    parser.add_argument("--copy-workers", type=int)
+    parser.add_argument("--object-store", action="store_true")
+    parser.add_argument("--workdir", type=Path, help="where to build the trees (default: a temp folder)")
+    parser.add_argument("--keep", action="store_true", help="keep the generated trees")
+    parser.add_argument("--output", type=Path, help="also write the JSON result to this file")
+    parser.add_argument("--baseline", type=Path, help="earlier JSON result to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown per phase before --baseline reports a regression")
+    parser.add_argument("--digest-set", type=int, metavar="N",
+                        help="benchmark the memory of N digests as a hex-string set vs a DigestSet instead")
+    parser.add_argument("--storage-latency", type=float, metavar="MS",
+                        help="benchmark object-store requests at this latency instead (batching, pooling, multipart)")
+    args = parser.parse_args(argv)
+
+    log = lambda text: print(text, file=sys.stderr)
+    if args.digest_set:
+        workdir = Path(tempfile.mkdtemp(prefix="smart_organizer_bench_"))
+        try:
+            result = digest_set_benchmark(workdir, args.digest_set, args.algorithm or "sha256", seed=args.seed,
+                                          log=log)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        print(json.dumps(result, indent=2))
+        return 0
+    if args.storage_latency is not None:
+        workdir = Path(tempfile.mkdtemp(prefix="smart_organizer_bench_"))
+        try:
+            result = storage_benchmark(workdir, args.storage_latency / 1000, seed=args.seed, log=log)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        print(json.dumps(result, indent=2))
+        return 0
+
+    options = BackupOptions(content_addressed=args.object_store)
+    if args.algorithm:
+        options.algorithm = args.algorithm
+    if args.hash_workers:
+        options.hash_workers = args.hash_workers
+    if args.copy_workers:
+        options.copy_workers = args.copy_workers
+    max_size = int(args.max_size_mb * MIB) if args.max_size_mb else None
+
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix="smart_organizer_bench_"))
+    if args.workdir and any(workdir.iterdir() if workdir.exists() else ()):
+        parser.error(f"--workdir {workdir} must be empty")
+    try:
+        result = run_benchmark(workdir, args.files, args.profile, args.dup_ratio, args.depth, args.backup_ratio,
+                               args.seed, max_size, options, log)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+    if args.baseline:
+        regressions = compare_to_baseline(result, json.loads(args.baseline.read_text(encoding="utf-8")),
+                                          args.tolerance, log)
+        if regressions:
+            log(f"Regression (> {args.tolerance:.0%} slower): {', '.join(regressions)}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+""" Content-defined chunking of large files, chunk manifests and restoring files from them. """
+import hashlib
+from pathlib import Path
+from threading import Event
+import contextlib
+import json
+import os
+
+from smart_organizer_digests import DEFAULT_BUFFER_SIZE, new_hasher
+from smart_organizer_storage import META_DIR_NAME, PARTIAL_SUFFIX, meta_dir
+from smart_organizer_index import INDEX_FILE_NAME, BackupIndex, object_store_path
+
+# ----------------- Chunked storage -----------------
+MANIFEST_SUFFIX = ".somanifest"
+MANIFEST_FORMAT = "smart-organizer-manifest"
+CHUNK_AVG_SIZE = 1024 * 1024
+CHUNK_MIN_SIZE = CHUNK_AVG_SIZE // 2
+CHUNK_MAX_SIZE = CHUNK_AVG_SIZE * 8
+# Rolling window hash. Every byte goes through a random table, then h ^= h << shift for each shift
+# folds the table bits of the ~70 bytes before a position into its hash byte, at varied bit offsets.
+# A hash byte mixes its whole window and nothing outside it, so an insertion only moves the cut points
+# near it. Like Buzhash it is linear over GF(2); translate() and a few big-int shifts keep the per-byte
+# work in C.
+_CUT_TABLE = hashlib.shake_256(b"smart-organizer-chunk-hash").digest(256)
+_CUT_SHIFTS = (9, 19, 37, 75, 146, 291)
+_CUT_WINDOW = sum(_CUT_SHIFTS) // 8 + 1
+
+def _window_hashes(window: bytes, block: bytes):
+    """ One hash byte per byte of block; window holds the bytes read before it """
+    buf = window + block
+    h = int.from_bytes(buf.translate(_CUT_TABLE), "little")
+    for shift in _CUT_SHIFTS:
+        h ^= h << shift
+    return h.to_bytes(len(buf) + _CUT_WINDOW, "little")[len(window):len(buf)]
+
+def _cut_rule(bits: int):
+    """ A cut needs bits zero hash bits: whole zero bytes, then the low bits of the next one """
+    return bytes(bits // 8), (1 << bits % 8) - 1
+
+def _find_cut(hashes: bytearray, lo: int, hi: int, rule):
+    """ First cut point in [lo, hi] whose hash bytes match rule, or -1 """
+    zeros, mask = rule
+    start = max(lo - 1 - len(zeros), 0)
+    while True:
+        start = hashes.find(zeros, start, hi - 1)
+        if start < 0:
+            return -1
+        last = start + len(zeros)
+        if not hashes[last] & mask:
+            return last + 1
+        start += 1
+
+def iter_chunks(path: Path, stop_event: Event, buffer_size=DEFAULT_BUFFER_SIZE, throttle=None,
+                min_size=CHUNK_MIN_SIZE, avg_size=CHUNK_AVG_SIZE, max_size=CHUNK_MAX_SIZE):
+    """ Yields the content-defined chunks of a file as bytes; stops early once stop_event is set.
+    Cuts use normalized chunking as in FastCDC: a stricter rule up to avg_size and a looser one after
+    it, so chunk sizes bunch around avg_size and max_size is rarely hit.
+    """
+    bits = (avg_size - min_size).bit_length() - 1
+    strict, loose = _cut_rule(bits + 2), _cut_rule(bits - 2)
+    data, hashes = bytearray(), bytearray()
+    window = b""
+    searched = 0
+    with open(path, "rb") as fh:
+        while not stop_event.is_set():
+            block = fh.read(throttle.chunk_size(buffer_size) if throttle else buffer_size)
+            if throttle and block and not throttle.read(len(block), stop_event):
+                return
+            data += block
+            hashes += _window_hashes(window, block)
+            window = (window + block)[-_CUT_WINDOW:]
+            while len(data) >= min_size:
+                lo, hi = max(searched, min_size), min(len(data), max_size)
+                cut = _find_cut(hashes, lo, min(hi, avg_size), strict)
+                if cut < 0:
+                    cut = _find_cut(hashes, max(lo, avg_size + 1), hi, loose)
+                if cut < 0:
+                    if len(data) < max_size:
+                        searched = hi + 1
+                        break
+                    cut = max_size
+                yield bytes(data[:cut])
+                del data[:cut], hashes[:cut]
+                searched = 0
+            if not block:
+                if data:
+                    yield bytes(data)
+                return
+
+CHUNK_BATCH_BYTES = 32 * 1024 * 1024  # chunk data held for one batched lookup and upload
+
+def store_chunks(index: BackupIndex, batch, stop_event: Event, throttle=None):
+    """ Puts a batch of (digest, bytes) chunks into the index's object store, skipping those already there.
+    One batched existence check covers the whole batch and the new chunks are uploaded side by side,
+    so a remote store costs a few requests per batch rather than one round trip per chunk.
+    Returns the set of digests written, or None if stopped.
+    """
+    present = index.objects_present({digest for digest, _ in batch})
+    new = {}
+    for digest, data in batch:
+        if digest not in present:
+            new.setdefault(digest, data)
+    keys = {index.object_key(digest): digest for digest in new}
+    written = index.storage.put_many([(key, new[digest]) for key, digest in keys.items()], stop_event, throttle,
+                                     exclusive=True)
+    if stop_event.is_set():
+        return None
+    for key in written:
+        digest = keys[key]
+        if index.storage.local and os.name == "posix":
+            index.object_path(digest).chmod(0o444)
+        index.record_object(digest, len(new[digest]))
+    return {keys[key] for key in written}
+
+def manifest_bytes(manifest: dict):
+    return json.dumps(manifest, separators=(",", ":")).encode("utf-8")
+
+def read_manifest(path: Path):
+    """ Loads a chunk manifest; raises ValueError if the file is not one """
+    try:
+        manifest = json.loads(Path(path).read_text(encoding="utf-8"))
+    except (UnicodeDecodeError, ValueError):
+        manifest = None
+    if not isinstance(manifest, dict) or manifest.get("format") != MANIFEST_FORMAT:
+        raise ValueError(f"Not a chunk manifest: {path}")
+    return manifest
+
+def find_backup_root(path: Path):
+    """ The backup root holding a file: the nearest parent with an organizer index """
+    for parent in Path(path).resolve().parents:
+        if (meta_dir(parent) / INDEX_FILE_NAME).exists():
+            return parent
+    raise ValueError(f"{path} is not inside a backup folder.")
+
+def restore_manifest(manifest_path: Path, dst: Path, stop_event: Event, throttle=None):
+    """ Reassembles a chunked file from its manifest and checks it against the whole-file digest.
+    Returns False if stopped; raises ValueError if a chunk is missing or the result does not match.
+    """
+    manifest = read_manifest(manifest_path)
+    root = find_backup_root(manifest_path)
+    algorithm = manifest["algorithm"]
+    h = new_hasher(algorithm)
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(dst.name + PARTIAL_SUFFIX)
+    try:
+        with open(tmp, "wb") as out:
+            for digest, size in manifest["chunks"]:
+                try:
+                    data = object_store_path(root, algorithm, digest).read_bytes()
+                except FileNotFoundError:
+                    raise ValueError(f"Chunk {digest} is missing from the object store.") from None
+                if len(data) != size:
+                    raise ValueError(f"Chunk {digest} is truncated.")
+                if stop_event.is_set() or (throttle and not throttle.write(size, stop_event)):
+                    break
+                h.update(data)
+                out.write(data)
+        if stop_event.is_set():
+            tmp.unlink()
+            return False
+        if h.hexdigest() != manifest["digest"]:
+            raise ValueError(f"Restored data of {manifest_path.name} does not match its digest.")
+        os.replace(tmp, dst)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            tmp.unlink()
+        raise
+    os.utime(dst, ns=(manifest["mtime_ns"], manifest["mtime_ns"]))
+    return True
+
+def _restored_name(manifest_path: Path):
+    name = manifest_path.name
+    return name[:-len(MANIFEST_SUFFIX)] if name.endswith(MANIFEST_SUFFIX) else name
+
+def restore_chunked(path: Path, target: Path, log_callback, stop_event: Event = None):
+    """ Restores one manifest, or every manifest below a backup folder keeping its layout, into target.
+    Returns (restored, failed).
+    """
+    stop_event = stop_event or Event()
+    path = Path(path)
+    if path.is_dir():
+        manifests = sorted(m for m in path.rglob(f"*{MANIFEST_SUFFIX}")
+                           if META_DIR_NAME not in m.relative_to(path).parts)
+        jobs = [(m, target / m.relative_to(path).parent / _restored_name(m)) for m in manifests]
+    else:
+        jobs = [(path, target / _restored_name(path))]
+    restored = failed = 0
+    for manifest, dst in jobs:
+        try:
+            if not restore_manifest(manifest, dst, stop_event):
+                log_callback("Restore stopped.")
+                break
+            restored += 1
+            log_callback(f"Restored {manifest.name} -> {dst}")
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            failed += 1
+            log_callback(f"Error restoring {manifest}: {e}")
+    log_callback(f"Restore complete. {restored} file(s) restored, {failed} failed.")
+    return restored, failed
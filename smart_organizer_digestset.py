@@ -0,0 +1,182 @@
+""" Compact, memory-mappable set of raw digests, used to rule out object-store lookups. """
+import mmap
+from pathlib import Path
+import bisect
+import contextlib
+import struct
+import os
+import sys
+
+from smart_organizer_digests import new_hasher
+from smart_organizer_storage import PARTIAL_SUFFIX
+
+# ----------------- Digest set -----------------
+DIGEST_SET_MAGIC = b"SODIGST1"
+# magic, digest width in bytes, Bloom hash count, digest count, Bloom filter bytes
+DIGEST_SET_HEADER = struct.Struct("<8sHHQQ")
+DIGEST_SET_BLOOM_BITS = 10  # bits per digest: about 1% false positives with 7 hashes
+DIGEST_SET_BLOOM_HASHES = 7
+
+def digest_width(algorithm: str):
+    """ Raw digest size in bytes of a hashing algorithm """
+    return new_hasher(algorithm).digest_size
+
+class _DigestRecords:
+    """ Read-only sequence view of fixed-width records, so bisect can search the packed buffer """
+    __slots__ = ("data", "width", "count")
+
+    def __init__(self, data, width: int, count: int):
+        self.data = data
+        self.width = width
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        start = i * self.width
+        return bytes(self.data[start:start + self.width])
+
+class DigestSet:
+    """ Compact membership set of raw digests: one sorted, packed array searched by bisection,
+    with an optional Bloom filter in front so most misses never touch the array.
+
+    A set of hex strings costs well over 100 bytes per digest; this costs the raw digest width
+    plus about 1.25 bytes of filter. Saved sets are memory-mapped by load(), so the array lives
+    in the page cache instead of the heap. Digests added after building go to a small overlay.
+    """
+    def __init__(self, width: int, data=b"", count=0, bloom=None, hashes=0, mapping=None, handle=None):
+        self.width = width
+        self._records = _DigestRecords(data, width, count)
+        self._bloom = bloom
+        self._bloom_bits = len(bloom) * 8 if bloom else 0
+        self._hashes = hashes
+        self._mapping = mapping
+        self._handle = handle
+        self._added = set()
+
+    @classmethod
+    def from_digests(cls, digests, width: int, bloom_bits=DIGEST_SET_BLOOM_BITS):
+        """ Builds an in-memory set from hex digests in any order """
+        raw = sorted({bytes.fromhex(d) for d in digests})
+        bloom, hashes = _new_bloom(len(raw), bloom_bits)
+        for d in raw:
+            _bloom_add(bloom, hashes, d)
+        return cls(width, b"".join(raw), len(raw), bloom, hashes)
+
+    @staticmethod
+    def write(path: Path, digests, width: int, count_hint=0, bloom_bits=DIGEST_SET_BLOOM_BITS):
+        """ Streams hex digests in ascending order into a set file; only the Bloom filter is held in memory.
+        count_hint sizes the filter. Returns the number of digests written.
+        """
+        bloom, hashes = _new_bloom(count_hint, bloom_bits)
+        tmp = path.with_name(path.name + PARTIAL_SUFFIX)
+        count = 0
+        previous = b""
+        try:
+            with open(tmp, "wb") as out:
+                out.write(DIGEST_SET_HEADER.pack(DIGEST_SET_MAGIC, width, hashes, 0, len(bloom)))
+                for d in digests:
+                    raw = bytes.fromhex(d)
+                    if len(raw) != width:
+                        raise ValueError(f"Digest of {len(raw)} bytes in a {width}-byte set")
+                    if raw <= previous:
+                        if raw == previous:
+                            continue
+                        raise ValueError("Digests must be written in ascending order")
+                    out.write(raw)
+                    if bloom:
+                        _bloom_add(bloom, hashes, raw)
+                    previous = raw
+                    count += 1
+                out.write(bloom)
+                out.seek(0)
+                out.write(DIGEST_SET_HEADER.pack(DIGEST_SET_MAGIC, width, hashes, count, len(bloom)))
+            os.replace(tmp, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                tmp.unlink()
+            raise
+        return count
+
+    @classmethod
+    def load(cls, path: Path):
+        """ Memory-maps a set file written by write(). Raises ValueError if it is damaged. """
+        handle = open(path, "rb")
+        try:
+            mapping = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            handle.close()
+            raise ValueError(f"Empty or unreadable digest set: {path}") from None
+        try:
+            magic, width, hashes, count, bloom_size = DIGEST_SET_HEADER.unpack_from(mapping)
+            start = DIGEST_SET_HEADER.size
+            end = start + width * count
+            if magic != DIGEST_SET_MAGIC or not width or len(mapping) != end + bloom_size:
+                raise ValueError(f"Not a digest set or truncated: {path}")
+        except (struct.error, ValueError):
+            mapping.close()
+            handle.close()
+            raise ValueError(f"Not a digest set or truncated: {path}") from None
+        view = memoryview(mapping)
+        bloom = view[end:] if bloom_size else None
+        return cls(width, view[start:end], count, bloom, hashes, mapping, handle)
+
+    def close(self):
+        """ Releases the memory mapping of a loaded set """
+        if self._mapping is not None:
+            self._records.data.release()
+            if self._bloom is not None:
+                self._bloom.release()
+            self._records = _DigestRecords(b"", self.width, 0)
+            self._bloom = None
+            self._mapping.close()
+            self._handle.close()
+            self._mapping = self._handle = None
+
+    def _raw(self, digest):
+        return bytes.fromhex(digest) if isinstance(digest, str) else bytes(digest)
+
+    def add(self, digest):
+        raw = self._raw(digest)
+        if raw not in self:
+            self._added.add(raw)
+
+    def __contains__(self, digest):
+        raw = self._raw(digest)
+        if len(raw) != self.width:
+            return False
+        if raw in self._added:
+            return True
+        if self._bloom is not None and not _bloom_check(self._bloom, self._bloom_bits, self._hashes, raw):
+            return False
+        records = self._records
+        i = bisect.bisect_left(records, raw)
+        return i < len(records) and records[i] == raw
+
+    def __len__(self):
+        return len(self._records) + len(self._added)
+
+    def nbytes(self):
+        """ Bytes held by the packed array, the filter and the overlay (mapped pages included) """
+        return (len(self._records) * self.width + self._bloom_bits // 8
+                + sys.getsizeof(self._added) + len(self._added) * sys.getsizeof(b"\0" * self.width))
+
+def _new_bloom(count: int, bits_per_digest: int):
+    if count <= 0 or bits_per_digest <= 0:
+        return bytearray(), 0
+    size = max(64, (count * bits_per_digest + 7) // 8)
+    return bytearray(size), DIGEST_SET_BLOOM_HASHES
+
+def _bloom_positions(raw: bytes, nbits: int, hashes: int):
+    # Digests are uniformly distributed already: two 64-bit words drive double hashing
+    h1 = int.from_bytes(raw[:8], "little")
+    h2 = int.from_bytes(raw[8:16], "little") | 1
+    return ((h1 + i * h2) % nbits for i in range(hashes))
+
+def _bloom_add(bloom: bytearray, hashes: int, raw: bytes):
+    for pos in _bloom_positions(raw, len(bloom) * 8, hashes):
+        bloom[pos >> 3] |= 1 << (pos & 7)
+
+def _bloom_check(bloom, nbits: int, hashes: int, raw: bytes):
+    return all(bloom[pos >> 3] & (1 << (pos & 7)) for pos in _bloom_positions(raw, nbits, hashes))
@@ -0,0 +1,627 @@
+""" Desktop front end for Smart File Organizer Pro v5.
+
+Imported only when the GUI is launched, so the headless CLI never loads customtkinter, pystray or PIL.
+"""
+import queue
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from threading import Thread, Event, Lock
+
+import customtkinter as ctk
+from tkinter import filedialog, messagebox
+
+# --- Imports for Tray Icon & EXE ---
+import pystray
+from PIL import Image, ImageDraw, ImageFont
+# -----------------------------------
+
+from smart_file_organizer_pro_v5 import (
+    LOG_PREVIEW_MAX_LINES, LOG_VIEW_MAX_LINES, WATCH_SCHEDULE_MODE, BackupOptions, Throttle, default_copy_workers,
+    default_hash_workers, format_duration, parse_glob_list, resource_path, run_backup_once, run_schedule,
+    setup_file_logging,
+)
+from smart_organizer_digests import DEFAULT_DIGEST_ALGORITHM, DIGEST_ALGORITHMS
+
+ctk.set_appearance_mode("Dark")
+ctk.set_default_color_theme("blue")
+
+# Long enough for a stopped run to finish its in-flight files and write its resume checkpoint
+QUIT_JOIN_TIMEOUT = 10
+
+# ----------------- GUI Application -----------------
+class SmartOrganizerApp(ctk.CTk):
+    def __init__(self):
+# ... existing code ...
+        super().__init__()
+        self.title("Smart File Organizer Pro v5 (EXE-Ready)")
+        self.geometry("900x600")
+        
+        # --- MODIFIED: Bind close button ("X") to hide_to_tray ---
+        self.protocol("WM_DELETE_WINDOW", self.hide_to_tray)
+
+        # state
+# ... existing code ...
+        self.auto_thread = None
+        self.manual_thread = None
+        self.stop_event = Event()
+        # Shared by whichever run is active, so Apply retunes it without a restart
+        self.throttle = Throttle()
+        self.is_running_auto = False
+        self.is_running_manual = False
+
+        # --- NEW: Tray icon state ---
+# ... existing code ...
+        self.tray_icon = None
+        self.tray_thread = None
+        # ----------------------------
+
+        self.gui_queue = queue.Queue()
+        # Worker threads only append here; the UI applies one batch per tick
+        self.log_view_limit = LOG_VIEW_MAX_LINES
+        self._gui_batch_lock = Lock()
+        self._pending_logs = deque(maxlen=self.log_view_limit)
+        self._latest_progress = None
+        self._view_line_counts = {}
+        self.file_logger = setup_file_logging()
+# ... existing code ...
+        self.after(100, self.process_gui_queue)
+
+        self.grid_columnconfigure(1, weight=1)
+# ... existing code ...
+        self.grid_rowconfigure(0, weight=1)
+
+        self.sidebar = ctk.CTkFrame(self, width=180)
+# ... existing code ...
+        self.sidebar.grid(row=0, column=0, sticky="nswe", padx=(10, 5), pady=10)
+        self.main = ctk.CTkFrame(self)
+        self.main.grid(row=0, column=1, sticky="nswe", padx=(5, 10), pady=10)
+
+        ctk.CTkLabel(self.sidebar, text="Smart Organizer", font=ctk.CTkFont(size=18, weight="bold")).pack(pady=(10,20))
+# ... existing code ...
+        self.btn_organizer = ctk.CTkButton(self.sidebar, text="Manual Backup", command=lambda: self.show_frame("organizer"))
+        self.btn_auto = ctk.CTkButton(self.sidebar, text="Automation", command=lambda: self.show_frame("auto"))
+        self.btn_logs = ctk.CTkButton(self.sidebar, text="Logs", command=lambda: self.show_frame("logs"))
+        for b in (self.btn_organizer, self.btn_auto, self.btn_logs):
+            b.pack(fill="x", padx=12, pady=6)
+        self.status_label = ctk.CTkLabel(self.sidebar, text="Status: Idle", anchor="w", font=ctk.CTkFont(size=12))
+# ... existing code ...
+        self.status_label.pack(side="bottom", fill="x", padx=12, pady=(10,10))
+
+        self.frames = {}
+# ... existing code ...
+        self._create_organizer_frame()
+        self._create_auto_frame()
+        self._create_logs_frame()
+
+        self.show_frame("organizer")
+
+        # --- NEW: Setup and start the tray icon ---
+# ... existing code ...
+        self.setup_tray_icon()
+        # ------------------------------------------
+
+    # ---------- Thread-safe GUI updates (Unchanged) ----------
+    def process_gui_queue(self):
+# ... existing code ...
+        with self._gui_batch_lock:
+            lines = list(self._pending_logs)
+            self._pending_logs.clear()
+            progress, self._latest_progress = self._latest_progress, None
+        if lines:
+            self._log_batch_task(lines)
+        if progress:
+            self._progress_update_task(*progress)
+        while not self.gui_queue.empty():
+            try:
+                task, args = self.gui_queue.get_nowait()
+                task(*args)
+            except queue.Empty:
+                pass
+            except Exception as e:
+                print(f"Error processing GUI queue: {e}")
+        self.after(100, self.process_gui_queue)
+
+    def safe_log(self, text: str):
+# ... existing code ...
+        ts = datetime.now().strftime("%H:%M:%S")
+        self.file_logger.info(text)
+        with self._gui_batch_lock:
+            self._pending_logs.append(f"[{ts}] {text}\n")
+
+    def safe_progress_update(self, percent, filename, stats=None):
+# ... existing code ...
+        # Only the latest value matters; intermediate updates between two ticks are dropped
+        with self._gui_batch_lock:
+            self._latest_progress = (percent, filename, stats)
+
+    def safe_set_running_state(self, manual, auto):
+# ... existing code ...
+        self.gui_queue.put((self._set_running_state_task, (manual, auto)))
+
+    # ---------- GUI Task Implementations (Unchanged) ----------
+    def _log_batch_task(self, lines):
+# ... existing code ...
+        try:
+            self._append_capped(self.log_preview, lines, LOG_PREVIEW_MAX_LINES)
+            self._append_capped(self.full_log, lines, self.log_view_limit)
+        except Exception as e:
+            print(f"Error updating log textbox: {e}")
+
+    def _append_capped(self, widget, lines, limit: int):
+        """ One insert per batch, then trims the oldest lines so the widget acts as a ring buffer """
+        lines = lines[-limit:]
+        widget.insert("end", "".join(lines))
+        count = self._view_line_counts.get(widget, 0) + sum(line.count("\n") for line in lines)
+        if count > limit:
+            widget.delete("1.0", f"{count - limit + 1}.0")
+            count = limit
+        self._view_line_counts[widget] = count
+        widget.see("end")
+
+    def _progress_update_task(self, percent, filename, stats=None):
+# ... existing code ...
+        try:
+            self.progress.set(percent / 100.0)
+            if percent == 100 or not filename:
+                self.live_label.configure(text="Idle")
+                self._set_tray_title("Smart Organizer")
+            else:
+                # stats (ProgressSnapshot): bytes done/total, moving-average MB/s and ETA
+                detail = f" - {stats.describe()}" if stats else ""
+                self.live_label.configure(text=f"Processing: {filename} ({percent}%){detail}")
+                eta = f", ETA {format_duration(stats.eta_seconds)}" if stats and stats.eta_seconds is not None else ""
+                rate = f", {stats.mb_per_s:.1f} MB/s" if stats else ""
+                self._set_tray_title(f"Smart Organizer - {percent}%{rate}{eta}")
+        except Exception as e:
+            print(f"Error updating progress: {e}")
+
+    def _set_tray_title(self, title):
+        """ Tray tooltip; only touched when the text changes """
+        if self.tray_icon and self.tray_icon.title != title:
+            self.tray_icon.title = title
+    
+    def _set_running_state_task(self, manual, auto):
+# ... existing code ...
+        self.is_running_manual = manual
+        self.is_running_auto = auto
+        is_running = manual or auto
+        if auto:
+            self.status_label.configure(text="Status: Schedule ON", text_color="green")
+        elif manual:
+            self.status_label.configure(text="Status: Backup Running...", text_color="orange")
+        else:
+            self.status_label.configure(text="Status: Idle", text_color="gray")
+        self.btn_run_once.configure(text="Run Backup Now" if not manual else "Stop Backup",
+                                    fg_color="#1f6feb" if not manual else "red",
+                                    state="normal" if not auto else "disabled")
+        self.btn_browse_source.configure(state="disabled" if is_running else "normal")
+        self.btn_browse_backup.configure(state="disabled" if is_running else "normal")
+        self.btn_start_auto.configure(state="disabled" if is_running else "normal")
+        self.btn_stop_auto.configure(state="normal" if auto else "disabled")
+        self.schedule_combo.configure(state="disabled" if is_running else "normal")
+        self.hour_combo.configure(state="disabled" if is_running else "normal")
+        self.hash_workers_combo.configure(state="disabled" if is_running else "normal")
+        self.copy_workers_combo.configure(state="disabled" if is_running else "normal")
+        self.algorithm_combo.configure(state="disabled" if is_running else "normal")
+        for widget in (self.include_entry, self.exclude_entry, self.depth_combo, self.journal_check, self.cas_check,
+                       self.low_priority_check):
+            widget.configure(state="disabled" if is_running else "normal")
+
+
+    # ---------- Frames (Unchanged) ----------
+    def _create_organizer_frame(self):
+# ... existing code ...
+        frm = ctk.CTkFrame(self.main)
+        frm.grid_columnconfigure(1, weight=1)
+        self.frames["organizer"] = frm
+        ctk.CTkLabel(frm, text="Manual Backup", font=ctk.CTkFont(size=16, weight="bold")).grid(row=0, column=0, columnspan=3, pady=8)
+        ctk.CTkLabel(frm, text="Source Folder:").grid(row=1, column=0, sticky="w", padx=12)
+        self.source_var = ctk.StringVar()
+        self.source_entry = ctk.CTkEntry(frm, textvariable=self.source_var)
+        self.source_entry.grid(row=1, column=1, sticky="ew", padx=6, pady=6)
+        self.btn_browse_source = ctk.CTkButton(frm, text="Browse", width=80, command=self.browse_source)
+        self.btn_browse_source.grid(row=1, column=2, padx=(0, 12), pady=6)
+        ctk.CTkLabel(frm, text="Backup Folder:").grid(row=2, column=0, sticky="w", padx=12)
+        self.backup_var = ctk.StringVar()
+        self.backup_entry = ctk.CTkEntry(frm, textvariable=self.backup_var)
+        self.backup_entry.grid(row=2, column=1, sticky="ew", padx=6, pady=6)
+        self.btn_browse_backup = ctk.CTkButton(frm, text="Browse", width=80, command=self.browse_backup)
+        self.btn_browse_backup.grid(row=2, column=2, padx=(0, 12), pady=6)
+        filter_row = ctk.CTkFrame(frm, fg_color="transparent")
+        filter_row.grid(row=3, column=0, columnspan=3, sticky="ew", padx=12)
+        filter_row.grid_columnconfigure((1, 3), weight=1)
+        ctk.CTkLabel(filter_row, text="Include:").grid(row=0, column=0, sticky="w")
+        self.include_var = ctk.StringVar()
+        self.include_entry = ctk.CTkEntry(filter_row, textvariable=self.include_var, placeholder_text="*.jpg, *.pdf")
+        self.include_entry.grid(row=0, column=1, sticky="ew", padx=6)
+        ctk.CTkLabel(filter_row, text="Exclude:").grid(row=0, column=2, sticky="w")
+        self.exclude_var = ctk.StringVar()
+        self.exclude_entry = ctk.CTkEntry(filter_row, textvariable=self.exclude_var, placeholder_text="*.tmp, node_modules")
+        self.exclude_entry.grid(row=0, column=3, sticky="ew", padx=6)
+        ctk.CTkLabel(filter_row, text="Depth:").grid(row=0, column=4, sticky="w")
+        self.depth_var = ctk.StringVar(value="Unlimited")
+        self.depth_combo = ctk.CTkComboBox(filter_row, variable=self.depth_var, width=110,
+                                           values=["Unlimited"] + [str(d) for d in range(11)])
+        self.depth_combo.grid(row=0, column=5, padx=6)
+        self.journal_var = ctk.BooleanVar(value=True)
+        self.journal_check = ctk.CTkCheckBox(filter_row, text="Skip unchanged", variable=self.journal_var)
+        self.journal_check.grid(row=0, column=6, padx=6)
+        limit_row = ctk.CTkFrame(frm, fg_color="transparent")
+        limit_row.grid(row=4, column=0, columnspan=3, sticky="ew", padx=12, pady=(6, 0))
+        ctk.CTkLabel(limit_row, text="Limits (0 = none)  Read MB/s:").pack(side="left")
+        self.read_limit_var = ctk.StringVar(value="0")
+        ctk.CTkEntry(limit_row, textvariable=self.read_limit_var, width=60).pack(side="left", padx=6)
+        ctk.CTkLabel(limit_row, text="Write MB/s:").pack(side="left")
+        self.write_limit_var = ctk.StringVar(value="0")
+        ctk.CTkEntry(limit_row, textvariable=self.write_limit_var, width=60).pack(side="left", padx=6)
+        ctk.CTkLabel(limit_row, text="Files/s:").pack(side="left")
+        self.files_limit_var = ctk.StringVar(value="0")
+        ctk.CTkEntry(limit_row, textvariable=self.files_limit_var, width=60).pack(side="left", padx=6)
+        self.btn_apply_limits = ctk.CTkButton(limit_row, text="Apply", width=70, command=self.apply_limits)
+        self.btn_apply_limits.pack(side="left", padx=6)
+        self.low_priority_var = ctk.BooleanVar(value=False)
+        self.low_priority_check = ctk.CTkCheckBox(limit_row, text="Low priority", variable=self.low_priority_var)
+        self.low_priority_check.pack(side="left", padx=6)
+        action_row = ctk.CTkFrame(frm)
+        action_row.grid(row=5, column=0, columnspan=3, sticky="ew", padx=12, pady=10)
+        self.btn_run_once = ctk.CTkButton(action_row, text="Run Backup Now", command=self.toggle_manual_backup, fg_color="#1f6feb")
+        self.btn_run_once.pack(side="left", padx=6)
+        self.btn_clear_log = ctk.CTkButton(action_row, text="Clear Log", command=self.clear_log)
+        self.btn_clear_log.pack(side="left", padx=6)
+        self.cas_var = ctk.BooleanVar(value=False)
+        self.cas_check = ctk.CTkCheckBox(action_row, text="Object store", variable=self.cas_var)
+        self.cas_check.pack(side="left", padx=6)
+        worker_values = [str(n) for n in range(1, 33)]
+        self.copy_workers_var = ctk.StringVar(value=str(default_copy_workers()))
+        self.copy_workers_combo = ctk.CTkComboBox(action_row, variable=self.copy_workers_var, width=70, values=worker_values)
+        self.copy_workers_combo.pack(side="right", padx=6)
+        ctk.CTkLabel(action_row, text="Copy workers:").pack(side="right")
+        self.hash_workers_var = ctk.StringVar(value=str(default_hash_workers()))
+        self.hash_workers_combo = ctk.CTkComboBox(action_row, variable=self.hash_workers_var, width=70, values=worker_values)
+        self.hash_workers_combo.pack(side="right", padx=6)
+        ctk.CTkLabel(action_row, text="Hash workers:").pack(side="right")
+        self.algorithm_var = ctk.StringVar(value=DEFAULT_DIGEST_ALGORITHM)
+        self.algorithm_combo = ctk.CTkComboBox(action_row, variable=self.algorithm_var, width=100, values=list(DIGEST_ALGORITHMS))
+        self.algorithm_combo.pack(side="right", padx=6)
+        ctk.CTkLabel(action_row, text="Digest:").pack(side="right")
+        self.progress = ctk.CTkProgressBar(frm)
+        self.progress.set(0)
+        self.progress.grid(row=6, column=0, columnspan=3, sticky="ew", padx=12, pady=(10, 2))
+        self.live_label = ctk.CTkLabel(frm, text="Idle", anchor="w")
+        self.live_label.grid(row=7, column=0, columnspan=3, sticky="ew", padx=12)
+        ctk.CTkLabel(frm, text="Recent Log:").grid(row=8, column=0, columnspan=3, sticky="w", padx=20, pady=(20,0))
+        self.log_preview = ctk.CTkTextbox(frm, height=150)
+        self.log_preview.grid(row=9, column=0, columnspan=3, sticky="nswe", padx=12, pady=6)
+        frm.grid_rowconfigure(9, weight=1)
+
+    def _create_auto_frame(self):
+# ... existing code ...
+        frm = ctk.CTkFrame(self.main)
+        self.frames["auto"] = frm
+        frm.grid_columnconfigure(0, weight=1)
+        ctk.CTkLabel(frm, text="Automation / Scheduled Backup", font=ctk.CTkFont(size=16, weight="bold")).pack(pady=8)
+        ctk.CTkLabel(frm, text="Set a schedule to run the backup automatically.").pack(pady=(0,10), padx=12)
+        info_frame = ctk.CTkFrame(frm, fg_color="transparent")
+        info_frame.pack(fill="x", padx=12, pady=10)
+        info_frame.grid_columnconfigure(1, weight=1)
+        ctk.CTkLabel(info_frame, text="Source:").grid(row=0, column=0, sticky="w")
+        self.auto_src_label = ctk.CTkLabel(info_frame, text="(not set)", anchor="w", fg_color="gray10", corner_radius=5)
+        self.auto_src_label.grid(row=0, column=1, sticky="ew", padx=5)
+        ctk.CTkLabel(info_frame, text="Backup:").grid(row=1, column=0, sticky="w", pady=(8,0))
+        self.auto_bkp_label = ctk.CTkLabel(info_frame, text="(not set)", anchor="w", fg_color="gray10", corner_radius=5)
+        self.auto_bkp_label.grid(row=1, column=1, sticky="ew", padx=5, pady=(8,0))
+        schedule_frame = ctk.CTkFrame(frm)
+        schedule_frame.pack(fill="x", padx=12, pady=10)
+        ctk.CTkLabel(schedule_frame, text="Schedule:").grid(row=0, column=0, padx=5, pady=10)
+        self.schedule_var = ctk.StringVar(value="Disabled")
+        self.schedule_combo = ctk.CTkComboBox(
+            schedule_frame,
+            variable=self.schedule_var,
+            values=["Disabled", "Run every hour", "Run every day at...", WATCH_SCHEDULE_MODE],
+            command=self.on_schedule_change
+        )
+        self.schedule_combo.grid(row=0, column=1, padx=5, pady=10)
+        self.hour_label = ctk.CTkLabel(schedule_frame, text="Hour (0-23):")
+        self.hour_label.grid(row=0, column=2, padx=(10, 5), pady=10)
+        self.hour_var = ctk.StringVar(value="8")
+        self.hour_combo = ctk.CTkComboBox(
+            schedule_frame,
+            variable=self.hour_var,
+            width=70,
+            values=[str(h) for h in range(24)]
+        )
+        self.hour_combo.grid(row=0, column=3, padx=5, pady=10)
+        btn_row = ctk.CTkFrame(frm)
+        btn_row.pack(pady=20)
+        self.btn_start_auto = ctk.CTkButton(btn_row, text="Start Schedule", command=self.start_auto_backup, fg_color="green")
+        self.btn_stop_auto = ctk.CTkButton(btn_row, text="Stop Schedule", command=self.stop_auto_backup, fg_color="red", state="disabled")
+        self.btn_start_auto.grid(row=0, column=0, padx=6)
+        self.btn_stop_auto.grid(row=0, column=1, padx=6)
+        self.on_schedule_change(self.schedule_var.get())
+
+    def on_schedule_change(self, choice):
+# ... existing code ...
+        if choice == "Run every day at...":
+            self.hour_label.grid()
+            self.hour_combo.grid()
+        else:
+            self.hour_label.grid_remove()
+            self.hour_combo.grid_remove()
+
+    def _create_logs_frame(self):
+# ... existing code ...
+        frm = ctk.CTkFrame(self.main)
+        frm.grid_rowconfigure(1, weight=1)
+        frm.grid_columnconfigure(0, weight=1)
+        self.frames["logs"] = frm
+        header = ctk.CTkFrame(frm, fg_color="transparent")
+        header.grid(row=0, column=0, sticky="ew", padx=12)
+        header.grid_columnconfigure(0, weight=1)
+        ctk.CTkLabel(header, text="Full Activity Log", font=ctk.CTkFont(size=16, weight="bold")).grid(row=0, column=0, pady=8)
+        ctk.CTkLabel(header, text="Keep lines:").grid(row=0, column=1, padx=(10, 5))
+        self.log_limit_var = ctk.StringVar(value=str(self.log_view_limit))
+        ctk.CTkComboBox(header, variable=self.log_limit_var, width=100, values=["1000", "5000", "20000", "100000"],
+                        command=self.on_log_limit_change).grid(row=0, column=2)
+        ctk.CTkLabel(frm, text=f"Full history: {self.file_logger.log_path}", anchor="w",
+                     text_color="gray").grid(row=2, column=0, sticky="ew", padx=12, pady=(0, 6))
+        self.full_log = ctk.CTkTextbox(frm)
+        self.full_log.grid(row=1, column=0, sticky="nswe", padx=12, pady=6)
+
+    # ---------- Actions (Most are unchanged) ----------
+    def show_frame(self, name):
+# ... existing code ...
+        for f in self.frames.values():
+            f.grid_remove()
+        self.frames[name].grid(row=0, column=0, sticky="nswe")
+        if name == "auto":
+            self.auto_src_label.configure(text=self.source_var.get() or "(not set)")
+            self.auto_bkp_label.configure(text=self.backup_var.get() or "(not set)")
+
+    def validate_paths(self):
+# ... existing code ...
+        src_s = self.source_var.get()
+        bkp_s = self.backup_var.get()
+        if not src_s or not bkp_s:
+            messagebox.showwarning("Missing folder", "Please set both source and backup folders.")
+            return None, None
+        src = Path(src_s)
+        bkp = Path(bkp_s)
+        if not src.exists() or not src.is_dir():
+            messagebox.showwarning("Invalid Source", f"Source folder does not exist or is not a directory:\n{src}")
+            return None, None
+        if not bkp.exists():
+            try:
+                bkp.mkdir(parents=True, exist_ok=True)
+                self.safe_log(f"Created backup directory: {bkp}")
+            except Exception as e:
+                messagebox.showerror("Invalid Backup", f"Could not create backup folder:\n{bkp}\nError: {e}")
+                return None, None
+        if not bkp.is_dir():
+             messagebox.showwarning("Invalid Backup", f"Backup path is not a directory:\n{bkp}")
+             return None, None
+        if src.resolve() == bkp.resolve():
+            messagebox.showerror("Dangerous Operation", "Source and Backup folders cannot be the same!")
+            return None, None
+        if bkp.resolve() in src.resolve().parents:
+            messagebox.showerror("Dangerous Operation", "Cannot set backup folder to be inside the source folder!")
+            return None, None
+        return src, bkp
+
+    def get_backup_options(self):
+        """ Builds BackupOptions from the worker-count fields, falling back to the defaults """
+        options = BackupOptions()
+        try:
+            options.hash_workers = max(1, int(self.hash_workers_var.get()))
+        except ValueError:
+            pass
+        try:
+            options.copy_workers = max(1, int(self.copy_workers_var.get()))
+        except ValueError:
+            pass
+        if self.algorithm_var.get() in DIGEST_ALGORITHMS:
+            options.algorithm = self.algorithm_var.get()
+        options.include = parse_glob_list(self.include_var.get())
+        options.exclude = parse_glob_list(self.exclude_var.get())
+        try:
+            options.max_depth = max(0, int(self.depth_var.get()))
+        except ValueError:
+            options.max_depth = None
+        options.use_journal = bool(self.journal_var.get())
+        options.content_addressed = bool(self.cas_var.get())
+        options.read_limit_mb, options.write_limit_mb, options.files_per_second = self.get_limits()
+        if self.low_priority_var.get():
+            options.io_class, options.nice = "idle", 10
+        return options
+
+    def get_limits(self):
+        """ Read MB/s, write MB/s and files/s from the limit fields; blank or invalid means unlimited """
+        limits = []
+        for var in (self.read_limit_var, self.write_limit_var, self.files_limit_var):
+            try:
+                limits.append(max(0.0, float(var.get() or 0)))
+            except ValueError:
+                limits.append(0.0)
+        return limits
+
+    def apply_limits(self):
+        """ Takes effect immediately, also for a backup that is already running """
+        self.throttle.set_limits(*self.get_limits())
+        self.safe_log(f"Limits set: {self.throttle.describe()}.")
+
+    def browse_source(self):
+# ... existing code ...
+        p = filedialog.askdirectory()
+        if p:
+            self.source_var.set(p)
+
+    def browse_backup(self):
+# ... existing code ...
+        p = filedialog.askdirectory()
+        if p:
+            self.backup_var.set(p)
+
+    def clear_log(self):
+# ... existing code ...
+        self.log_preview.delete("1.0", "end")
+        self.full_log.delete("1.0", "end")
+        self._view_line_counts.clear()
+
+    def on_log_limit_change(self, choice):
+        try:
+            limit = max(100, int(choice))
+        except ValueError:
+            return
+        self.log_view_limit = limit
+        with self._gui_batch_lock:
+            self._pending_logs = deque(self._pending_logs, maxlen=limit)
+        count = self._view_line_counts.get(self.full_log, 0)
+        if count > limit:
+            self.full_log.delete("1.0", f"{count - limit + 1}.0")
+            self._view_line_counts[self.full_log] = limit
+
+    def toggle_manual_backup(self):
+# ... existing code ...
+        if self.is_running_manual:
+            self.stop_manual_backup()
+        else:
+            self.run_backup_now()
+
+    def run_backup_now(self):
+# ... existing code ...
+        if self.is_running_auto or self.is_running_manual:
+            messagebox.showinfo("Busy", "A backup job is already running.")
+            return
+        src, bkp = self.validate_paths()
+        if not src or not bkp:
+            return
+        self.safe_log("Starting manual backup...")
+        self.stop_event.clear()
+        self.throttle.set_limits(*self.get_limits())
+        self.safe_set_running_state(manual=True, auto=False)
+        self.manual_thread = Thread(target=self.run_backup_job, args=(src, bkp, self.get_backup_options()), daemon=True)
+        self.manual_thread.start()
+
+    def stop_manual_backup(self):
+# ... existing code ...
+        if self.manual_thread and self.manual_thread.is_alive():
+            self.safe_log("Stopping manual backup...")
+            self.stop_event.set()
+        else:
+            self.safe_log("Manual backup not running.")
+
+    # ---------- MODIFIED Schedule/Auto control (Unchanged logic) ----------
+    def schedule_worker(self, src: Path, bkp: Path, schedule_mode: str, schedule_hour: str, options: BackupOptions):
+# ... existing code ...
+        try:
+            run_schedule(src, bkp, schedule_mode, schedule_hour, self.safe_log, self.safe_progress_update,
+                         self.stop_event, options, self.throttle)
+        except Exception as e:
+            self.safe_log(f"CRITICAL ERROR in schedule thread: {e}")
+        self.safe_log("Schedule stopped.")
+        self.safe_set_running_state(manual=False, auto=False)
+
+    def start_auto_backup(self):
+# ... existing code ...
+        if self.is_running_auto or self.is_running_manual:
+            messagebox.showinfo("Busy", "A backup job is already running.")
+            return
+        src, bkp = self.validate_paths()
+        if not src or not bkp:
+            return
+        schedule_mode = self.schedule_var.get()
+        schedule_hour = self.hour_var.get()
+        if schedule_mode == "Disabled":
+            messagebox.showinfo("Schedule Disabled", "Please select a valid schedule (e.g., 'Run every hour').")
+            return
+        self.stop_event.clear()
+        self.throttle.set_limits(*self.get_limits())
+        self.safe_set_running_state(manual=False, auto=True)
+        self.auto_thread = Thread(target=self.schedule_worker, args=(src, bkp, schedule_mode, schedule_hour, self.get_backup_options()), daemon=True)
+        self.auto_thread.start()
+
+    def stop_auto_backup(self):
+# ... existing code ...
+        if self.auto_thread and self.auto_thread.is_alive():
+            self.safe_log("Stopping schedule...")
+            self.stop_event.set()
+        else:
+            self.safe_log("Schedule not running.")
+
+    def run_backup_job(self, src, bkp, options: BackupOptions):
+# ... existing code ...
+        try:
+            run_backup_once(src, bkp, self.safe_log, self.safe_progress_update, self.stop_event, options,
+                            throttle=self.throttle)
+        except Exception as e:
+            self.safe_log(f"CRITICAL ERROR in backup thread: {e}")
+        finally:
+            self.safe_set_running_state(manual=False, auto=False)
+
+    # ----------------- MODIFIED Tray Icon Functions -----------------
+    def create_icon_image_fallback(self):
+        """ Creates a simple 64x64 icon for the tray as a fallback """
+        try:
+            font = ImageFont.truetype("tahoma.ttf", 32)
+        except IOError:
+            font = ImageFont.load_default()
+        image = Image.new('RGB', (64, 64), (20, 20, 20))
+        d = ImageDraw.Draw(image)
+        d.ellipse([(4, 4), (60, 60)], fill=(30, 100, 200), outline='white')
+        d.text((15, 14), "SO", font=font, fill='white')
+        return image
+
+    def setup_tray_icon(self):
+        """ Creates and runs the system tray icon in a separate thread """
+        
+        # --- MODIFIED: Try to load icon.ico first, use fallback on error ---
+        try:
+            icon_path = resource_path("icon.ico")
+            image = Image.open(icon_path)
+        except Exception as e:
+            self.safe_log(f"Icon file 'icon.ico' not found. Using generated icon. Error: {e}")
+            image = self.create_icon_image_fallback()
+        # --- END MODIFICATION ---
+
+        menu = (
+            pystray.MenuItem('Show', self.show_window, default=True),
+            pystray.MenuItem('Quit', self.quit_application)
+        )
+        self.tray_icon = pystray.Icon("SmartOrganizer", image, "Smart Organizer", menu)
+        
+        self.tray_thread = Thread(target=self.tray_icon.run, daemon=True)
+        self.tray_thread.start()
+
+    def hide_to_tray(self):
+# ... existing code ...
+        """ Hides the main window """
+        self.withdraw()
+        # You can add a notification here if you want
+        # self.tray_icon.notify("Running in background", "Smart Organizer is still active.")
+
+    def show_window(self):
+# ... existing code ...
+        """ Shows the main window from the tray """
+        self.deiconify() # Un-hide
+        self.lift() # Bring to front
+        self.attributes("-topmost", 1)
+        # Unset topmost after a moment so it doesn't stay above all windows
+        self.after(100, lambda: self.attributes("-topmost", 0))
+
+    def quit_application(self):
+# ... existing code ...
+        """ This is the new 'on_close' logic, called by the tray menu """
+        self.safe_log("Quit requested, stopping all tasks...")
+        
+        # Stop all threads
+        self.stop_event.set()
+        if self.tray_icon:
+            self.tray_icon.stop()
+        
+        # Wait for threads to stop so the run can save its checkpoint
+        if self.manual_thread and self.manual_thread.is_alive():
+            self.manual_thread.join(timeout=QUIT_JOIN_TIMEOUT)
+        if self.auto_thread and self.auto_thread.is_alive():
+            self.auto_thread.join(timeout=QUIT_JOIN_TIMEOUT)
+        
+        self.destroy() # Destroy the main window, which exits the app
@@ -0,0 +1,626 @@
+""" Persistent SQLite index of a backup root: files, digests, stored objects, manifests, pack
+segments, the change journal and run state, plus the duplicate cascade that uses it.
+"""
+import time
+import sqlite3
+from pathlib import Path
+from threading import Event, Lock
+import contextlib
+import json
+
+from smart_organizer_digests import (
+    DEFAULT_BUFFER_SIZE, DEFAULT_DIGEST_ALGORITHM, SAMPLE_WHOLE_FILE_LIMIT, file_digest, file_sample_digest,
+)
+from smart_organizer_storage import (
+    PARTIAL_SUFFIX, FilesystemBackend, StorageStat, iter_backup_files, meta_dir, remove_stale_partials,
+)
+from smart_organizer_digestset import DigestSet, digest_width
+
+# ----------------- Persistent backup index -----------------
+INDEX_FILE_NAME = "index.sqlite3"
+INDEX_COMMIT_EVERY = 1000
+CHECKPOINT_INTERVAL = 10.0
+OBJECTS_DIR_NAME = "objects"
+OBJECT_DIGESTS_SUFFIX = ".digests"
+
+def object_store_path(backup_root: Path, algorithm: str, digest: str):
+    """ Where the object store keeps the object (or chunk) with this digest """
+    return meta_dir(backup_root) / OBJECTS_DIR_NAME / algorithm / digest[:2] / digest
+
+class Candidate:
+    """ A file taking part in one duplicate check: an indexed backup file (rel set) or a source/in-flight file.
+
+    values maps (column, algorithm) -> hex digest; indexed rows hold values in a single algorithm.
+    """
+    __slots__ = ("path", "rel", "algo", "values")
+
+    def __init__(self, path: Path, rel=None, algo=None, sample=None, digest=None):
+        self.path = path
+        self.rel = rel
+        self.algo = algo
+        self.values = {}
+        if sample is not None:
+            self.values[("sample", algo)] = sample
+        if digest is not None:
+            self.values[("digest", algo)] = digest
+
+class BackupIndex:
+    """ On-disk map of backup files: relative path + (size, mtime_ns, inode) signature -> digests.
+
+    Lives in the backup root's meta folder and doubles as the size buckets of the duplicate
+    cascade (size -> sample digest -> full digest). Sample and full digests are filled in
+    lazily, only when a source file of the same size shows up, so most backup files are
+    never read at all. Every row records the algorithm its digests were made with; rows
+    from older runs are compared in their own algorithm instead of being re-hashed.
+    """
+    def __init__(self, backup_root: Path, algorithm=DEFAULT_DIGEST_ALGORITHM, buffer_size=DEFAULT_BUFFER_SIZE):
+        self.root = backup_root
+        self.algorithm = algorithm
+        self.buffer_size = buffer_size
+        # Optional Throttle; reading backup files to settle a duplicate counts against the read limit
+        self.throttle = None
+        # Where the backup's files live; reconcile and object-store lookups go through it
+        self.storage = FilesystemBackend(backup_root)
+        folder = meta_dir(backup_root)
+        folder.mkdir(parents=True, exist_ok=True)
+        self.db_path = folder / INDEX_FILE_NAME
+        self.lock = Lock()
+        self._size_locks = [Lock() for _ in range(64)]
+        self._claims = {}
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " inode INTEGER NOT NULL,"
+            " digest TEXT,"
+            " seen INTEGER NOT NULL DEFAULT 0,"
+            " sample TEXT,"
+            " algo TEXT NOT NULL DEFAULT 'md5')"
+        )
+        # Indexes written before samples/algorithms existed hold plain MD5 digests
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(files)")}
+        if "sample" not in columns:
+            self.conn.execute("ALTER TABLE files ADD COLUMN sample TEXT")
+        if "algo" not in columns:
+            self.conn.execute("ALTER TABLE files ADD COLUMN algo TEXT NOT NULL DEFAULT 'md5'")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS objects ("
+            " algo TEXT NOT NULL,"
+            " digest TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " PRIMARY KEY (algo, digest))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS objects_size ON objects(size, algo)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS packed ("
+            " path TEXT PRIMARY KEY,"
+            " folder TEXT NOT NULL,"
+            " segment TEXT NOT NULL,"
+            " offset INTEGER NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " algo TEXT NOT NULL,"
+            " digest TEXT NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS packed_digest ON packed(digest, algo)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS packed_folder ON packed(folder)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS pack_segments ("
+            " path TEXT PRIMARY KEY,"
+            " folder TEXT NOT NULL,"
+            " end_offset INTEGER NOT NULL,"
+            " sealed INTEGER NOT NULL DEFAULT 0)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS manifests ("
+            " algo TEXT NOT NULL,"
+            " digest TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " path TEXT NOT NULL,"
+            " PRIMARY KEY (algo, digest))"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS journal ("
+            " source TEXT NOT NULL,"
+            " rel TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " inode INTEGER NOT NULL,"
+            " digest TEXT,"
+            " algo TEXT,"
+            " backup_path TEXT,"
+            " seen INTEGER NOT NULL DEFAULT 0,"
+            " PRIMARY KEY (source, rel))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS files_digest ON files(digest)")
+        self.conn.execute("DROP INDEX IF EXISTS files_size")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS files_size_sample ON files(size, sample)")
+        self.conn.commit()
+        self._pending = 0
+        # DigestSet of stored object digests; loaded by load_object_digests() for object-store runs
+        self.object_digests = None
+
+    def close(self):
+        if self.object_digests is not None:
+            self.object_digests.close()
+        with self.lock:
+            try:
+                self.conn.commit()
+                self.conn.close()
+            except sqlite3.Error as e:
+                print(f"Error closing index {self.db_path}: {e}")
+
+    def _maybe_commit(self):
+        self._pending += 1
+        if self._pending >= INDEX_COMMIT_EVERY:
+            self.conn.commit()
+            self._pending = 0
+
+    def reconcile(self, stop_event: Event, log_callback):
+        """ Brings the index in line with the backup tree using stat data only. Returns False if interrupted. """
+        generation = time.time_ns()
+        changed = unchanged = 0
+        partials = []
+        # Pack segments grow in place; they are tracked in pack_segments instead
+        with self.lock:
+            segments = {row[0] for row in self.conn.execute("SELECT path FROM pack_segments")}
+        if self.storage.local:
+            entries = self._local_entries(partials)
+        else:
+            # One list request per page of keys; remote objects have no inode
+            entries = ((rel, (st.size, st.mtime_ns, st.inode)) for rel, st in self.storage.list(""))
+        for rel, signature in entries:
+            if rel in segments:
+                continue
+            if stop_event.is_set():
+                with self.lock:
+                    self.conn.commit()
+                return False
+            with self.lock:
+                row = self.conn.execute(
+                    "SELECT size, mtime_ns, inode FROM files WHERE path = ?", (rel,)
+                ).fetchone()
+                if row == signature:
+                    self.conn.execute("UPDATE files SET seen = ? WHERE path = ?", (generation, rel))
+                    unchanged += 1
+                else:
+                    # New or modified: forget old digests, they are recomputed on demand
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO files (path, size, mtime_ns, inode, sample, digest, algo, seen)"
+                        " VALUES (?, ?, ?, ?, NULL, NULL, ?, ?)",
+                        (rel, *signature, self.algorithm, generation),
+                    )
+                    changed += 1
+                self._maybe_commit()
+        with self.lock:
+            removed = self.conn.execute("DELETE FROM files WHERE seen != ?", (generation,)).rowcount
+            self.conn.commit()
+            self._pending = 0
+        log_callback(f"Index reconciled: {unchanged} unchanged, {changed} new or changed, {removed} removed.")
+        stale = remove_stale_partials(partials)
+        if stale:
+            log_callback(f"Removed {stale} half-written file(s) left by an interrupted run.")
+        return True
+
+    def _local_entries(self, partials):
+        """ (rel, (size, mtime_ns, inode)) for every file of a filesystem backup, from one stat each """
+        for rel, entry in iter_backup_files(self.root, partials):
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            yield rel, (st.st_size, st.st_mtime_ns, entry.inode())
+
+    def get_state(self, key: str, default=None):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_state(self, key: str, value):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, str(value)))
+            self.conn.commit()
+
+    def checkpoint(self, key: str, payload: dict):
+        """ Commits every pending index/journal write together with a run's checkpoint record """
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, json.dumps(payload)))
+            self.conn.commit()
+            self._pending = 0
+
+    def load_checkpoint(self, key: str):
+        try:
+            return json.loads(self.get_state(key) or "null")
+        except ValueError:
+            return None
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def files_after(self, rel: str, limit: int):
+        """ (path, algo, digest) rows in path order, starting after rel; for walks that resume """
+        with self.lock:
+            return self.conn.execute("SELECT path, algo, digest FROM files WHERE path > ? ORDER BY path LIMIT ?",
+                                     (rel, limit)).fetchall()
+
+    def objects_after(self, algo: str, digest: str, limit: int):
+        """ (algo, digest) rows of every algorithm in key order, starting after (algo, digest) """
+        with self.lock:
+            return self.conn.execute(
+                "SELECT algo, digest FROM objects WHERE algo > ? OR (algo = ? AND digest > ?)"
+                " ORDER BY algo, digest LIMIT ?", (algo, algo, digest, limit)
+            ).fetchall()
+
+    def indexed(self, rels):
+        """ The subset of relative paths that have an index row (a pack segment counts as one) """
+        rels = list(rels)
+        marks = ",".join("?" * len(rels))
+        with self.lock:
+            return {row[0] for row in self.conn.execute(
+                f"SELECT path FROM files WHERE path IN ({marks}) UNION SELECT path FROM pack_segments"
+                f" WHERE path IN ({marks})", rels + rels)}
+
+    def indexed_objects(self, algo: str, digests):
+        """ The subset of object digests that have a row in the objects table """
+        digests = list(digests)
+        with self.lock:
+            return {row[0] for row in self.conn.execute(
+                f"SELECT digest FROM objects WHERE algo = ? AND digest IN ({','.join('?' * len(digests))})",
+                [algo, *digests])}
+
+    def set_digest(self, rel: str, algo: str, digest: str):
+        """ Stores a full digest for a row that never needed one, as the baseline for later checks """
+        with self.lock:
+            self.conn.execute("UPDATE files SET digest = ? WHERE path = ? AND algo = ? AND digest IS NULL",
+                              (digest, rel, algo))
+            self._maybe_commit()
+
+    def size_lock(self, size: int):
+        """ Striped lock that serializes duplicate checks of equal-sized files """
+        return self._size_locks[size % len(self._size_locks)]
+
+    def find_duplicate(self, path: Path, size: int, stop_event: Event, claim=False, source=None):
+        """ Runs the size -> sample -> full digest cascade for one source file.
+
+        Returns (is_duplicate, sample, digest, match_rel) where sample/digest are whatever had
+        to be computed for the source file in the index's algorithm (None if never needed) and
+        match_rel is the indexed backup file it duplicates (None for in-flight matches), or
+        None if the source could not be read. With claim=True a new file is registered as
+        in flight, so a parallel worker checking an identical file sees it before the copy
+        lands; the caller must hold size_lock(size) and call release_claim() once the copy
+        is recorded or failed. Passing the same source Candidate to several indexes reuses the
+        digests already computed for it instead of reading the file again.
+        """
+        source = source or Candidate(path)
+        match = self._cascade(source, size, stop_event)
+        if match is None:
+            return None
+        if not match and claim:
+            with self.lock:
+                self._claims.setdefault(size, []).append(source)
+        return (bool(match), source.values.get(("sample", self.algorithm)),
+                source.values.get(("digest", self.algorithm)), match.rel if match else None)
+
+    def _cascade(self, source, size: int, stop_event: Event):
+        """ Returns the matching candidate, False if there is none, or None if reading failed """
+        with self.lock:
+            unsampled = self.conn.execute(
+                "SELECT path, algo, digest IS NOT NULL FROM files WHERE size = ? AND sample IS NULL", (size,)
+            ).fetchall()
+            claims = list(self._claims.get(size, ()))
+            if not unsampled and not claims and not self.conn.execute(
+                    "SELECT 1 FROM files WHERE size = ? LIMIT 1", (size,)).fetchone():
+                return False
+
+        # Sizes collide: make sure every backup file of this size has a sample (each file is sampled once, ever)
+        for rel, algo, has_digest in unsampled:
+            cand = Candidate(self.root / rel, rel, algo if has_digest else self.algorithm)
+            if self._ensure(cand, "sample", cand.algo, size, stop_event) is None and stop_event.is_set():
+                return None
+
+        matches = []
+        with self.lock:
+            algos = [row[0] for row in self.conn.execute(
+                "SELECT DISTINCT algo FROM files WHERE size = ? AND sample IS NOT NULL", (size,))]
+        for algo in algos:
+            # Rows from older runs are compared in their own algorithm instead of being re-hashed
+            source_sample = self._ensure(source, "sample", algo, size, stop_event)
+            if source_sample is None:
+                return None
+            with self.lock:
+                rows = self.conn.execute(
+                    "SELECT path, digest FROM files WHERE size = ? AND sample = ? AND algo = ?",
+                    (size, source_sample, algo),
+                ).fetchall()
+            matches.extend((Candidate(self.root / rel, rel, algo, source_sample, digest), algo) for rel, digest in rows)
+        for cand in claims:
+            source_sample = self._ensure(source, "sample", self.algorithm, size, stop_event)
+            if source_sample is None:
+                return None
+            if self._ensure(cand, "sample", self.algorithm, size, stop_event) == source_sample:
+                matches.append((cand, self.algorithm))
+        if not matches:
+            return False
+        if size <= SAMPLE_WHOLE_FILE_LIMIT:
+            # Small files are sampled in full, so the sample already is the digest
+            return matches[0][0]
+        for cand, algo in matches:
+            source_digest = self._ensure(source, "digest", algo, size, stop_event)
+            if source_digest is None:
+                return None
+            cand_digest = self._ensure(cand, "digest", algo, size, stop_event)
+            if cand_digest is None:
+                if stop_event.is_set():
+                    return None
+                continue
+            if cand_digest == source_digest:
+                return cand
+        return False
+
+    def _ensure(self, cand, column: str, algo: str, size: int, stop_event: Event):
+        """ Returns a candidate's sample/digest in algo, computing and persisting it if missing """
+        value = cand.values.get((column, algo))
+        if value is not None:
+            return value
+        if column == "sample":
+            value = file_sample_digest(cand.path, size, stop_event, algo, self.buffer_size, self.throttle)
+        else:
+            value = file_digest(cand.path, stop_event, algo, self.buffer_size, throttle=self.throttle)
+        if value is None:
+            return None
+        cand.values[(column, algo)] = value
+        if size <= SAMPLE_WHOLE_FILE_LIMIT:
+            cand.values[("sample", algo)] = cand.values[("digest", algo)] = value
+        if cand.rel is not None:
+            cand.algo = algo
+            with self.lock:
+                self.conn.execute(
+                    "UPDATE files SET sample = COALESCE(?, sample), digest = COALESCE(?, digest), algo = ?"
+                    " WHERE path = ?",
+                    (cand.values.get(("sample", algo)), cand.values.get(("digest", algo)), algo, cand.rel),
+                )
+                self._maybe_commit()
+        return value
+
+    def settle_claim(self, path: Path, size: int, rel: str):
+        """ The claimed copy landed at rel: the claim now points there, and whatever other workers hashed
+        of it while comparing is stored with its index row
+        """
+        with self.lock:
+            claim = next((c for c in self._claims.get(size, ()) if c.path == path), None)
+            if claim is None:
+                return
+            claim.rel, claim.algo = rel, self.algorithm
+            self.conn.execute(
+                "UPDATE files SET sample = COALESCE(sample, ?), digest = COALESCE(digest, ?)"
+                " WHERE path = ? AND algo = ?",
+                (claim.values.get(("sample", self.algorithm)), claim.values.get(("digest", self.algorithm)), rel,
+                 self.algorithm),
+            )
+            self._maybe_commit()
+
+    def release_claim(self, path: Path, size: int):
+        with self.lock:
+            claims = self._claims.get(size, [])
+            claims[:] = [c for c in claims if c.path != path]
+            if not claims:
+                self._claims.pop(size, None)
+
+    def journal_unchanged(self, source_key: str, f, generation: int, content_addressed=False, since=0):
+        """ True if the source file has the same stat signature as when it was last backed up
+        and the backup file (or stored object) it maps to is still indexed; such files are
+        neither read nor copied. since limits this to entries written from that generation
+        on (a resumed run only trusts the work of the run it resumes).
+        """
+        if content_addressed:
+            query = ("SELECT j.size, j.mtime_ns, j.inode, o.digest IS NOT NULL OR m.digest IS NOT NULL, j.seen, NULL"
+                     " FROM journal j LEFT JOIN objects o ON o.algo = j.algo AND o.digest = j.digest"
+                     " LEFT JOIN manifests m ON m.algo = j.algo AND m.digest = j.digest"
+                     " WHERE j.source = ? AND j.rel = ?")
+        else:
+            # A file that matched a copy still in flight was journaled before that copy had a path;
+            # it maps to whichever indexed or packed file has its digest, which is then written back
+            query = ("SELECT j.size, j.mtime_ns, j.inode, COALESCE(f.path, p.path, d.path, q.path) IS NOT NULL,"
+                     " j.seen, COALESCE(d.path, q.path)"
+                     " FROM journal j LEFT JOIN files f ON f.path = j.backup_path"
+                     " LEFT JOIN packed p ON p.path = j.backup_path"
+                     " LEFT JOIN files d ON j.backup_path IS NULL AND d.digest = j.digest AND d.algo = j.algo"
+                     " AND d.size = j.size"
+                     " LEFT JOIN packed q ON j.backup_path IS NULL AND q.digest = j.digest AND q.algo = j.algo"
+                     " WHERE j.source = ? AND j.rel = ?")
+        with self.lock:
+            row = self.conn.execute(query, (source_key, f.rel)).fetchone()
+            if row is None or not row[3] or row[:3] != (f.size, f.mtime_ns, f.inode) or row[4] < since:
+                return False
+            self.conn.execute("UPDATE journal SET seen = ?, backup_path = COALESCE(backup_path, ?)"
+                              " WHERE source = ? AND rel = ?", (generation, row[5], source_key, f.rel))
+            self._maybe_commit()
+        return True
+
+    def journal_record(self, source_key: str, f, digest, backup_rel, generation: int):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO journal (source, rel, size, mtime_ns, inode, digest, algo, backup_path, seen)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (source_key, f.rel, f.size, f.mtime_ns, f.inode, digest, self.algorithm, backup_rel, generation),
+            )
+            self._maybe_commit()
+
+    def journal_prune(self, source_key: str, generation: int):
+        """ Drops journal entries of source files that were not seen by a complete scan """
+        with self.lock:
+            removed = self.conn.execute(
+                "DELETE FROM journal WHERE source = ? AND seen != ?", (source_key, generation)
+            ).rowcount
+            self.conn.commit()
+            self._pending = 0
+        return removed
+
+    def objects_root(self):
+        return meta_dir(self.root) / OBJECTS_DIR_NAME / self.algorithm
+
+    def object_path(self, digest: str):
+        return object_store_path(self.root, self.algorithm, digest)
+
+    def object_key(self, digest: str):
+        """ The object's storage key (its path relative to the backup root) """
+        return object_store_path(Path(), self.algorithm, digest).as_posix()
+
+    def object_digests_path(self):
+        return meta_dir(self.root) / f"{OBJECTS_DIR_NAME}-{self.algorithm}{OBJECT_DIGESTS_SUFFIX}"
+
+    def load_object_digests(self, log_callback):
+        """ Maps the saved digest set of the object store, rewriting it from the objects table when its
+        count no longer matches. Streams the digests in primary-key order, so nothing is sorted in memory.
+        """
+        path = self.object_digests_path()
+        expected = self.object_count()
+        digests = None
+        try:
+            digests = DigestSet.load(path)
+            if len(digests) != expected or digests.width != digest_width(self.algorithm):
+                digests.close()
+                digests = None
+        except FileNotFoundError:
+            pass
+        except ValueError as e:
+            log_callback(f"Rewriting object digest set: {e}")
+        if digests is None:
+            with self.lock:
+                rows = self.conn.execute("SELECT digest FROM objects WHERE algo = ? ORDER BY digest",
+                                         (self.algorithm,))
+                DigestSet.write(path, (row[0] for row in rows), digest_width(self.algorithm), expected)
+            digests = DigestSet.load(path)
+        if self.object_digests is not None:
+            self.object_digests.close()
+        self.object_digests = digests
+        return digests
+
+    def has_object(self, digest: str):
+        """ Object-store membership: the digest set rules out new content without a stat """
+        if self.object_digests is not None and digest not in self.object_digests:
+            return False
+        return self.storage.exists(self.object_key(digest))
+
+    def objects_present(self, digests):
+        """ has_object() for many digests, with a single batched existence check for those the
+        digest set cannot rule out
+        """
+        keys = {self.object_key(digest): digest for digest in digests
+                if self.object_digests is None or digest in self.object_digests}
+        if not keys:
+            return set()
+        return {keys[key] for key in self.storage.exists_many(keys)}
+
+    def has_object_size(self, size: int):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT 1 FROM objects WHERE size = ? AND algo = ? LIMIT 1", (size, self.algorithm)
+            ).fetchone() is not None
+
+    def record_object(self, digest: str, size: int):
+        with self.lock:
+            self.conn.execute("INSERT OR IGNORE INTO objects (algo, digest, size) VALUES (?, ?, ?)",
+                              (self.algorithm, digest, size))
+            self._maybe_commit()
+        if self.object_digests is not None:
+            self.object_digests.add(digest)
+
+    def rebuild_objects(self, log_callback):
+        """ Refills the objects table from the store's file names (digests) and sizes; nothing is hashed """
+        root = self.objects_root()
+        with contextlib.suppress(OSError):
+            self.object_digests_path().unlink()
+        if not root.is_dir():
+            return 0
+        count = 0
+        for rel, entry in iter_backup_files(root):
+            if "/" in rel and not entry.name.endswith(PARTIAL_SUFFIX):
+                self.record_object(entry.name, entry.stat().st_size)
+                count += 1
+        with self.lock:
+            self.conn.commit()
+        log_callback(f"Rebuilt object table: {count} objects.")
+        return count
+
+    def record_manifest(self, digest: str, size: int, rel: str):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO manifests (algo, digest, size, path) VALUES (?, ?, ?, ?)",
+                              (self.algorithm, digest, size, rel))
+            self._maybe_commit()
+
+    def find_manifest(self, digest: str):
+        """ Relative path of a chunk manifest already describing this content, or None """
+        with self.lock:
+            row = self.conn.execute("SELECT path FROM manifests WHERE algo = ? AND digest = ?",
+                                    (self.algorithm, digest)).fetchone()
+        return row[0] if row else None
+
+    def record_packed(self, rel: str, segment: str, offset: int, size: int, mtime_ns: int, digest: str):
+        folder = rel.rpartition("/")[0]
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO packed (path, folder, segment, offset, size, mtime_ns, algo, digest)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (rel, folder, segment, offset, size, mtime_ns, self.algorithm, digest))
+            self._maybe_commit()
+
+    def find_packed(self, digest: str):
+        """ Logical path of a packed file with this content, or None """
+        with self.lock:
+            row = self.conn.execute("SELECT path FROM packed WHERE digest = ? AND algo = ? LIMIT 1",
+                                    (digest, self.algorithm)).fetchone()
+        return row[0] if row else None
+
+    def packed_names(self, folder: str):
+        with self.lock:
+            return [row[0].rpartition("/")[2] for row in
+                    self.conn.execute("SELECT path FROM packed WHERE folder = ?", (folder,))]
+
+    def packed_after(self, rel: str, limit: int):
+        """ (path, segment, offset, size, mtime_ns, algo, digest) rows in path order, starting after rel """
+        with self.lock:
+            return self.conn.execute(
+                "SELECT path, segment, offset, size, mtime_ns, algo, digest FROM packed WHERE path > ?"
+                " ORDER BY path LIMIT ?", (rel, limit)).fetchall()
+
+    def packed_count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM packed").fetchone()[0]
+
+    def open_segment(self, folder: str):
+        """ (path, end offset) of the folder's segment that still takes appends, or None """
+        with self.lock:
+            return self.conn.execute("SELECT path, end_offset FROM pack_segments WHERE folder = ? AND sealed = 0"
+                                     " ORDER BY path DESC LIMIT 1", (folder,)).fetchone()
+
+    def set_segment(self, rel: str, end_offset: int, sealed=False):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO pack_segments (path, folder, end_offset, sealed)"
+                              " VALUES (?, ?, ?, ?)", (rel, rel.rpartition("/")[0], end_offset, int(sealed)))
+            self._maybe_commit()
+
+    def object_count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM objects WHERE algo = ?", (self.algorithm,)).fetchone()[0]
+
+    def record(self, path: Path, sample=None, digest=None, st: StorageStat = None):
+        """ Adds a freshly copied backup file to the index, with any digests already known.
+        st is the StorageStat its put returned; without one the file is stat'ed.
+        """
+        if st is None:
+            st = path.stat()
+            st = StorageStat(st.st_size, st.st_mtime_ns, st.st_ino)
+        rel = path.relative_to(self.root).as_posix()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, inode, sample, digest, algo, seen)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (rel, st.size, st.mtime_ns, st.inode, sample, digest, self.algorithm, 0),
+            )
+            self._maybe_commit()
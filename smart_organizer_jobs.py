@@ -0,0 +1,389 @@
+""" Named backup jobs with cron schedules, run side by side by a JobScheduler.
+
+Imported only by the jobs and scrub --schedule commands, like the GUI module.
+"""
+import time
+from pathlib import Path
+from datetime import datetime, timedelta
+from threading import Thread, Event, Lock, Condition
+from dataclasses import dataclass, field, fields
+import json
+import os
+
+from smart_file_organizer_pro_v5 import (
+    SCHEDULE_ALIASES, WATCH_SCHEDULE_MODE, BackupOptions, Throttle, app_data_dir, backup_roots,
+    default_copy_workers, default_hash_workers, options_from_config, run_backup_once, watch_and_backup,
+    write_atomic,
+)
+
+# ----------------- Job scheduler -----------------
+JOBS_FILE_NAME = "jobs.json"
+JOB_STATE_SUFFIX = ".state.json"
+DEFAULT_MAX_CONCURRENT_JOBS = 2
+# Longest single timer wait; re-checking now and then keeps cron times right across sleep/clock changes
+MAX_TIMER_WAIT = 300.0
+CRON_ALIASES = {"@hourly": "0 * * * *", "@daily": "0 0 * * *", "@weekly": "0 0 * * 0", "@monthly": "0 0 1 * *"}
+
+class CronSchedule:
+    """ Five-field cron expression: minute hour day-of-month month day-of-week (0 or 7 = Sunday).
+    Fields take *, numbers, lists, ranges and /steps; @hourly, @daily, @weekly and @monthly work too.
+    """
+    FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression: str):
+        self.expression = expression.strip()
+        parts = CRON_ALIASES.get(self.expression, self.expression).split()
+        if len(parts) != 5:
+            raise ValueError(f"Cron schedule '{expression}' needs 5 fields (minute hour day month weekday).")
+        values = [self._parse(part, low, high) for part, (low, high) in zip(parts, self.FIELDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = values
+        self.weekdays = {d % 7 for d in weekdays}
+        # Classic cron: when both day fields are restricted, either one matching is enough
+        self.any_day, self.any_weekday = parts[2] == "*", parts[4] == "*"
+
+    @staticmethod
+    def _parse(text: str, low: int, high: int):
+        result = set()
+        for item in text.split(","):
+            body, _, step = item.partition("/")
+            if body == "*":
+                start, end = low, high
+            elif "-" in body:
+                start, end = (int(v) for v in body.split("-", 1))
+            else:
+                # "5/15" means every 15 starting at 5
+                start = int(body)
+                end = high if step else start
+            step = int(step) if step else 1
+            if not low <= start <= end <= high or step < 1:
+                raise ValueError(f"Cron field '{text}' is outside {low}-{high}.")
+            result.update(range(start, end + 1, step))
+        return result
+
+    def _day_matches(self, day):
+        in_month = day.day in self.days
+        in_week = (day.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return in_month and in_week
+        return in_month or in_week
+
+    def next_after(self, when: datetime):
+        """ First matching minute strictly after when """
+        start = when.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        day = start.replace(hour=0, minute=0)
+        for _ in range(366 * 5):
+            if day.month in self.months and self._day_matches(day):
+                for hour in sorted(self.hours):
+                    for minute in sorted(self.minutes):
+                        candidate = day.replace(hour=hour, minute=minute)
+                        if candidate >= start:
+                            return candidate
+            day += timedelta(days=1)
+        raise ValueError(f"Cron schedule '{self.expression}' never matches.")
+
+def parse_job_schedule(schedule: str, hour=8):
+    """ A job's schedule as a CronSchedule, or None for real-time watch jobs.
+    Also accepts the GUI's schedule names ("Run every hour", "Run every day at..." with hour).
+    """
+    schedule = SCHEDULE_ALIASES.get(schedule, schedule) or ""
+    if schedule == WATCH_SCHEDULE_MODE:
+        return None
+    if schedule == "Run every hour":
+        schedule = "0 * * * *"
+    elif schedule == "Run every day at...":
+        schedule = f"0 {int(hour)} * * *"
+    return CronSchedule(schedule)
+
+@dataclass
+class BackupJob:
+    """ One named source with its backup root (or list of roots), schedule and options """
+    name: str
+    source: str
+    backup: object
+    schedule: str = "@hourly"
+    enabled: bool = True
+    options: BackupOptions = field(default_factory=BackupOptions)
+
+    def to_dict(self):
+        # Only what differs from the defaults, so worker counts keep scaling with the machine
+        defaults = BackupOptions()
+        options = {f.name: getattr(self.options, f.name) for f in fields(BackupOptions)
+                   if getattr(self.options, f.name) != getattr(defaults, f.name)}
+        return {"name": self.name, "source": self.source, "backup": self.backup, "schedule": self.schedule,
+                "enabled": self.enabled, "options": options}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        if not data.get("name") or not data.get("source") or not data.get("backup"):
+            raise ValueError(f"Job needs a name, source and backup: {data}")
+        parse_job_schedule(data.get("schedule", "@hourly"))  # fail early on a bad expression
+        backup = data["backup"]
+        backup = [str(b) for b in backup] if isinstance(backup, list) else str(backup)
+        return cls(str(data["name"]), str(data["source"]), backup, data.get("schedule", "@hourly"),
+                   bool(data.get("enabled", True)), options_from_config(data.get("options") or {}))
+
+def default_jobs_path():
+    return app_data_dir() / JOBS_FILE_NAME
+
+def load_jobs(path: Path):
+    """ Job definitions plus scheduler settings from a jobs file; a missing file means no jobs """
+    path = Path(path)
+    if not path.exists():
+        return [], {}
+    data = json.loads(path.read_text(encoding="utf-8"))
+    jobs = [BackupJob.from_dict(item) for item in data.get("jobs", [])]
+    names = [job.name for job in jobs]
+    if len(set(names)) != len(names):
+        raise ValueError(f"{path}: job names must be unique")
+    settings = {k: v for k, v in data.items() if k != "jobs"}
+    return jobs, settings
+
+def save_jobs(path: Path, jobs, settings=None):
+    write_atomic(path, json.dumps(dict(settings or {}, jobs=[job.to_dict() for job in jobs]), indent=2) + "\n")
+
+def job_state_path(jobs_path: Path):
+    jobs_path = Path(jobs_path)
+    return jobs_path.with_name(jobs_path.stem + JOB_STATE_SUFFIX)
+
+def load_job_state(path: Path):
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+def _device_of(path: Path):
+    """ st_dev of the path or its nearest existing parent (a new backup root may not exist yet) """
+    path = Path(path).absolute()
+    for candidate in (path, *path.parents):
+        try:
+            return os.stat(candidate).st_dev
+        except OSError:
+            continue
+    return None
+
+class _JobRuntime:
+    def __init__(self, job: BackupJob, shared_throttle: Throttle = None):
+        self.job = job
+        self.stop_event = Event()    # ends the job's schedule (also sets cancel_event)
+        self.cancel_event = Event()  # the current run's stop_event
+        self.wake = Event()
+        # The job's own limits, with the scheduler-wide byte limits on top
+        self.throttle = Throttle.from_options(job.options)
+        self.throttle.parent = shared_throttle
+        self.thread = None
+        self.next_run = None
+        self.running = False
+
+class JobScheduler:
+    """ Runs many named backup jobs, each on its own cron schedule and with its own cancellation.
+
+    Admission is event driven (one Condition, no polling): a job starts once fewer than
+    max_concurrent jobs run, no running job touches the same disk (source or backup
+    device), and its hash+copy workers fit in the shared worker_budget. Jobs on different
+    disks therefore run side by side while jobs on the same disk take turns. Real-time
+    watch jobs run continuously and are not admitted through the budget. Optional read and
+    write MB/s limits are enforced by one Throttle that every running job (watch jobs too)
+    draws from, so jobs on different disks behind one NAS link or uplink share a single cap;
+    each job's own limits still apply on top. Last-run state is saved after every run so it
+    survives restarts.
+    """
+    def __init__(self, jobs, state_path: Path, log_callback, max_concurrent=DEFAULT_MAX_CONCURRENT_JOBS,
+                 worker_budget=None, read_limit_mb=0.0, write_limit_mb=0.0):
+        self.state_path = Path(state_path)
+        self._log = log_callback
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.worker_budget = int(worker_budget or (default_hash_workers() + default_copy_workers()) * self.max_concurrent)
+        self.throttle = Throttle(read_limit_mb, write_limit_mb)
+        self.shutdown_event = Event()
+        self.condition = Condition()
+        self.state = load_job_state(self.state_path)
+        self._runtimes = {}
+        self._running = {}
+        self._state_lock = Lock()
+        for job in jobs:
+            self._runtimes[job.name] = _JobRuntime(job, self.throttle)
+
+    def log(self, text: str):
+        with self._state_lock:
+            self._log(text)
+
+    def start(self):
+        for runtime in self._runtimes.values():
+            self._start_runtime(runtime)
+
+    def _start_runtime(self, runtime: _JobRuntime):
+        if not runtime.job.enabled:
+            self.log(f"[{runtime.job.name}] Disabled, not scheduled.")
+            return
+        runtime.thread = Thread(target=self._job_loop, args=(runtime,), daemon=True, name=f"job-{runtime.job.name}")
+        runtime.thread.start()
+
+    def add_job(self, job: BackupJob):
+        if job.name in self._runtimes:
+            raise ValueError(f"A job named '{job.name}' already exists.")
+        runtime = _JobRuntime(job, self.throttle)
+        self._runtimes[job.name] = runtime
+        if not self.shutdown_event.is_set():
+            self._start_runtime(runtime)
+
+    def remove_job(self, name: str, timeout=None):
+        runtime = self._runtimes.pop(name)
+        self._stop_runtime(runtime)
+        if runtime.thread:
+            runtime.thread.join(timeout)
+
+    def run_now(self, name: str):
+        """ Triggers the job immediately instead of waiting for its next scheduled time """
+        self._runtimes[name].wake.set()
+
+    def cancel(self, name: str):
+        """ Stops the job's current run (for a watch job, the watch); a cron schedule keeps going """
+        self._runtimes[name].cancel_event.set()
+        # A run still waiting for a free slot gives up
+        with self.condition:
+            self.condition.notify_all()
+
+    def set_limits(self, name: str, read_mb=None, write_mb=None, files_per_second=None):
+        """ Retunes a job's throttle; a run in progress picks the new limits up right away """
+        runtime = self._runtimes[name]
+        runtime.throttle.set_limits(read_mb, write_mb, files_per_second)
+        options = runtime.job.options
+        for attr, value in (("read_limit_mb", read_mb), ("write_limit_mb", write_mb),
+                            ("files_per_second", files_per_second)):
+            if value is not None:
+                setattr(options, attr, value)
+
+    def set_shared_limits(self, read_mb=None, write_mb=None):
+        """ Retunes the read/write MB/s caps shared by all jobs (0 = unlimited), also mid-run """
+        self.throttle.set_limits(read_mb, write_mb)
+
+    def jobs(self):
+        return [runtime.job for runtime in self._runtimes.values()]
+
+    def status(self):
+        """ Per-job snapshot: running flag, next scheduled run and persisted last-run state """
+        result = {}
+        for name, runtime in self._runtimes.items():
+            with self._state_lock:
+                state = dict(self.state.get(name, {}))
+            result[name] = dict(state, running=runtime.running, enabled=runtime.job.enabled,
+                                next_run=runtime.next_run.isoformat(timespec="minutes") if runtime.next_run else None)
+        return result
+
+    def _stop_runtime(self, runtime: _JobRuntime):
+        runtime.stop_event.set()
+        runtime.cancel_event.set()
+        runtime.wake.set()
+        with self.condition:
+            self.condition.notify_all()
+
+    def stop(self, timeout=None):
+        self.shutdown_event.set()
+        for runtime in list(self._runtimes.values()):
+            self._stop_runtime(runtime)
+        for runtime in list(self._runtimes.values()):
+            if runtime.thread:
+                runtime.thread.join(timeout)
+
+    def wait(self):
+        """ Blocks until stop() is called """
+        self.shutdown_event.wait()
+
+    def _job_loop(self, runtime: _JobRuntime):
+        job = runtime.job
+        log = lambda text: self.log(f"[{job.name}] {text}")
+        try:
+            schedule = parse_job_schedule(job.schedule)
+        except ValueError as e:
+            log(f"Invalid schedule: {e}")
+            return
+        if schedule is None:
+            runtime.running = True
+            try:
+                watch_and_backup(Path(job.source), backup_roots(job.backup), log, lambda *_: None,
+                                 runtime.cancel_event, job.options, runtime.throttle)
+            except Exception as e:
+                log(f"CRITICAL ERROR in watch mode: {e}")
+            finally:
+                runtime.running = False
+            return
+        while not runtime.stop_event.is_set():
+            runtime.next_run = schedule.next_after(datetime.now())
+            log(f"Next run scheduled for {runtime.next_run.strftime('%Y-%m-%d %H:%M')}.")
+            triggered = False
+            while not runtime.stop_event.is_set():
+                remaining = (runtime.next_run - datetime.now()).total_seconds()
+                if remaining <= 0:
+                    break
+                if runtime.wake.wait(min(remaining, MAX_TIMER_WAIT)):
+                    runtime.wake.clear()
+                    triggered = True
+                    break
+            if runtime.stop_event.is_set():
+                break
+            if triggered:
+                log("Run requested.")
+            self._run_job(runtime, log)
+
+    def _demand(self, job: BackupJob):
+        return min(self.worker_budget, max(1, job.options.hash_workers) + max(1, job.options.copy_workers))
+
+    def _admit(self, runtime: _JobRuntime, devices):
+        """ Waits (on the condition, not a timer) until the job fits; False if it was stopped meanwhile """
+        demand = self._demand(runtime.job)
+        with self.condition:
+            while True:
+                if runtime.stop_event.is_set() or runtime.cancel_event.is_set():
+                    return False
+                busy_devices = set().union(*self._running.values()) if self._running else set()
+                used = sum(self._demand(r.job) for r in self._running)
+                if (len(self._running) < self.max_concurrent and not (devices & busy_devices)
+                        and used + demand <= self.worker_budget):
+                    self._running[runtime] = devices
+                    return True
+                self.condition.wait()
+
+    def _release(self, runtime: _JobRuntime):
+        with self.condition:
+            self._running.pop(runtime, None)
+            self.condition.notify_all()
+
+    def _run_job(self, runtime: _JobRuntime, log):
+        job = runtime.job
+        if runtime.stop_event.is_set():
+            return
+        runtime.cancel_event.clear()
+        paths = [job.source] + backup_roots(job.backup)
+        devices = {d for d in map(_device_of, paths) if d is not None}
+        if not self._admit(runtime, devices):
+            log("Run skipped (cancelled while waiting for a free slot).")
+            return
+        runtime.running = True
+        started = time.time()
+        status = "failed"
+        metrics = None
+        try:
+            log("Run starting...")
+            metrics = run_backup_once(Path(job.source), backup_roots(job.backup), log, lambda *_: None,
+                                      runtime.cancel_event, job.options, throttle=runtime.throttle)
+            status = "stopped" if runtime.cancel_event.is_set() else "completed"
+        except Exception as e:
+            log(f"CRITICAL ERROR in job run: {e}")
+        finally:
+            runtime.running = False
+            self._release(runtime)
+            self._record(job.name, started, status, metrics)
+        log(f"Run {status}.")
+
+    def _record(self, name, started, status, metrics):
+        entry = {"last_run": datetime.fromtimestamp(started).isoformat(timespec="seconds"),
+                 "last_status": status, "last_duration": round(time.time() - started, 1)}
+        if metrics:
+            entry["last_copied"] = metrics.counters["files_copied"]
+            entry["last_errors"] = metrics.counters["errors"]
+        with self._state_lock:
+            self.state[name] = entry
+            try:
+                write_atomic(self.state_path, json.dumps(self.state, indent=2))
+            except OSError as e:
+                self._log(f"Error saving job state {self.state_path}: {e}")
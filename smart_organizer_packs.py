@@ -0,0 +1,159 @@
+""" Small-file packs: tar segments that many small files are appended to, and reading them back. """
+from pathlib import Path
+from threading import Lock
+import tarfile
+import os
+
+from smart_organizer_digests import new_hasher
+from smart_organizer_storage import glob_match
+from smart_organizer_index import BackupIndex
+
+# ----------------- Small-file packs -----------------
+PACK_SEGMENT_SIZE = 64 * 1024 * 1024
+PACK_SEGMENT_PREFIX = "packed-"
+_TAR_END = bytes(2 * tarfile.BLOCKSIZE)
+
+class _Segment:
+    __slots__ = ("rel", "path", "fh", "end", "lock", "sealed")
+
+    def __init__(self, rel: str, path: Path, fh, end: int):
+        self.rel = rel
+        self.path = path
+        self.fh = fh
+        self.end = end
+        self.lock = Lock()
+        self.sealed = False
+
+class PackWriter:
+    """ Appends small files to rolling tar segments, one open segment per type/date folder.
+
+    Every member is followed by a fresh end-of-archive marker, so a segment is a valid tar file
+    after each append and tar can list or unpack it directly. The next append overwrites the
+    marker. The index keeps each segment's end offset, so an interrupted run's unindexed tail is
+    overwritten instead of kept. Segments roll over at PACK_SEGMENT_SIZE.
+    """
+    def __init__(self, backup: Path, index: BackupIndex, planner):
+        self.backup = backup
+        self.index = index
+        self.planner = planner
+        self.lock = Lock()
+        self._segments = {}
+
+    def _segment(self, folder: Path):
+        with self.lock:
+            segment = self._segments.get(folder)
+            if segment is None:
+                segment = self._open(folder)
+                self._segments[folder] = segment
+            return segment
+
+    def _open(self, folder: Path):
+        folder_rel = folder.relative_to(self.backup).as_posix()
+        row = self.index.open_segment(folder_rel)
+        if row:
+            rel, end = row
+            path = self.backup / rel
+            try:
+                if path.stat().st_size >= end:
+                    fh = open(path, "r+b")
+                    fh.truncate(end)
+                    return _Segment(rel, path, fh, end)
+            except OSError:
+                pass
+            # Gone or shorter than indexed: leave it alone and start a new one
+            self.index.set_segment(rel, end, sealed=True)
+        path = self.planner.claim_segment(folder)
+        rel = path.relative_to(self.backup).as_posix()
+        fh = open(path, "w+b")
+        self.index.set_segment(rel, 0)
+        return _Segment(rel, path, fh, 0)
+
+    def add(self, folder: Path, name: str, data: bytes, mtime_ns: int):
+        """ Appends one file as a tar member; returns (segment rel, offset of the member's data) """
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = mtime_ns // 1_000_000_000
+        info.mode = 0o644
+        header = info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+        padding = -len(data) % tarfile.BLOCKSIZE
+        while True:
+            segment = self._segment(folder)
+            with segment.lock:
+                # Another worker may have filled and closed it since the lookup; take the next one
+                if segment.sealed:
+                    continue
+                fh = segment.fh
+                fh.seek(segment.end)
+                fh.write(header)
+                fh.write(data)
+                fh.write(bytes(padding))
+                fh.write(_TAR_END)
+                fh.flush()
+                offset = segment.end + len(header)
+                segment.end = offset + len(data) + padding
+                segment.sealed = segment.end >= PACK_SEGMENT_SIZE
+                self.index.set_segment(segment.rel, segment.end, segment.sealed)
+                if segment.sealed:
+                    fh.close()
+                    with self.lock:
+                        if self._segments.get(folder) is segment:
+                            del self._segments[folder]
+                return segment.rel, offset
+
+    def close(self):
+        with self.lock:
+            for segment in self._segments.values():
+                with segment.lock:
+                    segment.sealed = True
+                    segment.fh.close()
+            self._segments.clear()
+
+def read_packed(backup_root: Path, segment: str, offset: int, size: int):
+    with open(Path(backup_root) / segment, "rb") as fh:
+        fh.seek(offset)
+        data = fh.read(size)
+    if len(data) != size:
+        raise ValueError(f"Segment {segment} is truncated.")
+    return data
+
+def iter_packed(backup_root: Path, patterns=()):
+    """ Yields (path, segment, offset, size, mtime_ns, algo, digest) for packed files matching any glob
+    (against the path inside the backup or the bare name); every one without patterns
+    """
+    index = BackupIndex(Path(backup_root))
+    try:
+        after = ""
+        while True:
+            rows = index.packed_after(after, 1000)
+            if not rows:
+                return
+            for row in rows:
+                if not patterns or glob_match(row[0], row[0].rpartition("/")[2], patterns):
+                    yield row
+            after = rows[-1][0]
+    finally:
+        index.close()
+
+def extract_packed(backup_root: Path, patterns, target: Path, log_callback):
+    """ Copies packed files out of their segments into target, keeping their type/date layout and mtime.
+    Each one is checked against its digest. Returns (extracted, failed).
+    """
+    extracted = failed = 0
+    for rel, segment, offset, size, mtime_ns, algo, digest in iter_packed(backup_root, patterns):
+        dst = Path(target) / rel
+        try:
+            data = read_packed(backup_root, segment, offset, size)
+            h = new_hasher(algo)
+            h.update(data)
+            if h.hexdigest() != digest:
+                raise ValueError("content does not match its digest")
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            dst.write_bytes(data)
+            os.utime(dst, ns=(mtime_ns, mtime_ns))
+            extracted += 1
+            log_callback(f"Extracted {rel} -> {dst}")
+        except (OSError, ValueError) as e:
+            failed += 1
+            log_callback(f"Error extracting {rel}: {e}")
+    log_callback(f"Extract complete. {extracted} file(s) extracted, {failed} failed.")
+    return extracted, failed
@@ -0,0 +1,635 @@
+""" Backup tree helpers, the copy engine and the storage backends of Smart File Organizer Pro v5.
+
+A backup root is written through a StorageBackend: FilesystemBackend for local and mounted
+folders, or ObjectStoreEmulator, a local stand-in for an S3-style object store.
+"""
+import time
+import shutil
+from pathlib import Path
+from threading import Event, Lock, Condition
+from concurrent.futures import ThreadPoolExecutor
+import fnmatch
+import contextlib
+import errno
+import uuid
+from typing import NamedTuple
+import os
+import sys
+
+from smart_organizer_digests import DEFAULT_BUFFER_SIZE, new_hasher
+
+# ----------------- Backup tree -----------------
+META_DIR_NAME = ".smart_organizer"
+
+def meta_dir(backup_root: Path):
+    """ Folder inside the backup root that holds the organizer's own state files """
+    return backup_root / META_DIR_NAME
+
+def iter_backup_files(backup_root: Path, partials=None):
+    """ Yields (relative posix path, os.DirEntry) for every file in the backup, skipping the meta folder.
+    Half-written temp files are skipped too; their paths are appended to partials if given.
+    """
+    stack = [(backup_root, "")]
+    while stack:
+        folder, prefix = stack.pop()
+        try:
+            with os.scandir(folder) as it:
+                entries = list(it)
+        except OSError as e:
+            print(f"Error listing {folder}: {e}")
+            continue
+        for entry in entries:
+            rel = f"{prefix}{entry.name}"
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if not (prefix == "" and entry.name == META_DIR_NAME):
+                        stack.append((entry.path, rel + "/"))
+                elif entry.is_file():
+                    if not entry.name.endswith(PARTIAL_SUFFIX):
+                        yield rel, entry
+                    elif partials is not None:
+                        partials.append(entry.path)
+            except OSError:
+                continue
+
+def glob_match(rel: str, name: str, patterns):
+    return any(fnmatch.fnmatch(rel, p) or fnmatch.fnmatch(name, p) for p in patterns)
+
+# ----------------- Copy engine -----------------
+PARTIAL_SUFFIX = ".so-partial"
+STALE_PARTIAL_SECONDS = 300
+KERNEL_COPY_CHUNK = 8 * 1024 * 1024
+_FICLONE = 0x40049409
+_OFFLOAD_FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTTY,
+                            errno.EPERM, errno.EBADF, errno.ENOTSUP}
+
+def partial_path(target: Path):
+    """ Hidden temp name next to the target; the index and scans ignore these """
+    return target.with_name(f".{target.name}.{uuid.uuid4().hex[:8]}{PARTIAL_SUFFIX}")
+
+def remove_stale_partials(paths, max_age=STALE_PARTIAL_SECONDS):
+    """ Deletes temp files left by copies a crash cut off. Recent ones are kept: another
+    process backing up to the same folder may still be writing them.
+    """
+    cutoff = time.time() - max_age
+    removed = 0
+    for path in paths:
+        try:
+            if os.stat(path).st_mtime < cutoff:
+                os.unlink(path)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+def _try_reflink(src_fd: int, dst_fd: int):
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        import fcntl
+        fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+        return True
+    except OSError as e:
+        if e.errno in _OFFLOAD_FALLBACK_ERRNOS:
+            return False
+        raise
+
+def _kernel_copy(src_fd: int, dst_fd: int, size: int, stop_event: Event, throttle=None):
+    """ copy_file_range, then sendfile, in chunks with a stop check (and throttle) in between.
+    Returns True when all size bytes are copied, False if stopped, None if the kernel can't do it
+    for these files; then both files are back at offset 0 with the target empty.
+    """
+    chunk = throttle.chunk_size(KERNEL_COPY_CHUNK) if throttle else KERNEL_COPY_CHUNK
+    for name in ("copy_file_range", "sendfile"):
+        if not hasattr(os, name):
+            continue
+        copied = 0
+        try:
+            while copied < size:
+                if stop_event.is_set():
+                    return False
+                count = min(chunk, size - copied)
+                if name == "copy_file_range":
+                    n = os.copy_file_range(src_fd, dst_fd, count)
+                else:
+                    n = os.sendfile(dst_fd, src_fd, copied, count)
+                if n == 0:
+                    # Some kernels return 0 instead of an error for cross-filesystem and network copies
+                    break
+                copied += n
+                if throttle and not (throttle.read(n, stop_event) and throttle.write(n, stop_event)):
+                    return False
+        except OSError as e:
+            if copied or e.errno not in _OFFLOAD_FALLBACK_ERRNOS:
+                raise
+            continue
+        if copied == size:
+            return True
+        if copied:
+            # Stopped short: start over with plain reads and writes rather than keep a truncated copy
+            os.lseek(src_fd, 0, os.SEEK_SET)
+            os.lseek(dst_fd, 0, os.SEEK_SET)
+            os.ftruncate(dst_fd, 0)
+            return None
+    return None
+
+def copy_file(src: Path, dst: Path, stop_event: Event, algorithm=None, buffer_size=DEFAULT_BUFFER_SIZE,
+              throttle=None):
+    """ Cancellable replacement for shutil.copy2 that writes a temp file and renames it into place.
+
+    With an algorithm the digest is computed from the same bytes as they are copied (one read
+    of the source) and returned; without one the kernel does the copy where it can (reflink
+    clone, copy_file_range, sendfile). A Throttle paces the bytes moved against its read and
+    write limits (a reflink clone moves none). Returns (True, digest or None), or (False, None)
+    if stop_event fired; the temp file never survives a failure.
+    """
+    tmp = partial_path(dst)
+    try:
+        with open(src, "rb", buffering=0) as fsrc, open(tmp, "xb", buffering=0) as fdst:
+            size = os.fstat(fsrc.fileno()).st_size
+            done = None
+            if algorithm is None:
+                if _try_reflink(fsrc.fileno(), fdst.fileno()):
+                    done = True
+                else:
+                    done = _kernel_copy(fsrc.fileno(), fdst.fileno(), size, stop_event, throttle)
+            digest = None
+            if done is None:
+                h = new_hasher(algorithm) if algorithm else None
+                buf = bytearray(buffer_size)
+                with memoryview(buf) as view:
+                    while True:
+                        if stop_event.is_set():
+                            done = False
+                            break
+                        n = fsrc.readinto(buf)
+                        if not n:
+                            done = True
+                            break
+                        if throttle and not (throttle.read(n, stop_event) and throttle.write(n, stop_event)):
+                            done = False
+                            break
+                        if h:
+                            h.update(view[:n])
+                        fdst.write(view[:n])
+                digest = h.hexdigest() if h and done else None
+        if not done:
+            tmp.unlink()
+            return False, None
+        shutil.copystat(src, tmp)
+        os.replace(tmp, dst)
+        return True, digest
+    except BaseException:
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+        raise
+
+def link_view(obj: Path, view: Path):
+    """ Exposes a stored object at its type/date path: hardlink, else relative symlink, else a plain copy """
+    try:
+        os.link(obj, view)
+        return "hardlink"
+    except OSError:
+        pass
+    try:
+        os.symlink(os.path.relpath(obj, view.parent), view)
+        return "symlink"
+    except OSError:
+        pass
+    shutil.copy2(obj, view)
+    return "copy"
+
+def _write_stream(src: Path, dst: Path, chunks, stop_event: Event, throttle=None):
+    """ copy_file's temp-file-and-rename for data arriving as byte chunks; a None chunk aborts.
+    src (if any) lends its timestamps. Returns True when written, False if aborted or stopped.
+    """
+    tmp = partial_path(dst)
+    try:
+        done = True
+        with open(tmp, "xb", buffering=0) as fdst:
+            for chunk in chunks:
+                if chunk is None or stop_event.is_set() or (throttle and not throttle.write(len(chunk), stop_event)):
+                    done = False
+                    break
+                fdst.write(chunk)
+        if not done:
+            tmp.unlink()
+            return False
+        if src is not None:
+            shutil.copystat(src, tmp)
+        os.replace(tmp, dst)
+        return True
+    except BaseException:
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+        raise
+    finally:
+        chunks.close()
+
+# ----------------- Storage backends -----------------
+STORAGE_LIST_PAGE = 1000     # keys per list request
+STORAGE_EXISTS_BATCH = 1000  # keys per batched existence check
+DEFAULT_STORAGE_CONNECTIONS = 8
+DEFAULT_MULTIPART_MB = 8.0
+UPLOADS_DIR_NAME = "uploads"
+
+class StorageStat(NamedTuple):
+    size: int
+    mtime_ns: int
+    inode: int = 0
+
+def _file_chunks(src: Path, stop_event: Event, h=None, buffer_size=DEFAULT_BUFFER_SIZE, throttle=None):
+    """ A local file as byte chunks for put_stream(), hashed on the way if h is given; None means stopped """
+    with open(src, "rb", buffering=0) as f:
+        while True:
+            if stop_event.is_set():
+                yield None
+                return
+            chunk = f.read(buffer_size)
+            if not chunk:
+                return
+            if throttle and not throttle.read(len(chunk), stop_event):
+                yield None
+                return
+            if h:
+                h.update(chunk)
+            yield chunk
+
+def single_chunk(data: bytes):
+    yield data
+
+class StorageBackend:
+    """ Where a backup root's files are kept; keys are posix paths relative to the root.
+
+    Remote-style backends only offer the operations below: whole-object puts, stat/exists
+    (also in batches), and listing. local is True for a folder on a filesystem, which the
+    object store's hardlinked views and small-file packs (appended in place) need; the
+    type/date layout and chunked files work on any backend.
+    """
+    name = ""
+    local = False
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def stat(self, key: str):
+        """ StorageStat of the object, or None if there is none """
+        raise NotImplementedError
+
+    def exists(self, key: str):
+        return self.stat(key) is not None
+
+    def exists_many(self, keys):
+        """ The subset of keys that exist """
+        return {key for key in keys if self.exists(key)}
+
+    def list(self, prefix="", with_stat=True):
+        """ Yields (key, StorageStat or None) for every object below a folder prefix ("" or ending
+        in "/"), leaving out the meta folder. Yields nothing if there is no such folder.
+        """
+        raise NotImplementedError
+
+    def make_folder(self, key: str):
+        """ Creates a folder where folders exist; object stores have none """
+
+    def put_stream(self, key: str, chunks, stop_event: Event, throttle=None, src: Path = None, exclusive=False):
+        """ Stores byte chunks under key atomically: readers see the old object or all of the new one.
+        chunks is a generator; a None chunk or stop_event aborts, and chunks is always closed. src
+        lends the object its mtime.
+        With exclusive, raises FileExistsError if the key exists. Returns the stored object's
+        StorageStat, or None if aborted.
+        """
+        raise NotImplementedError
+
+    def put_file(self, key: str, src: Path, stop_event: Event, algorithm=None, buffer_size=DEFAULT_BUFFER_SIZE,
+                 throttle=None):
+        """ Stores a local file, computing its digest from the same read if an algorithm is given.
+        Returns (StorageStat, digest or None), or (None, None) if stopped.
+        """
+        h = new_hasher(algorithm) if algorithm else None
+        st = self.put_stream(key, _file_chunks(src, stop_event, h, buffer_size, throttle), stop_event, throttle, src)
+        return (st, h.hexdigest() if h else None) if st else (None, None)
+
+    def put_many(self, items, stop_event: Event, throttle=None, exclusive=False):
+        """ Stores several small (key, bytes) objects; returns the keys written. With exclusive, keys
+        that already exist are left alone and not returned.
+        """
+        written = []
+        for key, data in items:
+            try:
+                if self.put_stream(key, single_chunk(data), stop_event, throttle, exclusive=exclusive):
+                    written.append(key)
+            except FileExistsError:
+                continue
+            if stop_event.is_set():
+                break
+        return written
+
+    def stats(self):
+        """ Request counters, for backends that make requests """
+        return {}
+
+    def close(self):
+        pass
+
+class FilesystemBackend(StorageBackend):
+    """ A backup root on a local or mounted filesystem; copies use reflinks or the kernel where they can """
+    name = "filesystem"
+    local = True
+
+    def stat(self, key: str):
+        try:
+            st = os.stat(self.root / key)
+        except FileNotFoundError:
+            return None
+        return StorageStat(st.st_size, st.st_mtime_ns, st.st_ino)
+
+    def exists(self, key: str):
+        return (self.root / key).exists()
+
+    def list(self, prefix="", with_stat=True):
+        folder = self.root / prefix if prefix else self.root
+        if not folder.is_dir():
+            return
+        for rel, entry in iter_backup_files(folder):
+            if with_stat:
+                st = entry.stat()
+                yield prefix + rel, StorageStat(st.st_size, st.st_mtime_ns, entry.inode())
+            else:
+                yield prefix + rel, None
+
+    def make_folder(self, key: str):
+        (self.root / key).mkdir(parents=True, exist_ok=True)
+
+    def put_stream(self, key: str, chunks, stop_event: Event, throttle=None, src: Path = None, exclusive=False):
+        dst = self.root / key
+        if not exclusive:
+            return self.stat(key) if _write_stream(src, dst, chunks, stop_event, throttle) else None
+        # Claim the name with link(): of two writers of the same key, exactly one wins
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        staging = dst.with_name(f"{dst.name}.{uuid.uuid4().hex}{PARTIAL_SUFFIX}")
+        if not _write_stream(src, staging, chunks, stop_event, throttle):
+            return None
+        try:
+            os.link(staging, dst)
+        finally:
+            staging.unlink()
+        return self.stat(key)
+
+    def put_file(self, key: str, src: Path, stop_event: Event, algorithm=None, buffer_size=DEFAULT_BUFFER_SIZE,
+                 throttle=None):
+        done, digest = copy_file(src, self.root / key, stop_event, algorithm, buffer_size, throttle)
+        return (self.stat(key), digest) if done else (None, None)
+
+class _Connection:
+    """ One connection of the object-store emulator; each request costs one round trip """
+    def __init__(self, store):
+        self.store = store
+        time.sleep(store.connect_latency)
+
+    def request(self, op: str):
+        time.sleep(self.store.latency)
+        with self.store.lock:
+            self.store.requests[op] = self.store.requests.get(op, 0) + 1
+
+class _ConnectionPool:
+    """ Reuses up to size connections; a request waits for a free one instead of opening more """
+    def __init__(self, factory, size: int):
+        self.factory = factory
+        self.slots = Condition()
+        self.free = size
+        self.idle = []
+        self.opened = 0
+
+    @contextlib.contextmanager
+    def connection(self):
+        with self.slots:
+            while not self.free:
+                self.slots.wait()
+            self.free -= 1
+            conn = self.idle.pop() if self.idle else None
+        try:
+            if conn is None:
+                conn = self.factory()
+                with self.slots:
+                    self.opened += 1
+            yield conn
+        finally:
+            with self.slots:
+                if conn is not None:
+                    self.idle.append(conn)
+                self.free += 1
+                self.slots.notify()
+
+class ObjectStoreEmulator(StorageBackend):
+    """ Local stand-in for an S3-style object store, for testing the remote code paths.
+
+    Objects are files under the root named by their keys (so a backup made through it can be
+    read like a plain folder); uploads in progress live under the meta folder. Every call is a
+    request on a pooled connection, optionally with latency to mimic a network. Streams larger
+    than part_size go up as multipart uploads whose parts are sent in parallel; existence checks
+    take STORAGE_EXISTS_BATCH keys and listings return STORAGE_LIST_PAGE keys per request.
+    """
+    name = "objstore"
+
+    def __init__(self, root: Path, connections=DEFAULT_STORAGE_CONNECTIONS,
+                 part_size=int(DEFAULT_MULTIPART_MB * 1024 * 1024), latency=0.0, connect_latency=0.0):
+        super().__init__(root)
+        self.part_size = max(1024 * 1024, int(part_size))
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.lock = Lock()
+        self.requests = {}
+        connections = max(1, int(connections))
+        self.pool = _ConnectionPool(lambda: _Connection(self), connections)
+        self.executor = ThreadPoolExecutor(connections)
+        # Parts read ahead of the uploads, at most one per connection
+        self.part_slots = Condition()
+        self.parts_in_flight = 0
+        self.max_parts_in_flight = connections
+        self.uploads = meta_dir(self.root) / UPLOADS_DIR_NAME
+        self._abort_stale_uploads()
+
+    def _request(self, op: str):
+        with self.pool.connection() as conn:
+            conn.request(op)
+
+    def _abort_stale_uploads(self):
+        """ Drops multipart uploads left by a crash, like a bucket's abort-incomplete-upload rule """
+        try:
+            stale = [e for e in os.scandir(self.uploads) if time.time() - e.stat().st_mtime > STALE_PARTIAL_SECONDS]
+        except OSError:
+            return
+        for entry in stale:
+            if entry.is_dir():
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                with contextlib.suppress(OSError):
+                    os.unlink(entry.path)
+
+    def stat(self, key: str):
+        self._request("head")
+        try:
+            st = os.stat(self.root / key)
+        except FileNotFoundError:
+            return None
+        return StorageStat(st.st_size, st.st_mtime_ns)
+
+    def exists_many(self, keys):
+        keys = list(keys)
+        found = set()
+        for start in range(0, len(keys), STORAGE_EXISTS_BATCH):
+            batch = keys[start:start + STORAGE_EXISTS_BATCH]
+            self._request("exists_batch")
+            found.update(key for key in batch if os.path.isfile(self.root / key))
+        return found
+
+    def list(self, prefix="", with_stat=True):
+        folder = self.root / prefix if prefix else self.root
+        page = []
+        sent = False
+        for rel, entry in (iter_backup_files(folder) if folder.is_dir() else ()):
+            page.append((rel, entry))
+            if len(page) == STORAGE_LIST_PAGE:
+                yield from self._list_page(prefix, page)
+                page = []
+                sent = True
+        if page or not sent:
+            # An empty listing is still a request
+            yield from self._list_page(prefix, page)
+
+    def _list_page(self, prefix, page):
+        self._request("list")
+        for rel, entry in page:
+            st = entry.stat()
+            yield prefix + rel, StorageStat(st.st_size, st.st_mtime_ns)
+
+    def put_stream(self, key: str, chunks, stop_event: Event, throttle=None, src: Path = None, exclusive=False):
+        upload = None
+        parts = []
+        buf = bytearray()
+        try:
+            for chunk in chunks:
+                if chunk is None or stop_event.is_set() or (throttle and not throttle.write(len(chunk), stop_event)):
+                    return self._abort(upload, parts)
+                buf += chunk
+                while len(buf) >= self.part_size:
+                    if upload is None:
+                        upload = self._start_upload()
+                    parts.append(self._send_part(upload, len(parts), bytes(buf[:self.part_size])))
+                    del buf[:self.part_size]
+            if upload is None:
+                return self._put_object(key, buf, src, exclusive)
+            if buf:
+                parts.append(self._send_part(upload, len(parts), bytes(buf)))
+            tmp = self._complete(upload, parts)
+            upload = None
+            return self._place(tmp, key, src, exclusive)
+        except BaseException:
+            self._abort(upload, parts)
+            raise
+        finally:
+            chunks.close()
+
+    def _put_object(self, key: str, data, src: Path = None, exclusive=False):
+        """ A single-request PUT of the whole object """
+        self._request("put")
+        tmp = self.uploads / f"{uuid.uuid4().hex}{PARTIAL_SUFFIX}"
+        tmp.parent.mkdir(parents=True, exist_ok=True)
+        tmp.write_bytes(data)
+        return self._place(tmp, key, src, exclusive)
+
+    def _start_upload(self):
+        self._request("create_multipart")
+        upload = self.uploads / uuid.uuid4().hex
+        upload.mkdir(parents=True)
+        return upload
+
+    def _send_part(self, upload: Path, number: int, data: bytes):
+        with self.part_slots:
+            while self.parts_in_flight >= self.max_parts_in_flight:
+                self.part_slots.wait()
+            self.parts_in_flight += 1
+
+        def send():
+            try:
+                self._request("upload_part")
+                (upload / f"part-{number:05d}").write_bytes(data)
+            finally:
+                with self.part_slots:
+                    self.parts_in_flight -= 1
+                    self.part_slots.notify()
+        return self.executor.submit(send)
+
+    def _complete(self, upload: Path, parts):
+        for part in parts:
+            part.result()
+        self._request("complete_multipart")
+        tmp = upload.with_name(f"{upload.name}{PARTIAL_SUFFIX}")
+        with open(tmp, "wb") as out:
+            for number in range(len(parts)):
+                with open(upload / f"part-{number:05d}", "rb") as part:
+                    shutil.copyfileobj(part, out, DEFAULT_BUFFER_SIZE)
+        shutil.rmtree(upload, ignore_errors=True)
+        return tmp
+
+    def _abort(self, upload, parts):
+        if upload is not None:
+            for part in parts:
+                with contextlib.suppress(Exception):
+                    part.result()
+            self._request("abort_multipart")
+            shutil.rmtree(upload, ignore_errors=True)
+        return None
+
+    def _place(self, tmp: Path, key: str, src: Path, exclusive: bool):
+        """ The store's side of a finished upload: the object appears at once, under its key """
+        dst = self.root / key
+        try:
+            if src is not None:
+                st = os.stat(src)
+                os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            if exclusive:
+                os.link(tmp, dst)  # If-None-Match: *
+            else:
+                os.replace(tmp, dst)
+            st = os.stat(dst)
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                tmp.unlink()
+        return StorageStat(st.st_size, st.st_mtime_ns)
+
+    def put_many(self, items, stop_event: Event, throttle=None, exclusive=False):
+        """ Small objects go up side by side, one pooled connection each """
+        def put(item):
+            key, data = item
+            if stop_event.is_set() or (throttle and not throttle.write(len(data), stop_event)):
+                return None
+            try:
+                return key if self._put_object(key, data, exclusive=exclusive) else None
+            except FileExistsError:
+                return None
+        return [key for key in self.executor.map(put, list(items)) if key]
+
+    def stats(self):
+        with self.lock:
+            requests = dict(self.requests)
+        return {"requests": requests, "connections_opened": self.pool.opened}
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+STORAGE_BACKENDS = ("filesystem", "objstore")
+
+def open_storage(root: Path, options):
+    """ The storage backend options.storage names, for one backup root """
+    if options.storage == "objstore":
+        return ObjectStoreEmulator(root, options.storage_connections, options.multipart_mb * 1024 * 1024)
+    if options.storage != "filesystem":
+        raise ValueError(f"Unknown storage backend '{options.storage}' (use {' or '.join(STORAGE_BACKENDS)}).")
+    return FilesystemBackend(root)
@@ -0,0 +1,85 @@
+import os
+import random
+from threading import Event
+
+import pytest
+
+import smart_file_organizer_pro_v5 as engine
+import smart_organizer_chunks as chunks
+from smart_organizer_index import object_store_path
+
+AVG = 64 * 1024
+SIZES = {"min_size": AVG // 2, "avg_size": AVG, "max_size": AVG * 8}
+
+@pytest.fixture
+def csv(tmp_path):
+    # Repetitive, low-entropy text: few distinct byte values, lines that differ in a field or two
+    rnd = random.Random(7)
+    lines = ["id,name,amount,date,status\n"]
+    for i in range(60_000):
+        lines.append(f"{i},{rnd.choice(['alice', 'bob', 'carol'])},{rnd.randint(0, 99999) / 100:.2f},"
+                     f"2024-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d},{rnd.choice(['ok', 'ok', 'late'])}\n")
+    path = tmp_path / "table.csv"
+    path.write_text("".join(lines))
+    return path
+
+def _chunks(path, buffer_size=256 * 1024):
+    return list(chunks.iter_chunks(path, Event(), buffer_size, **SIZES))
+
+def test_repetitive_text_chunks_near_average(csv):
+    sizes = [len(chunk) for chunk in _chunks(csv)]
+    assert b"".join(_chunks(csv)) == csv.read_bytes()
+    assert len(sizes) >= 20
+    assert 0.75 * AVG <= sum(sizes[:-1]) / len(sizes[:-1]) <= 1.5 * AVG
+    assert max(sizes) < SIZES["max_size"]
+
+def test_insert_near_start_changes_only_first_chunks(csv, tmp_path):
+    edited = tmp_path / "edited.csv"
+    data = csv.read_bytes()
+    edited.write_bytes(data[:10] + b"hello world!" + data[10:])
+    before = set(_chunks(csv))
+    changed = [chunk for chunk in _chunks(edited) if chunk not in before]
+    assert len(changed) <= 2
+
+def test_cut_points_do_not_depend_on_read_size(csv):
+    assert [len(c) for c in _chunks(csv, 64 * 1024 + 7)] == [len(c) for c in _chunks(csv, 1024 * 1024)]
+
+def _backup(source, backup):
+    return engine.run_backup_once(source, backup, lambda text: None, lambda *args: None, Event(),
+                                  engine.BackupOptions(chunk_threshold_mb=1))
+
+def test_chunked_backup_restores_every_version(tmp_path):
+    source, backup, target = tmp_path / "source", tmp_path / "backup", tmp_path / "restored"
+    source.mkdir()
+    disk = source / "disk.img"
+    original = os.urandom(6 * 1024 * 1024)
+    disk.write_bytes(original)
+    _backup(source, backup)
+    edited = original[:3_000_000] + b"changed" + original[3_000_007:]
+    disk.write_bytes(edited)
+    os.utime(disk, ns=(1_700_000_000_000_000_000, 1_700_000_000_000_000_000))
+    second = _backup(source, backup)
+    # Only the chunk around the edit is new
+    assert 0 < second.counters["bytes_written"] < 3 * chunks.CHUNK_AVG_SIZE
+
+    manifests = sorted(backup.rglob(f"*{chunks.MANIFEST_SUFFIX}"))
+    assert len(manifests) == 2
+    assert chunks.restore_chunked(backup, target, lambda text: None) == (2, 0)
+    restored = {path.name: path for path in target.rglob("*.img")}
+    assert sorted(path.read_bytes() for path in restored.values()) == sorted([original, edited])
+    latest = next(path for path in restored.values() if path.read_bytes() == edited)
+    assert latest.stat().st_mtime_ns == 1_700_000_000_000_000_000
+
+def test_restore_rejects_a_damaged_chunk(tmp_path):
+    source, backup, target = tmp_path / "source", tmp_path / "backup", tmp_path / "restored"
+    source.mkdir()
+    (source / "disk.img").write_bytes(os.urandom(2 * 1024 * 1024))
+    _backup(source, backup)
+    manifest = next(backup.rglob(f"*{chunks.MANIFEST_SUFFIX}"))
+    content = chunks.read_manifest(manifest)
+    digest, size = content["chunks"][0]
+    chunk = object_store_path(backup, content["algorithm"], digest)
+    chunk.chmod(0o644)
+    chunk.write_bytes(bytes(size))
+    assert chunks.restore_chunked(manifest, target, lambda text: None) == (0, 1)
+    assert list(target.iterdir()) == []
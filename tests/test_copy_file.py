@@ -0,0 +1,54 @@
+import os
+from threading import Event
+
+import pytest
+
+import smart_organizer_storage as storage
+
+SIZE = 100_000
+
+@pytest.fixture
+def source(tmp_path):
+    src = tmp_path / "source.bin"
+    src.write_bytes(os.urandom(SIZE))
+    return src
+
+@pytest.fixture(autouse=True)
+def no_reflink(monkeypatch):
+    # Force the copy_file_range/sendfile path even on filesystems that can clone
+    monkeypatch.setattr(storage, "_try_reflink", lambda src_fd, dst_fd: False)
+
+def _copy(source, tmp_path):
+    dst = tmp_path / "target.bin"
+    ok, _ = storage.copy_file(source, dst, Event())
+    return ok, dst
+
+@pytest.mark.skipif(not hasattr(os, "copy_file_range"), reason="needs os.copy_file_range")
+def test_copy_file_range_returning_zero_falls_back(monkeypatch, source, tmp_path):
+    monkeypatch.setattr(os, "copy_file_range", lambda *args: 0)
+    ok, dst = _copy(source, tmp_path)
+    assert ok
+    assert dst.stat().st_size == SIZE
+    assert dst.read_bytes() == source.read_bytes()
+
+def test_kernel_copy_returning_zero_everywhere_uses_plain_reads(monkeypatch, source, tmp_path):
+    monkeypatch.setattr(os, "copy_file_range", lambda *args: 0, raising=False)
+    monkeypatch.setattr(os, "sendfile", lambda *args: 0, raising=False)
+    ok, dst = _copy(source, tmp_path)
+    assert ok
+    assert dst.read_bytes() == source.read_bytes()
+
+@pytest.mark.skipif(not hasattr(os, "copy_file_range"), reason="needs os.copy_file_range")
+def test_copy_that_stops_short_is_restarted(monkeypatch, source, tmp_path):
+    real = os.copy_file_range
+    calls = []
+
+    def short(src_fd, dst_fd, count, *args):
+        calls.append(count)
+        return real(src_fd, dst_fd, min(count, 4096)) if len(calls) == 1 else 0
+
+    monkeypatch.setattr(os, "copy_file_range", short)
+    monkeypatch.setattr(os, "sendfile", lambda *args: 0, raising=False)
+    ok, dst = _copy(source, tmp_path)
+    assert ok
+    assert dst.read_bytes() == source.read_bytes()
@@ -0,0 +1,64 @@
+import hashlib
+
+import pytest
+
+import smart_organizer_digestset as digestset
+from smart_organizer_digestset import DigestSet
+
+WIDTH = 32
+
+def _digests(tag, n):
+    return [hashlib.sha256(f"{tag}{i}".encode()).hexdigest() for i in range(n)]
+
+@pytest.fixture
+def members():
+    return sorted(_digests("in", 5000))
+
+@pytest.mark.parametrize("count_hint", [0, 5000])
+def test_written_set_loads_with_every_member(tmp_path, members, count_hint):
+    path = tmp_path / "objects.digests"
+    assert DigestSet.write(path, iter(members), WIDTH, count_hint) == len(members)
+    loaded = DigestSet.load(path)
+    try:
+        assert len(loaded) == len(members)
+        assert all(d in loaded for d in members)
+        assert not any(d in loaded for d in _digests("out", 2000))
+        assert bytes.fromhex(members[0]) in loaded
+    finally:
+        loaded.close()
+
+def test_bloom_filter_turns_away_most_misses(members):
+    built = DigestSet.from_digests(members, WIDTH)
+    misses = [bytes.fromhex(d) for d in _digests("out", 20000)]
+    passed = sum(digestset._bloom_check(built._bloom, built._bloom_bits, built._hashes, raw) for raw in misses)
+    assert passed / len(misses) < 0.03
+    assert all(d in built for d in members)
+
+def test_added_digests_are_found(members):
+    built = DigestSet.from_digests(members[:100], WIDTH)
+    extra = _digests("extra", 10)
+    for d in extra + members[:5]:
+        built.add(d)
+    assert len(built) == 110
+    assert all(d in built for d in extra)
+
+def test_write_rejects_unsorted_or_mixed_width_digests(tmp_path, members):
+    path = tmp_path / "objects.digests"
+    with pytest.raises(ValueError):
+        DigestSet.write(path, reversed(members), WIDTH)
+    with pytest.raises(ValueError):
+        DigestSet.write(path, [hashlib.md5(b"x").hexdigest()], WIDTH)
+    assert not path.exists()
+    assert list(tmp_path.iterdir()) == []
+    # Repeats are written once
+    assert DigestSet.write(path, [members[0], members[0], members[1]], WIDTH) == 2
+
+def test_damaged_set_file_is_rejected(tmp_path, members):
+    path = tmp_path / "objects.digests"
+    DigestSet.write(path, members, WIDTH, len(members))
+    path.write_bytes(path.read_bytes()[:-10])
+    with pytest.raises(ValueError):
+        DigestSet.load(path)
+    path.write_bytes(b"")
+    with pytest.raises(ValueError):
+        DigestSet.load(path)
@@ -0,0 +1,40 @@
+import os
+from threading import Event
+
+import smart_file_organizer_pro_v5 as engine
+from smart_organizer_storage import iter_backup_files
+
+def _run(source, backups):
+    logs = []
+    metrics = engine.run_backup_once(source, backups, logs.append, lambda *args: None, Event(),
+                                     engine.BackupOptions(hash_workers=2, copy_workers=2))
+    return metrics, logs
+
+def _contents(root):
+    return sorted((rel.rpartition("/")[2], (root / rel).read_bytes()) for rel, _ in iter_backup_files(root))
+
+def test_each_file_is_read_once_for_all_destinations(tmp_path):
+    source = tmp_path / "source"
+    source.mkdir()
+    files = {f"f{i}.bin": os.urandom(200_000 + i) for i in range(6)}
+    for name, data in files.items():
+        (source / name).write_bytes(data)
+    backups = [tmp_path / "b1", tmp_path / "b2", tmp_path / "b3"]
+    metrics, _ = _run(source, backups)
+    assert metrics.counters["files_copied"] == 3 * len(files)
+    assert metrics.counters["bytes_read"] == sum(map(len, files.values()))
+    assert metrics.counters["bytes_written"] == 3 * sum(map(len, files.values()))
+    expected = sorted(files.items())
+    assert all(_contents(root) == expected for root in backups)
+
+def test_only_destinations_missing_a_file_get_it(tmp_path):
+    source = tmp_path / "source"
+    source.mkdir()
+    (source / "old.txt").write_text("already backed up")
+    first, second = tmp_path / "b1", tmp_path / "b2"
+    _run(source, [first])
+    (source / "new.txt").write_text("new file")
+    metrics, _ = _run(source, [first, second])
+    assert metrics.counters["files_copied"] == 3
+    assert [name for name, _ in _contents(first)] == ["new.txt", "old.txt"]
+    assert [name for name, _ in _contents(second)] == ["new.txt", "old.txt"]
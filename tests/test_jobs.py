@@ -0,0 +1,95 @@
+from datetime import datetime
+from threading import Event, Thread
+
+import pytest
+
+import smart_file_organizer_pro_v5 as engine
+import smart_organizer_jobs as jobs
+
+@pytest.mark.parametrize("expression, after, expected", [
+    ("*/15 * * * *", datetime(2026, 10, 17, 10, 7, 30), datetime(2026, 10, 17, 10, 15)),
+    ("5/20 * * * *", datetime(2026, 10, 17, 10, 45), datetime(2026, 10, 17, 11, 5)),
+    ("@daily", datetime(2026, 10, 17, 23, 59, 59), datetime(2026, 10, 18, 0, 0)),
+    # Friday the 16th: weekdays only, so the next run is Monday
+    ("0 9 * * 1-5", datetime(2026, 10, 16, 9, 0), datetime(2026, 10, 19, 9, 0)),
+    # Both day fields restricted: the 20th (a Tuesday) or any Friday, whichever comes first
+    ("0 0 20 * 5", datetime(2026, 10, 17, 12, 0), datetime(2026, 10, 20, 0, 0)),
+    ("30 6 * * 7", datetime(2026, 10, 17, 12, 0), datetime(2026, 10, 18, 6, 30)),
+])
+def test_cron_next_after(expression, after, expected):
+    assert jobs.CronSchedule(expression).next_after(after) == expected
+
+@pytest.mark.parametrize("expression", ["* * * *", "60 * * * *", "* 24 * * *", "*/0 * * * *", "5-1 * * * *"])
+def test_cron_rejects_bad_expressions(expression):
+    with pytest.raises(ValueError):
+        jobs.CronSchedule(expression)
+
+def test_cron_that_never_matches():
+    with pytest.raises(ValueError):
+        jobs.CronSchedule("0 0 31 2 *").next_after(datetime(2026, 1, 1))
+
+def test_job_schedule_accepts_gui_names():
+    assert jobs.parse_job_schedule("watch") is None
+    assert jobs.parse_job_schedule("daily", hour=7).next_after(datetime(2026, 10, 17, 8)) == datetime(2026, 10, 18, 7)
+    assert jobs.parse_job_schedule("Run every hour").minutes == {0}
+
+def _scheduler(tmp_path, names, **kwargs):
+    job_list = [jobs.BackupJob.from_dict({"name": name, "source": str(tmp_path), "backup": str(tmp_path / name),
+                                          "options": {"hash_workers": 2, "copy_workers": 2}})
+                for name in names]
+    return jobs.JobScheduler(job_list, tmp_path / "state.json", lambda text: None, **kwargs)
+
+def _admit_later(scheduler, runtime, devices):
+    """ Starts an admission wait in a thread; returns (admitted event, thread) """
+    admitted = Event()
+    thread = Thread(target=lambda: scheduler._admit(runtime, devices) and admitted.set(), daemon=True)
+    thread.start()
+    return admitted, thread
+
+def test_jobs_on_one_disk_take_turns(tmp_path):
+    scheduler = _scheduler(tmp_path, ("a", "b", "c"), max_concurrent=3)
+    a, b, c = scheduler._runtimes.values()
+    assert scheduler._admit(a, {1})
+    assert scheduler._admit(c, {2})
+    admitted, _ = _admit_later(scheduler, b, {1, 3})
+    assert not admitted.wait(0.2)
+    scheduler._release(a)
+    assert admitted.wait(5)
+
+def test_admission_respects_job_count_and_worker_budget(tmp_path):
+    scheduler = _scheduler(tmp_path, ("a", "b"), max_concurrent=1)
+    a, b = scheduler._runtimes.values()
+    assert scheduler._admit(a, {1})
+    admitted, _ = _admit_later(scheduler, b, {2})
+    assert not admitted.wait(0.2)
+    scheduler._release(a)
+    assert admitted.wait(5)
+
+    scheduler = _scheduler(tmp_path, ("a", "b"), max_concurrent=2, worker_budget=6)
+    a, b = scheduler._runtimes.values()
+    assert scheduler._admit(a, {1})
+    admitted, _ = _admit_later(scheduler, b, {2})
+    assert not admitted.wait(0.2)  # 4 + 4 workers do not fit in 6
+    scheduler._release(a)
+    assert admitted.wait(5)
+
+def test_cancel_ends_the_wait_for_a_slot(tmp_path):
+    scheduler = _scheduler(tmp_path, ("a", "b"), max_concurrent=1)
+    a, b = scheduler._runtimes.values()
+    assert scheduler._admit(a, {1})
+    admitted, thread = _admit_later(scheduler, b, {2})
+    scheduler.cancel("b")
+    thread.join(5)
+    assert not thread.is_alive()
+    assert not admitted.is_set()
+    assert a in scheduler._running
+
+def test_job_round_trips_through_jobs_file(tmp_path):
+    job = jobs.BackupJob("docs", str(tmp_path), [str(tmp_path / "b1"), str(tmp_path / "b2")], "0 3 * * *",
+                         options=engine.BackupOptions(read_limit_mb=5))
+    path = tmp_path / jobs.JOBS_FILE_NAME
+    jobs.save_jobs(path, [job], {"max_concurrent": 3})
+    loaded, settings = jobs.load_jobs(path)
+    assert settings == {"max_concurrent": 3}
+    assert loaded[0].backup == job.backup and loaded[0].schedule == "0 3 * * *"
+    assert loaded[0].options.read_limit_mb == 5
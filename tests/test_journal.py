@@ -0,0 +1,21 @@
+import os
+from threading import Event
+
+import smart_file_organizer_pro_v5 as engine
+
+def _run(source, backup):
+    # A write limit keeps the first copy in flight while its twin is checked
+    return engine.run_backup_once(source, backup, lambda text: None, lambda *args: None, Event(),
+                                  engine.BackupOptions(hash_workers=2, copy_workers=2, write_limit_mb=25))
+
+def test_twins_copied_in_one_run_are_not_read_again(tmp_path):
+    source, backup = tmp_path / "source", tmp_path / "backup"
+    source.mkdir()
+    data = os.urandom(5 * 1024 * 1024)
+    (source / "a.bin").write_bytes(data)
+    (source / "b.bin").write_bytes(data)
+    first = _run(source, backup)
+    assert first.counters["files_copied"] + first.counters["files_duplicate"] == 2
+    second = _run(source, backup)
+    assert second.counters["files_unchanged"] == 2
+    assert second.counters["bytes_read"] == 0
@@ -0,0 +1,70 @@
+import os
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+
+import smart_file_organizer_pro_v5 as engine
+import smart_organizer_packs as packs
+from smart_organizer_index import BackupIndex
+
+def test_concurrent_adds_across_a_seal(monkeypatch, tmp_path):
+    # Tiny segments, so the writers keep sealing the segment the others are about to append to
+    monkeypatch.setattr(packs, "PACK_SEGMENT_SIZE", 16 * 1024)
+    backup = tmp_path / "backup"
+    folder = backup / "txt" / "2026-01-01"
+    folder.mkdir(parents=True)
+    index = BackupIndex(backup)
+    writer = packs.PackWriter(backup, index, engine.TargetPlanner(backup, index=index))
+    files = {f"f{i}.txt": os.urandom(300 + i % 7 * 500) for i in range(400)}
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            placed = dict(zip(files, pool.map(lambda item: writer.add(folder, item[0], item[1], 0), files.items())))
+    finally:
+        writer.close()
+        index.close()
+    assert len({segment for segment, _ in placed.values()}) > 1
+    for name, (segment, offset) in placed.items():
+        assert packs.read_packed(backup, segment, offset, len(files[name])) == files[name]
+
+def _small_files(source):
+    files = {f"note{i}.txt": f"note {i}\n".encode() * (i + 1) for i in range(20)}
+    files.update({f"pic{i}.jpg": os.urandom(1000 + i) for i in range(5)})
+    for name, data in files.items():
+        (source / name).write_bytes(data)
+    return files
+
+def test_packed_files_list_and_extract(tmp_path):
+    source, backup, target = tmp_path / "source", tmp_path / "backup", tmp_path / "extracted"
+    source.mkdir()
+    files = _small_files(source)
+    metrics = engine.run_backup_once(source, backup, lambda text: None, lambda *args: None, Event(),
+                                     engine.BackupOptions(pack_threshold_kb=64))
+    assert metrics.counters["files_packed"] == len(files)
+
+    rows = list(packs.iter_packed(backup))
+    assert sorted(row[0].rpartition("/")[2] for row in rows) == sorted(files)
+    assert sorted(row[0].rpartition("/")[2] for row in packs.iter_packed(backup, ["*.jpg"])) == \
+        [f"pic{i}.jpg" for i in range(5)]
+    # Each segment is a valid tar file holding its folder's members
+    for segment in {row[1] for row in rows}:
+        with tarfile.open(backup / segment) as tar:
+            assert {member.name for member in tar} == {row[0].rpartition("/")[2] for row in rows if row[1] == segment}
+
+    assert packs.extract_packed(backup, [], target, lambda text: None) == (len(files), 0)
+    for rel, *_ in rows:
+        name = rel.rpartition("/")[2]
+        assert (target / rel).read_bytes() == files[name]
+        assert (target / rel).stat().st_mtime_ns == (source / name).stat().st_mtime_ns
+
+def test_extract_rejects_a_damaged_member(tmp_path):
+    source, backup, target = tmp_path / "source", tmp_path / "backup", tmp_path / "extracted"
+    source.mkdir()
+    _small_files(source)
+    engine.run_backup_once(source, backup, lambda text: None, lambda *args: None, Event(),
+                           engine.BackupOptions(pack_threshold_kb=64))
+    rel, segment, offset, size, *_ = next(packs.iter_packed(backup, ["note3.txt"]))
+    with open(backup / segment, "r+b") as fh:
+        fh.seek(offset)
+        fh.write(b"X")
+    assert packs.extract_packed(backup, ["note3.txt"], target, lambda text: None) == (0, 1)
+    assert not (target / rel).exists()
@@ -0,0 +1,106 @@
+from threading import Event, Lock
+from types import SimpleNamespace
+
+import pytest
+
+import smart_file_organizer_pro_v5 as engine
+
+MIB = 1024 * 1024
+
+def _file(name, size):
+    return SimpleNamespace(path=name, size=size)
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(engine.time, "monotonic", lambda: now[0])
+    return now
+
+def _meter():
+    return engine.ProgressMeter(lambda percent, label, stats: None, Lock(), interval=0)
+
+def test_progress_is_weighted_by_bytes(clock):
+    meter = _meter()
+    small, big = _file("small", MIB), _file("big", 99 * MIB)
+    meter.found(small)
+    meter.found(big)
+    meter.scan_finished()
+    meter.done(small)
+    snapshot = meter.snapshot()
+    assert (snapshot.files_done, snapshot.bytes_done, snapshot.bytes_total) == (1, MIB, 100 * MIB)
+    assert meter.percent(snapshot) == 1
+    meter.done(big)
+    assert meter.percent(meter.snapshot()) == 99  # 100 only comes from finish()
+
+def test_hash_then_copies_end_at_exactly_the_file_size(clock):
+    meter = _meter()
+    f = _file("f", 10 * MIB)
+    meter.found(f)
+    meter.begin(f, 0.5)
+    meter.io(10 * MIB)
+    meter.end()
+    assert meter.snapshot().bytes_done == 5 * MIB
+    meter.expect_copies(f, 2)
+    for done in (7.5 * MIB, 10 * MIB):
+        meter.begin(f)
+        # A copy reads and writes the same bytes; only one direction counts
+        meter.io(10 * MIB)
+        meter.io(10 * MIB, written=True)
+        meter.end()
+        assert meter.snapshot().bytes_done == done
+        meter.copy_done(f)
+    snapshot = meter.snapshot()
+    assert (snapshot.bytes_done, snapshot.files_done) == (10 * MIB, 1)
+
+def test_rate_and_eta_follow_recent_throughput(clock):
+    meter = _meter()
+    f = _file("f", 100 * MIB)
+    meter.found(f)
+    meter.scan_finished()
+    meter.begin(f, 1.0)
+    for _ in range(4):
+        clock[0] += 1
+        meter.io(10 * MIB)
+        meter.snapshot()
+    snapshot = meter.snapshot()
+    assert snapshot.mb_per_s == pytest.approx(10, rel=0.05)
+    assert snapshot.eta_seconds == pytest.approx(6, rel=0.05)
+    # A stall longer than the window drops the rate, and the ETA is unknown
+    clock[0] += engine.THROUGHPUT_WINDOW * 3
+    meter.snapshot()
+    clock[0] += engine.THROUGHPUT_WINDOW * 3
+    snapshot = meter.snapshot()
+    assert snapshot.mb_per_s == 0 and snapshot.eta_seconds is None
+
+def test_estimate_until_the_scan_finishes(clock):
+    meter = _meter()
+    meter.expected_bytes = 50 * MIB
+    meter.found(_file("f", 10 * MIB))
+    snapshot = meter.snapshot()
+    assert (snapshot.bytes_total, snapshot.total_known) == (50 * MIB, False)
+    assert snapshot.describe().startswith("0 B / 50.0 MB+,")
+    meter.scan_finished()
+    assert meter.snapshot().bytes_total == 10 * MIB
+
+def test_backup_run_reports_byte_progress(tmp_path):
+    source = tmp_path / "source"
+    source.mkdir()
+    sizes = [300_000, 5_000, 1_200_000]
+    for i, size in enumerate(sizes):
+        (source / f"f{i}.bin").write_bytes(bytes([i]) * size)
+    calls = []
+    engine.run_backup_once(source, tmp_path / "backup", lambda text: None,
+                           lambda percent, label, stats: calls.append((percent, stats)), Event())
+    percents = [percent for percent, _ in calls]
+    assert percents == sorted(percents) and percents[-1] == 100
+    final = calls[-1][1]
+    assert (final.bytes_done, final.bytes_total, final.files_done) == (sum(sizes), sum(sizes), len(sizes))
+
+def test_two_argument_callbacks_still_work(tmp_path):
+    source = tmp_path / "source"
+    source.mkdir()
+    (source / "a.txt").write_text("a")
+    calls = []
+    engine.run_backup_once(source, tmp_path / "backup", lambda text: None,
+                           lambda percent, label: calls.append(percent), Event())
+    assert calls[-1] == 100
@@ -0,0 +1,30 @@
+from threading import Event
+
+import smart_file_organizer_pro_v5 as engine
+import smart_organizer_jobs as jobs
+
+MIB = 1024 * 1024
+
+def test_parent_limit_applies_to_unlimited_child():
+    shared = engine.Throttle(read_mb=1)
+    child = engine.Throttle(parent=shared)
+    stopped = Event()
+    stopped.set()
+    # 10 MB against a 1 MB/s shared cap has to wait, so a set stop_event ends it
+    assert not child.read(10 * MIB, stopped)
+    assert child.write(10 * MIB, stopped)
+    assert child.limited()
+    assert child.snapshot()["shared"]["read_limit_mb_s"] == 1.0
+
+def test_parent_limit_bounds_kernel_copy_chunks():
+    shared = engine.Throttle(write_mb=4)
+    child = engine.Throttle(parent=shared)
+    assert child.chunk_size(8 * MIB) == MIB
+
+def test_scheduler_shares_one_throttle(tmp_path):
+    job_list = [jobs.BackupJob.from_dict({"name": name, "source": str(tmp_path), "backup": str(tmp_path / name)})
+            for name in ("a", "b")]
+    scheduler = jobs.JobScheduler(job_list, tmp_path / "state.json", lambda text: None, read_limit_mb=5)
+    assert all(runtime.throttle.parent is scheduler.throttle for runtime in scheduler._runtimes.values())
+    scheduler.set_shared_limits(read_mb=0)
+    assert not scheduler.throttle.limited()